@@ -6,31 +6,40 @@
 """
 
 import asyncio
+import hashlib
 import logging
+import os
+import socket
 import time
 from contextlib import asynccontextmanager
-from datetime import datetime
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, Request
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field, validator
-from slowapi import Limiter, _rate_limit_exceeded_handler
-from slowapi.util import get_remote_address
-from slowapi.errors import RateLimitExceeded
+from pydantic import BaseModel, Field, root_validator, validator
 import uvicorn
 
 # 导入我们的搜索引擎
-from search.playwright_search import WeChatArticleSearcher
+from search.corpus import export_stream
+from search.errors import QuotaExceededError, SearchBlockedError, SearchOverloadedError
+from search.text_normalize import canonicalize_query
+from search.publish_time import sort_by_time
+from search.result_cache import CacheHit
+from search import json_codec
+from search.mcp_protocol import (
+    MCPError, MCPProtocol, MCPSessionManager, fetch_arguments, make_response, negotiate_protocol_version,
+    origin_allowed, search_arguments
+)
+from search.quota import TenantQuota, fetch_cost, parse_api_keys, search_cost
+from search.scheduler import PRIORITY_NAMES
+from search.service import SearchService
+from search.watcher import KeywordWatcher, service_runner
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# 速率限制器
-limiter = Limiter(key_func=get_remote_address)
-
 # 应用生命周期管理
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -38,16 +47,18 @@ async def lifespan(app: FastAPI):
     logger.info("微信文章搜索MCP服务启动中...")
     # 启动时执行
     try:
-        await get_searcher()
+        await search_service.get_searcher()
         logger.info("搜索器预热完成")
     except Exception as e:
         logger.warning(f"搜索器预热失败: {str(e)}")
+    watcher.start()
     
     yield
     
     # 关闭时执行
     logger.info("微信文章搜索MCP服务关闭中...")
-    await cleanup_searcher()
+    await watcher.close()
+    await search_service.close()
     logger.info("服务已关闭")
 
 # 创建FastAPI应用
@@ -60,10 +71,6 @@ app = FastAPI(
     lifespan=lifespan
 )
 
-# 添加速率限制状态
-app.state.limiter = limiter
-app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
-
 # 添加CORS中间件
 app.add_middleware(
     CORSMiddleware,
@@ -71,14 +78,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Mcp-Session-Id", "X-Export-Cursor"],
 )
 
 # 挂载静态文件目录
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# 全局搜索器实例（用于复用浏览器）
-global_searcher: Optional[WeChatArticleSearcher] = None
-
 # 数据模型定义
 class ArticleResponse(BaseModel):
     """文章响应模型"""
@@ -86,7 +91,9 @@ class ArticleResponse(BaseModel):
     url: str = Field(description="文章链接")
     source: str = Field(description="文章来源")
     date: str = Field(description="发布日期")
+    publish_ts: Optional[int] = Field(default=None, description="发布时间戳（秒），未知时为空")
     snippet: str = Field(default="", description="文章摘要")
+    content: Optional[str] = Field(default=None, description="文章正文（仅在 include_content 时返回）")
 
 class ArticleSearchRequest(BaseModel):
     """文章搜索请求模型"""
@@ -97,13 +104,55 @@ class ArticleSearchRequest(BaseModel):
         description="时间筛选：day/week/month/year"
     )
     use_cache: bool = Field(default=True, description="是否使用缓存")
+    resolve_links: bool = Field(default=False, description="是否将搜狗跳转链接解析为微信文章规范链接")
+    include_content: bool = Field(default=False, description="是否同时抓取前几篇文章的正文")
+    content_top_k: int = Field(default=3, ge=1, le=10, description="抓取正文的文章数量")
+    sort_by: str = Field(default="relevance", description="排序方式：relevance/time")
+    priority: str = Field(default="interactive", description="优先级：interactive/agent/batch")
+    raw_query: Optional[str] = Field(default=None, exclude=True, description="规范化前的原始关键词（内部使用）")
+    
+    @root_validator(pre=True)
+    def keep_raw_query(cls, values):
+        # 保留原始写法，用于统计查询规范化带来的缓存命中
+        if isinstance(values, dict) and isinstance(values.get('query'), str):
+            values = dict(values, raw_query=values['query'].strip())
+        return values
+    
+    @validator('query')
+    def validate_query(cls, v):
+        # 规范化查询：移除危险字符、全半角/空白/大小写统一
+        return canonicalize_query(v)
+    
+    @validator('sort_by')
+    def validate_sort_by(cls, v):
+        if v not in ['relevance', 'time']:
+            raise ValueError('排序方式必须是: relevance, time 之一')
+        return v
+    
+    @validator('priority')
+    def validate_priority(cls, v):
+        if v not in PRIORITY_NAMES:
+            raise ValueError(f"优先级必须是: {', '.join(PRIORITY_NAMES)} 之一")
+        return v
+    
+    @validator('time_filter')
+    def validate_time_filter(cls, v):
+        if v and v not in ['day', 'week', 'month', 'year']:
+            raise ValueError('时间筛选必须是: day, week, month, year 之一')
+        return v
+
+class WatchRequest(BaseModel):
+    """关键词订阅请求模型"""
+    query: str = Field(min_length=1, max_length=100, description="订阅的关键词")
+    time_filter: Optional[str] = Field(default=None, description="时间筛选：day/week/month/year")
+    max_results: int = Field(default=10, ge=1, le=20, description="每次检查的结果数量")
     
     @validator('query')
     def validate_query(cls, v):
-        # 移除潜在危险字符
-        import re
-        v = re.sub(r'[<>"\']', '', v)
-        return v.strip()
+        v = canonicalize_query(v)
+        if not v:
+            raise ValueError('订阅关键词不能为空')
+        return v
     
     @validator('time_filter')
     def validate_time_filter(cls, v):
@@ -118,6 +167,36 @@ class ArticleSearchResponse(BaseModel):
     search_time: float = Field(description="搜索耗时（秒）")
     query: str = Field(description="搜索关键词")
     timestamp: str = Field(description="搜索时间戳")
+    stale: bool = Field(default=False, description="是否为搜索被拦截时返回的过期缓存")
+
+class FetchArticleRequest(BaseModel):
+    """文章正文抓取请求模型"""
+    urls: List[str] = Field(min_length=1, max_length=10, description="文章链接列表（mp.weixin.qq.com 或搜狗跳转链接）")
+    use_cache: bool = Field(default=True, description="是否使用缓存")
+    priority: str = Field(default="interactive", description="优先级：interactive/agent/batch")
+    
+    @validator('priority')
+    def validate_priority(cls, v):
+        if v not in PRIORITY_NAMES:
+            raise ValueError(f"优先级必须是: {', '.join(PRIORITY_NAMES)} 之一")
+        return v
+
+class ArticleContentResponse(BaseModel):
+    """文章正文响应模型"""
+    url: str = Field(description="文章规范链接")
+    title: str = Field(default="", description="文章标题")
+    account: str = Field(default="", description="公众号名称")
+    author: str = Field(default="", description="作者")
+    description: str = Field(default="", description="文章描述")
+    publish_time: str = Field(default="", description="发布时间")
+    content: str = Field(default="", description="正文文本")
+    fetched_via: Optional[str] = Field(default=None, description="抓取方式：http/browser")
+    error: Optional[str] = Field(default=None, description="抓取失败原因")
+
+class FetchArticleResponse(BaseModel):
+    """文章正文抓取响应模型"""
+    articles: List[ArticleContentResponse] = Field(description="文章正文列表")
+    fetch_time: float = Field(description="抓取耗时（秒）")
 
 class HealthResponse(BaseModel):
     """健康检查响应模型"""
@@ -130,32 +209,121 @@ class HealthResponse(BaseModel):
 # 启动时间记录
 start_time = time.time()
 
-# 简单的内存缓存
-search_cache = {}
-CACHE_EXPIRE_TIME = 300  # 5分钟缓存
+# 搜索服务：缓存、搜索器、调度和预取，与 MCP 服务器共用
+# 出口代理、数据目录和预取开关分别由 WEIXIN_SEARCH_PROXIES、WEIXIN_SEARCH_DATA_DIR、WEIXIN_SEARCH_PREFETCH 配置
+search_service = SearchService.from_env(cache_ttl=300)
 
-async def get_searcher() -> WeChatArticleSearcher:
-    """获取搜索器实例"""
-    global global_searcher
-    
-    if global_searcher is None:
-        try:
-            global_searcher = WeChatArticleSearcher(headless=True)
-            await global_searcher.init_browser()
-            logger.info("搜索器初始化成功")
-        except Exception as e:
-            logger.error(f"搜索器初始化失败: {str(e)}")
-            raise HTTPException(status_code=500, detail="搜索服务初始化失败")
-    
-    return global_searcher
+# 租户配额：按 API Key（X-API-Key 或 Authorization: Bearer）区分租户，按实际开销计费
+# WEIXIN_API_KEYS 配置 "租户:key,..." 后只接受已登记的 key；未配置时按 key 摘要或客户端 IP 区分
+# 配额和计数存储分别由 WEIXIN_QUOTA_LIMIT、WEIXIN_QUOTA_STORAGE（limits 存储 URI，如 redis://host:6379）配置
+API_KEYS = parse_api_keys(os.getenv("WEIXIN_API_KEYS", ""))
+quota = TenantQuota(
+    limit=os.getenv("WEIXIN_QUOTA_LIMIT", "1000/minute"),
+    storage_uri=os.getenv("WEIXIN_QUOTA_STORAGE", "memory://")
+)
+
+def client_address(request: Request) -> str:
+    return request.client.host if request.client else "127.0.0.1"
+
+def resolve_tenant(request: Request) -> Optional[str]:
+    """确定请求所属租户；经本机 Unix 套接字转发的请求（如 MCP 服务器）不计配额，返回 None"""
+    if request.client is None:
+        return None
+    api_key = request.headers.get("x-api-key")
+    authorization = request.headers.get("authorization", "")
+    if not api_key and authorization.lower().startswith("bearer "):
+        api_key = authorization[7:].strip()
+    if API_KEYS:
+        tenant = API_KEYS.get(api_key or "")
+        if tenant is None:
+            raise HTTPException(status_code=401, detail="缺少或无效的 API Key")
+        return tenant
+    if api_key:
+        return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+    return "ip-" + client_address(request)
+
+async def charge_search(tenant: Optional[str], query: str, max_results: int = 5,
+                        time_filter: Optional[str] = None, resolve_links: bool = False,
+                        include_content: bool = False, content_top_k: int = 3, use_cache: bool = True):
+    """按预判的执行方式扣除搜索配额：缓存命中几乎免费，上游搜索按页计费"""
+    if tenant is None or not query:
+        return
+    plan = search_service.plan(query, max_results, time_filter, resolve_links,
+                               include_content, content_top_k, use_cache)
+    cost = search_cost(plan, max_results, resolve_links, include_content, content_top_k)
+    await quota.charge(tenant, cost, plan)
+
+def quota_exceeded(e: QuotaExceededError) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=e.to_dict(),
+        headers={"Retry-After": str(max(1, round(e.retry_after or 0)))}
+    )
 
-async def cleanup_searcher():
-    """清理搜索器"""
-    global global_searcher
-    if global_searcher:
-        await global_searcher.close()
-        global_searcher = None
+async def charge_watch_poll(watch):
+    """订阅轮询按与搜索相同的开销计入订阅所属租户"""
+    await charge_search(watch.tenant, watch.query, watch.max_results, watch.time_filter)
 
+# 关键词订阅：按新文章出现频率自适应轮询，只推送未见过的文章；每次轮询计入订阅所属租户的配额
+watcher = KeywordWatcher(service_runner(search_service, charge_watch_poll))
+
+# MCP Streamable HTTP 传输：多个会话共用 search_service 的浏览器和缓存
+# 浏览器来源默认只允许本机，其他来源由 WEIXIN_MCP_ALLOWED_ORIGINS（逗号分隔）配置
+mcp_protocol = MCPProtocol(search_service, watcher)
+mcp_sessions = MCPSessionManager(idle_timeout=3600, max_sessions=1000)
+MCP_ALLOWED_ORIGINS = tuple(o.strip() for o in os.getenv("WEIXIN_MCP_ALLOWED_ORIGINS", "").split(",") if o.strip())
+MCP_KEEPALIVE_INTERVAL = 15
+
+def encode_search_response(articles: List[dict],
+                           query: str,
+                           search_time: float,
+                           timestamp: str,
+                           stale: bool = False,
+                           variant: str = "full") -> bytes:
+    """直接编码搜索响应，字段与 ArticleSearchResponse 一致；compatible 变体为原版API格式"""
+    if variant == "compatible":
+        return json_codec.dumps({
+            "articles": [
+                {
+                    "title": article.get('title', ''),
+                    "url": article.get('url', ''),
+                    "source": article.get('source', ''),
+                    "date": article.get('date', '')
+                }
+                for article in articles
+            ],
+            "total_count": len(articles)
+        })
+    return json_codec.dumps({
+        "articles": [
+            {
+                "title": article.get('title', ''),
+                "url": article.get('url', ''),
+                "source": article.get('source', ''),
+                "date": article.get('date', ''),
+                "publish_ts": article.get('publish_ts'),
+                "snippet": article.get('snippet', ''),
+                "content": article.get('content')
+            }
+            for article in articles
+        ],
+        "total_count": len(articles),
+        "search_time": search_time,
+        "query": query,
+        "timestamp": timestamp,
+        "stale": stale
+    })
+
+def encode_cached_response(hit: CacheHit, sort_by: str = "relevance", stale: bool = False,
+                           variant: str = "full") -> bytes:
+    """由缓存命中结果得到预编码响应，排序在缓存数据上本地完成，编码结果随条目缓存"""
+    def encode(hit: CacheHit) -> bytes:
+        articles = hit.articles()
+        if sort_by == "time":
+            articles = sort_by_time(articles)
+        return encode_search_response(articles, hit.entry.query, hit.entry.search_time,
+                                      hit.entry.timestamp, stale, variant)
+    return hit.encoded((variant, sort_by, stale), encode)
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -165,7 +333,7 @@ async def health_check():
     # 检查浏览器状态
     browser_status = "unknown"
     try:
-        if global_searcher and global_searcher.browser:
+        if search_service.searcher and search_service.searcher.browser:
             browser_status = "running"
         else:
             browser_status = "stopped"
@@ -181,73 +349,58 @@ async def health_check():
     )
 
 @app.post("/search_articles", response_model=ArticleSearchResponse)
-@limiter.limit("10/minute")
 async def search_articles(request: Request, search_request: ArticleSearchRequest):
     """搜索微信文章接口"""
-    start_search_time = time.time()
-    
+    content = await run_search(request, search_request)
+    return Response(content=content, media_type="application/json")
+
+async def run_search(request: Request, search_request: ArticleSearchRequest, variant: str = "full") -> bytes:
+    """执行搜索并返回编码后的响应，缓存命中时直接返回预编码字节"""
     # 验证搜索关键词
     if not search_request.query or not search_request.query.strip():
         raise HTTPException(status_code=400, detail="搜索关键词不能为空")
     
-    query = search_request.query.strip()
-    cache_key = f"{query}_{search_request.max_results}_{search_request.time_filter}"
-    
-    # 检查缓存
-    if search_request.use_cache and cache_key in search_cache:
-        cache_data, cache_time = search_cache[cache_key]
-        if time.time() - cache_time < CACHE_EXPIRE_TIME:
-            logger.info(f"使用缓存结果: {query}")
-            return cache_data
+    tenant = resolve_tenant(request)
+    try:
+        await charge_search(
+            tenant,
+            search_request.query,
+            search_request.max_results,
+            search_request.time_filter,
+            search_request.resolve_links,
+            search_request.include_content,
+            search_request.content_top_k,
+            search_request.use_cache
+        )
+    except QuotaExceededError as e:
+        raise quota_exceeded(e)
     
     try:
-        # 获取搜索器
-        searcher = await get_searcher()
-        
-        # 执行搜索
-        logger.info(f"开始搜索: {query}")
-        articles = await searcher.search_articles(
-            query=query,
+        outcome = await search_service.search(
+            query=search_request.query,
             max_results=search_request.max_results,
-            time_filter=search_request.time_filter
+            time_filter=search_request.time_filter,
+            resolve_links=search_request.resolve_links,
+            include_content=search_request.include_content,
+            content_top_k=search_request.content_top_k,
+            use_cache=search_request.use_cache,
+            priority=search_request.priority,
+            raw_query=search_request.raw_query,
+            client=tenant or client_address(request)
         )
-        
-        # 转换为响应格式
-        article_responses = [
-            ArticleResponse(
-                title=article.get('title', ''),
-                url=article.get('url', ''),
-                source=article.get('source', ''),
-                date=article.get('date', ''),
-                snippet=article.get('snippet', '')
-            )
-            for article in articles
-        ]
-        
-        search_time = time.time() - start_search_time
-        
-        response = ArticleSearchResponse(
-            articles=article_responses,
-            total_count=len(article_responses),
-            search_time=round(search_time, 2),
-            query=query,
-            timestamp=datetime.now().isoformat()
+    except (SearchBlockedError, SearchOverloadedError) as e:
+        raise HTTPException(
+            status_code=503,
+            detail=e.to_dict(),
+            headers={"Retry-After": str(max(1, round(e.retry_after or 0)))}
         )
-        
-        # 缓存结果
-        if search_request.use_cache:
-            search_cache[cache_key] = (response, time.time())
-        
-        logger.info(f"搜索完成: {query}, 耗时: {search_time:.2f}s, 结果: {len(articles)}篇")
-        
-        return response
-        
     except Exception as e:
         logger.error(f"搜索出错: {str(e)}")
         raise HTTPException(status_code=500, detail=f"搜索失败: {str(e)}")
+    
+    return encode_cached_response(outcome.hit, search_request.sort_by, stale=outcome.stale, variant=variant)
 
 @app.post("/search_articles_compatible")
-@limiter.limit("10/minute")
 async def search_articles_compatible(request: Request, search_data: dict):
     """兼容原版API的搜索接口"""
     try:
@@ -258,46 +411,69 @@ async def search_articles_compatible(request: Request, search_data: dict):
         # 转换为新的请求格式
         search_request = ArticleSearchRequest(
             query=search_data.get('query', ''),
-            max_results=min(search_data.get('top_num', 5), 20)  # 限制最大数量
+            max_results=min(search_data.get('top_num', 5), 20),  # 限制最大数量
+            priority=search_data.get('priority', 'agent')
         )
         
-        # 调用新接口
-        response = await search_articles(request, search_request)
-        
-        # 转换为原版格式
-        return {
-            "articles": [
-                {
-                    "title": article.title,
-                    "url": article.url,
-                    "source": article.source,
-                    "date": article.date
-                }
-                for article in response.articles
-            ],
-            "total_count": response.total_count
-        }
+        # 调用新接口，直接返回原版格式的预编码响应
+        content = await run_search(request, search_request, variant="compatible")
+        return Response(content=content, media_type="application/json")
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"兼容接口搜索出错: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/fetch_article", response_model=FetchArticleResponse)
+async def fetch_article(request: Request, fetch_request: FetchArticleRequest):
+    """抓取微信文章正文接口"""
+    start_fetch_time = time.time()
+    
+    tenant = resolve_tenant(request)
+    if tenant is not None:
+        try:
+            await quota.charge(tenant, fetch_cost(len(fetch_request.urls)))
+        except QuotaExceededError as e:
+            raise quota_exceeded(e)
+    
+    try:
+        articles = await search_service.fetch_articles(
+            fetch_request.urls,
+            use_cache=fetch_request.use_cache,
+            priority=fetch_request.priority
+        )
+    except (SearchBlockedError, SearchOverloadedError) as e:
+        raise HTTPException(
+            status_code=503,
+            detail=e.to_dict(),
+            headers={"Retry-After": str(max(1, round(e.retry_after or 0)))}
+        )
+    except Exception as e:
+        logger.error(f"文章抓取出错: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"文章抓取失败: {str(e)}")
+    
+    return FetchArticleResponse(
+        articles=[ArticleContentResponse(**article) for article in articles],
+        fetch_time=round(time.time() - start_fetch_time, 2)
+    )
+
 @app.get("/stats")
 async def get_stats():
     """获取服务统计信息"""
     return {
         "uptime": time.time() - start_time,
-        "cache_size": len(search_cache),
-        "browser_status": "running" if global_searcher and global_searcher.browser else "stopped",
+        **await search_service.stats(),
+        "mcp_sessions": mcp_sessions.stats(),
+        "watches": watcher.stats(),
+        "quota": await quota.stats(),
         "version": "2.0.0"
     }
 
 @app.delete("/cache")
 async def clear_cache():
     """清理搜索缓存"""
-    global search_cache
-    cache_count = len(search_cache)
-    search_cache.clear()
+    cache_count = search_service.clear_cache()
     logger.info(f"缓存已清理，清理了 {cache_count} 条缓存")
     return {"message": f"已清理 {cache_count} 条缓存"}
 
@@ -305,8 +481,8 @@ async def clear_cache():
 async def restart_browser():
     """重启浏览器"""
     try:
-        await cleanup_searcher()
-        await get_searcher()
+        await search_service.close_searcher()
+        await search_service.get_searcher()
         return {"message": "浏览器重启成功"}
     except Exception as e:
         logger.error(f"浏览器重启失败: {str(e)}")
@@ -317,16 +493,252 @@ async def root():
     """返回首页HTML"""
     return FileResponse("static/index.html")
 
-# MCP 功能已移除，因为 fastapi-mcp 包不存在
-# 如需要MCP支持，请使用官方MCP Python SDK
+def mcp_error(status_code: int, code: int, message: str, headers: Optional[dict] = None) -> Response:
+    """MCP 传输层错误，以 JSON-RPC 错误对象返回"""
+    body = make_response(None, None, {"code": code, "message": message})
+    return Response(json_codec.dumps(body), status_code=status_code, media_type="application/json", headers=headers)
 
-if __name__ == "__main__":
-    # 使用导入字符串格式解决reload问题
-    uvicorn.run(
+def sse_event(message: dict, event: str = "message", event_id: Optional[int] = None) -> bytes:
+    """编码一条 SSE 消息"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: ".encode("utf-8") + json_codec.dumps(message) + b"\n\n"
+
+async def sse_events(queue: asyncio.Queue, close, encode=sse_event, backlog=()):
+    """将推送队列转为 SSE 流：先发送 backlog，队列取到 None 时结束，空闲时发送保活注释"""
+    try:
+        for item in backlog:
+            yield encode(item)
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout=MCP_KEEPALIVE_INTERVAL)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if item is None:
+                break
+            yield encode(item)
+    finally:
+        close(queue)
+
+def mcp_session_or_error(request: Request, check_origin: bool = True):
+    """校验来源并按 Mcp-Session-Id 查找请求租户的会话，返回 (会话, 错误响应)；
+    其他租户的会话同样返回 404，持有会话 ID 也不能使用他人的会话
+    """
+    if check_origin and not origin_allowed(request.headers.get("origin"), MCP_ALLOWED_ORIGINS):
+        return None, mcp_error(403, -32600, "不允许的来源")
+    session_id = request.headers.get("mcp-session-id")
+    if not session_id:
+        return None, mcp_error(400, -32600, "缺少 Mcp-Session-Id")
+    try:
+        tenant = resolve_tenant(request)
+    except HTTPException as e:
+        return None, mcp_error(e.status_code, -32600, e.detail)
+    session = mcp_sessions.get(session_id)
+    if session is None or not session.owned_by(tenant):
+        return None, mcp_error(404, -32600, "会话不存在或已过期")
+    return session, None
+
+async def handle_mcp_message(message: dict, session, tenant: Optional[str]):
+    """工具调用与 REST 接口按同样的开销扣除租户配额，配额不足时返回可重试错误
+
+    参数无效的调用不计费，由 mcp_protocol 返回 -32602
+    """
+    params = message.get("params")
+    tool = params.get("name") if message.get("method") == "tools/call" and isinstance(params, dict) else None
+    try:
+        if tool == "search_wechat_articles":
+            args = search_arguments(params.get("arguments"))
+            await charge_search(tenant, args["query"], args["max_results"], args["time_filter"],
+                                args["resolve_links"], args["include_content"], args["content_top_k"])
+        elif tool == "fetch_article" and tenant:
+            await quota.charge(tenant, fetch_cost(len(fetch_arguments(params.get("arguments")))))
+    except MCPError:
+        pass
+    except QuotaExceededError as e:
+        return make_response(message.get("id"), None, {
+            "code": -32001,
+            "message": f"配额不足: {str(e)}",
+            "data": e.to_dict()
+        })
+    return await mcp_protocol.handle_message(message, session)
+
+@app.post("/mcp")
+async def mcp_post(request: Request):
+    """MCP Streamable HTTP 传输：接收 JSON-RPC 消息，initialize 创建会话并在 Mcp-Session-Id 头中返回"""
+    if not origin_allowed(request.headers.get("origin"), MCP_ALLOWED_ORIGINS):
+        return mcp_error(403, -32600, "不允许的来源")
+    try:
+        payload = json_codec.loads(await request.body())
+    except ValueError:
+        return mcp_error(400, -32700, "JSON 解析错误")
+    messages = payload if isinstance(payload, list) else [payload]
+    if not messages or not all(isinstance(m, dict) for m in messages):
+        return mcp_error(400, -32600, "无效的请求")
+    try:
+        tenant = resolve_tenant(request)
+    except HTTPException as e:
+        return mcp_error(e.status_code, -32600, e.detail)
+
+    initialize = next((m for m in messages if m.get("method") == "initialize"), None)
+    if initialize is not None:
+        params = initialize.get("params") or {}
+        session = mcp_sessions.create(negotiate_protocol_version(params.get("protocolVersion")),
+                                      params.get("clientInfo"), tenant)
+        logger.info(f"MCP 会话已创建: {session.id}，当前 {len(mcp_sessions)} 个会话")
+    else:
+        session, error = mcp_session_or_error(request, check_origin=False)
+        if error is not None:
+            return error
+
+    responses = await asyncio.gather(*(handle_mcp_message(m, session, tenant) for m in messages))
+    responses = [r for r in responses if r is not None]
+    headers = {"Mcp-Session-Id": session.id}
+    if not responses:
+        # 只有通知或响应时不返回内容
+        return Response(status_code=202, headers=headers)
+
+    body = responses if isinstance(payload, list) else responses[0]
+    accept = request.headers.get("accept", "")
+    if "text/event-stream" in accept and "application/json" not in accept:
+        return StreamingResponse(iter([sse_event(body)]), media_type="text/event-stream", headers=headers)
+    return Response(json_codec.dumps(body), media_type="application/json", headers=headers)
+
+@app.get("/mcp")
+async def mcp_stream(request: Request):
+    """MCP Streamable HTTP 传输：打开会话的 SSE 流，接收服务器主动推送的消息"""
+    session, error = mcp_session_or_error(request)
+    if error is not None:
+        return error
+    if "text/event-stream" not in request.headers.get("accept", ""):
+        return mcp_error(406, -32600, "需要 Accept: text/event-stream")
+
+    queue = session.open_stream()
+    return StreamingResponse(sse_events(queue, session.close_stream), media_type="text/event-stream",
+                             headers={"Mcp-Session-Id": session.id, "Cache-Control": "no-cache"})
+
+@app.delete("/mcp")
+async def mcp_delete(request: Request):
+    """MCP Streamable HTTP 传输：客户端结束会话"""
+    session, error = mcp_session_or_error(request)
+    if error is not None:
+        return error
+    mcp_sessions.close(session.id)
+    logger.info(f"MCP 会话已结束: {session.id}")
+    return Response(status_code=204)
+
+def get_watch_or_404(request: Request, watch_id: str):
+    """按 ID 查找请求租户可访问的订阅；其他租户的订阅同样返回 404"""
+    watch = watcher.get(watch_id)
+    if watch is None or not watch.owned_by(resolve_tenant(request)):
+        raise HTTPException(status_code=404, detail="订阅不存在")
+    return watch
+
+def encode_watch_item(item: dict) -> bytes:
+    return sse_event(item, event="article", event_id=item["seq"])
+
+@app.post("/watches")
+async def create_watch(request: Request, watch_request: WatchRequest):
+    """注册关键词订阅，归请求租户所有；同一租户参数相同的订阅返回已有订阅"""
+    tenant = resolve_tenant(request)
+    try:
+        watch = watcher.add(watch_request.query, watch_request.time_filter, watch_request.max_results, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return watch.to_dict()
+
+@app.get("/watches")
+async def list_watches(request: Request):
+    """列出请求租户的关键词订阅"""
+    return {"watches": [watch.to_dict() for watch in watcher.watches(resolve_tenant(request))]}
+
+@app.get("/watches/{watch_id}")
+async def get_watch(request: Request, watch_id: str):
+    """查看关键词订阅状态"""
+    return get_watch_or_404(request, watch_id).to_dict()
+
+@app.delete("/watches/{watch_id}")
+async def delete_watch(request: Request, watch_id: str):
+    """删除关键词订阅"""
+    get_watch_or_404(request, watch_id)
+    watcher.remove(watch_id)
+    return {"message": "订阅已删除"}
+
+@app.get("/watches/{watch_id}/articles")
+async def watch_articles(request: Request, watch_id: str, since: int = 0):
+    """增量拉取订阅的新文章（序号大于 since），只读内存，不访问上游"""
+    watch = get_watch_or_404(request, watch_id)
+    return {"watch": watch.to_dict(), "articles": watch.articles_since(since)}
+
+@app.get("/watches/{watch_id}/stream")
+async def watch_stream(request: Request, watch_id: str, since: Optional[int] = None):
+    """订阅新文章的 SSE 流，断线重连时按 Last-Event-ID 或 since 补发错过的文章"""
+    watch = get_watch_or_404(request, watch_id)
+    last_event_id = request.headers.get("last-event-id")
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    backlog = watch.articles_since(since) if since is not None else []
+    queue = watch.open_stream()
+    return StreamingResponse(sse_events(queue, watch.close_stream, encode_watch_item, backlog),
+                             media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": ("application/gzip", "ndjson.gz"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+@app.get("/export/articles")
+async def export_articles(request: Request,
+                          since: float = 0.0,
+                          until: Optional[float] = None,
+                          fmt: str = Query("ndjson", alias="format"),
+                          include_content: bool = False,
+                          page_size: int = Query(1000, ge=1, le=10000)):
+    """流式导出文章语料库中 since < updated_at <= until 的文章，只读本地 SQLite，不访问浏览器和上游
+
+    响应头 X-Export-Cursor 为本次导出的截止时间，作为下一次增量导出的 since
+    """
+    resolve_tenant(request)
+    corpus = search_service.corpus
+    if corpus is None:
+        raise HTTPException(status_code=404, detail="文章语料库未开启")
+    if until is None:
+        until = await asyncio.to_thread(corpus.checkpoint)
+    try:
+        stream = export_stream(corpus, fmt, since, until, page_size, include_content)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ImportError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = EXPORT_MEDIA_TYPES[fmt]
+    return StreamingResponse(stream, media_type=media_type, headers={
+        "X-Export-Cursor": repr(until),
+        "Content-Disposition": f'attachment; filename="articles-{int(until)}.{extension}"',
+        "Cache-Control": "no-cache",
+    })
+
+def serve():
+    """启动服务；设置 WEIXIN_SEARCH_UDS 时同时监听本机 Unix 套接字，供 MCP 服务器转发请求"""
+    config = uvicorn.Config(
         "main:app",
         host="0.0.0.0",
         port=8000,
         reload=False,  # 生产环境建议关闭reload
         log_level="info",
         access_log=True
-    )
\ No newline at end of file
+    )
+    sockets = [config.bind_socket()]
+    
+    uds_path = os.getenv("WEIXIN_SEARCH_UDS")
+    if uds_path:
+        if os.path.exists(uds_path):
+            os.unlink(uds_path)
+        uds = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        uds.bind(uds_path)
+        os.chmod(uds_path, 0o600)
+        sockets.append(uds)
+        logger.info(f"监听本机套接字: {uds_path}")
+    
+    uvicorn.Server(config).run(sockets=sockets)
+
+if __name__ == "__main__":
+    serve()
\ No newline at end of file
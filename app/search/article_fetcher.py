@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+微信文章正文抓取
+通过共享连接池并发下载 mp.weixin.qq.com 文章并提取正文和元信息，HTTP 失败时回退到浏览器
+"""
+
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from html.parser import HTMLParser
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import aiohttp
+
+from .article_url import canonicalize_article_url, extract_link_token
+from .publish_time import CHINA_TZ
+
+
+# 文章页脚本中的发布时间戳：var ct = "1700000000";
+_CT_PATTERN = re.compile(r'var\s+ct\s*=\s*"(\d{9,11})"')
+_BLANK_LINES_PATTERN = re.compile(r'\n\s*\n+')
+_SPACES_PATTERN = re.compile(r'[ \t\r\f\v\u00a0]+')
+
+# 触发换行的块级标签
+_BLOCK_TAGS = {"p", "div", "section", "h1", "h2", "h3", "h4", "h5", "h6", "li", "blockquote", "tr"}
+
+# 无闭合标签的元素，不参与嵌套深度计算
+_VOID_TAGS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "param", "source", "track", "wbr"}
+
+
+class _WeChatArticleParser(HTMLParser):
+    """解析微信文章页，提取标题、公众号、作者和正文文本"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.meta: Dict[str, str] = {}
+        self.title_parts: List[str] = []
+        self.account_parts: List[str] = []
+        self.content_parts: List[str] = []
+
+        self._capture: Optional[str] = None
+        self._capture_depth = 0
+        self._content_depth = 0
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "meta":
+            key = attrs.get("property") or attrs.get("name")
+            if key and attrs.get("content"):
+                self.meta[key] = attrs["content"]
+            return
+        if tag in ("script", "style"):
+            self._skip_depth += 1
+            return
+        if tag in _VOID_TAGS:
+            if tag == "br" and self._content_depth:
+                self.content_parts.append("\n")
+            return
+
+        element_id = attrs.get("id")
+        if self._content_depth:
+            self._content_depth += 1
+            if tag in _BLOCK_TAGS:
+                self.content_parts.append("\n")
+        elif element_id == "js_content":
+            self._content_depth = 1
+        elif self._capture:
+            self._capture_depth += 1
+        elif element_id == "activity-name":
+            self._capture, self._capture_depth = "title", 1
+        elif element_id == "js_name":
+            self._capture, self._capture_depth = "account", 1
+
+    def handle_endtag(self, tag):
+        if tag in ("script", "style"):
+            self._skip_depth = max(0, self._skip_depth - 1)
+            return
+        if tag in _VOID_TAGS or tag == "meta":
+            return
+        if self._content_depth:
+            self._content_depth -= 1
+            if tag in _BLOCK_TAGS:
+                self.content_parts.append("\n")
+        elif self._capture:
+            self._capture_depth -= 1
+            if self._capture_depth <= 0:
+                self._capture = None
+
+    def handle_data(self, data):
+        if self._skip_depth:
+            return
+        if self._content_depth:
+            self.content_parts.append(data)
+        elif self._capture == "title":
+            self.title_parts.append(data)
+        elif self._capture == "account":
+            self.account_parts.append(data)
+
+
+def _normalize_block_text(text: str) -> str:
+    """合并多余空白，保留段落换行"""
+    text = _SPACES_PATTERN.sub(" ", text)
+    lines = [line.strip() for line in text.split("\n")]
+    return _BLANK_LINES_PATTERN.sub("\n\n", "\n".join(lines)).strip()
+
+
+def extract_article(html: str, url: str) -> Dict:
+    """从文章页 HTML 中提取正文和元信息"""
+    parser = _WeChatArticleParser()
+    parser.feed(html)
+    parser.close()
+
+    title = "".join(parser.title_parts).strip() or parser.meta.get("og:title", "")
+    account = "".join(parser.account_parts).strip()
+    content = _normalize_block_text("".join(parser.content_parts))
+
+    publish_time = ""
+    match = _CT_PATTERN.search(html)
+    if match:
+        # 按北京时间显示，与服务器时区无关
+        publish_time = datetime.fromtimestamp(int(match.group(1)), CHINA_TZ).strftime("%Y-%m-%d %H:%M:%S")
+
+    return {
+        "url": url,
+        "title": title,
+        "account": account,
+        "author": parser.meta.get("author", ""),
+        "description": parser.meta.get("og:description") or parser.meta.get("description", ""),
+        "publish_time": publish_time,
+        "content": content,
+    }
+
+
+class ArticleFetcher:
+    """文章正文抓取器"""
+
+    def __init__(self,
+                 searcher=None,
+                 concurrency: int = 8,
+                 timeout: float = 15.0,
+                 cache_ttl: float = 3600.0,
+                 max_cache_size: int = 500):
+        """
+        Args:
+            searcher: WeChatArticleSearcher 实例，用于解析跳转链接和浏览器回退
+            concurrency: 最大并发下载数
+            timeout: 单篇文章下载超时（秒）
+            cache_ttl: 正文缓存有效期（秒）
+            max_cache_size: 正文缓存最大条数
+        """
+        self.searcher = searcher
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_cache_size = max_cache_size
+
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.cache_hits = 0
+        self.http_fetches = 0
+        self.browser_fetches = 0
+        self.failures = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的连接池会话"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            user_agent = self.searcher.user_agents[0] if self.searcher else None
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"User-Agent": user_agent} if user_agent else None
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def fetch(self, url: str, use_cache: bool = True,
+                    browser: Optional[Callable[[str], Awaitable[str]]] = None) -> Dict:
+        """抓取单篇文章，失败时返回带 error 字段的结果
+
+        browser 为浏览器回退抓取函数（url -> HTML），默认直接使用搜索器的浏览器，
+        搜索服务传入经调度器排队的版本
+        """
+        if self.searcher and extract_link_token(url):
+            url = await self.searcher.link_resolver.resolve(url)
+        url = canonicalize_article_url(url)
+
+        if urlparse(url).netloc != "mp.weixin.qq.com":
+            return {"url": url, "error": "仅支持 mp.weixin.qq.com 文章链接"}
+
+        if use_cache and url in self._cache:
+            article, cached_at = self._cache[url]
+            if time.time() - cached_at < self.cache_ttl:
+                self.cache_hits += 1
+                self._cache.move_to_end(url)
+                return article
+
+        session = self._get_session()
+        async with self._semaphore:
+            article = await self._fetch_via_http(session, url)
+        # 浏览器回退可能需要排队，不占用 HTTP 并发名额
+        if browser is None and self.searcher:
+            browser = self.searcher.fetch_page_html
+        if article is None and browser is not None:
+            article = await self._fetch_via_browser(url, browser)
+
+        if article is None:
+            self.failures += 1
+            return {"url": url, "error": "文章抓取失败"}
+
+        self._cache[url] = (article, time.time())
+        self._cache.move_to_end(url)
+        while len(self._cache) > self.max_cache_size:
+            self._cache.popitem(last=False)
+        return article
+
+    async def fetch_many(self, urls: List[str], use_cache: bool = True,
+                         browser: Optional[Callable[[str], Awaitable[str]]] = None) -> List[Dict]:
+        """并发抓取多篇文章，保持原顺序"""
+        return list(await asyncio.gather(*(self.fetch(url, use_cache, browser) for url in urls)))
+
+    async def _fetch_via_http(self, session: aiohttp.ClientSession, url: str) -> Optional[Dict]:
+        """通过普通 HTTP 请求抓取"""
+        try:
+            async with session.get(url) as response:
+                if response.status != 200:
+                    return None
+                html = await response.text(errors="ignore")
+        except Exception as e:
+            self.logger.debug(f"HTTP 抓取文章失败: {url}, {str(e)}")
+            return None
+
+        # 解析整页 HTML 较耗 CPU，放到线程中执行，不阻塞事件循环
+        article = await asyncio.to_thread(extract_article, html, url)
+        # 没有正文通常是验证页或已删除的文章
+        if not article["content"]:
+            return None
+        self.http_fetches += 1
+        article["fetched_via"] = "http"
+        return article
+
+    async def _fetch_via_browser(self, url: str, browser: Callable[[str], Awaitable[str]]) -> Optional[Dict]:
+        """HTTP 失败时复用搜索器的浏览器抓取"""
+        try:
+            html = await browser(url)
+        except Exception as e:
+            self.logger.debug(f"浏览器抓取文章失败: {url}, {str(e)}")
+            return None
+
+        article = await asyncio.to_thread(extract_article, html, url) if html else None
+        if not article or not article["content"]:
+            return None
+        self.browser_fetches += 1
+        article["fetched_via"] = "browser"
+        return article
+
+    async def close(self):
+        """关闭连接池"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def clear_cache(self) -> int:
+        """清理正文缓存"""
+        count = len(self._cache)
+        self._cache.clear()
+        return count
+
+    def stats(self) -> Dict:
+        """获取抓取统计"""
+        return {
+            "cache_size": len(self._cache),
+            "cache_hits": self.cache_hits,
+            "http_fetches": self.http_fetches,
+            "browser_fetches": self.browser_fetches,
+            "failures": self.failures,
+        }
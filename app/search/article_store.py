@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享文章存储
+跨查询去重的紧凑文章记录，缓存的查询结果只保存对记录的引用
+"""
+
+import sys
+import time
+from typing import Dict, Iterable, List, Optional
+
+from .article_url import canonicalize_article_url, extract_link_token
+
+
+def stable_article_key(article: Dict) -> str:
+    """跨查询、跨多次搜索稳定的文章去重键：已解析的微信链接取规范链接；
+    搜狗跳转链接的 url 参数每次搜索都不同，改用来源和标题
+    """
+    url = article.get("url") or ""
+    if not extract_link_token(url):
+        key = canonicalize_article_url(url)
+        if key:
+            return key
+    return f"{article.get('source', '')}|{article.get('title', '')}"
+
+
+class ArticleRecord:
+    """紧凑的文章记录，来源字符串驻留复用"""
+
+    __slots__ = ("key", "title", "url", "source", "date", "publish_ts", "snippet", "content", "updated_at", "refs")
+
+    def __init__(self, key: str, article: Dict):
+        self.key = key
+        self.content: Optional[str] = None
+        self.refs = 0
+        self.update(article)
+
+    def update(self, article: Dict):
+        """用新抓取的数据刷新记录，所有引用该记录的查询同时生效"""
+        self.title = article.get("title", "")
+        self.url = article.get("url", "")
+        self.source = sys.intern(article.get("source", ""))
+        self.date = article.get("date", "")
+        self.publish_ts = article.get("publish_ts")
+        self.snippet = article.get("snippet", "")
+        if article.get("content"):
+            self.content = article["content"]
+        self.updated_at = time.time()
+
+    def to_dict(self, include_content: bool = False) -> Dict:
+        """转换为接口使用的字典"""
+        article = {
+            "title": self.title,
+            "url": self.url,
+            "source": self.source,
+            "date": self.date,
+            "publish_ts": self.publish_ts,
+            "snippet": self.snippet,
+        }
+        if include_content and self.content:
+            article["content"] = self.content
+        return article
+
+
+class ArticleStore:
+    """按 stable_article_key 去重的文章存储，记录按引用计数回收"""
+
+    def __init__(self):
+        self._records: Dict[str, ArticleRecord] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def get(self, key: str) -> Optional[ArticleRecord]:
+        """按去重键获取记录"""
+        return self._records.get(key)
+
+    def upsert(self, article: Dict) -> ArticleRecord:
+        """新增或刷新文章记录"""
+        key = stable_article_key(article)
+        record = self._records.get(key)
+        if record is None:
+            record = ArticleRecord(key, article)
+            self._records[key] = record
+        else:
+            record.update(article)
+        return record
+
+    def acquire(self, articles: Iterable[Dict]) -> List[ArticleRecord]:
+        """写入一组文章并增加引用计数"""
+        records = []
+        for article in articles:
+            record = self.upsert(article)
+            record.refs += 1
+            records.append(record)
+        return records
+
+    def release(self, records: Iterable[ArticleRecord]):
+        """减少引用计数，不再被任何查询引用的记录被回收"""
+        for record in records:
+            record.refs -= 1
+            if record.refs <= 0:
+                self._records.pop(record.key, None)
+
+    def clear(self):
+        """清空存储"""
+        self._records.clear()
+
+    def stats(self) -> Dict:
+        """获取存储统计"""
+        refs = sum(record.refs for record in self._records.values())
+        return {
+            "articles": len(self._records),
+            "references": refs,
+            "sources": len({record.source for record in self._records.values()}),
+        }
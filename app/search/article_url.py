@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+微信文章链接
+规范化 mp.weixin.qq.com 文章链接，识别搜狗跳转链接
+"""
+
+from typing import Optional
+from urllib.parse import parse_qs, urlencode, urlparse
+
+# 规范文章链接只保留能唯一定位文章的参数
+_CANONICAL_PARAMS = ("__biz", "mid", "idx", "sn")
+
+
+def canonicalize_article_url(url: str) -> str:
+    """将微信文章链接规范化，去除 chksm/scene 等追踪参数"""
+    if not url:
+        return ""
+    parsed = urlparse(url)
+    if parsed.netloc != "mp.weixin.qq.com":
+        return url
+    if parsed.path == "/s" and parsed.query:
+        params = parse_qs(parsed.query)
+        if all(k in params for k in _CANONICAL_PARAMS):
+            query = urlencode([(k, params[k][0]) for k in _CANONICAL_PARAMS])
+            return f"https://mp.weixin.qq.com/s?{query}"
+    return f"https://mp.weixin.qq.com{parsed.path}" + (f"?{parsed.query}" if parsed.query else "")
+
+
+def extract_link_token(url: str) -> Optional[str]:
+    """提取搜狗跳转链接中的 url 参数作为缓存键，非跳转链接返回 None"""
+    parsed = urlparse(url)
+    if not parsed.path.startswith("/link"):
+        return None
+    values = parse_qs(parsed.query).get("url")
+    return values[0] if values else None
@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章语料库
+将上游搜索返回的文章按去重键持久化到本地 SQLite，供离线分析批量导出；
+导出按 updated_at 游标分页读取，逐块压缩输出，内存占用与语料规模无关，不经过浏览器和上游
+"""
+
+import asyncio
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from . import json_codec
+from .article_store import stable_article_key
+from .data_dir import default_data_dir
+
+EXPORT_FORMATS = ("ndjson", "parquet")
+EXPORT_FIELDS = ("key", "title", "url", "source", "date", "publish_ts", "snippet", "content",
+                 "query", "first_seen", "updated_at")
+# 判断文章是否变化的字段；链接只差追踪参数时去重键相同，不视为变化
+_CHANGE_FIELDS = ("title", "source", "date", "publish_ts", "snippet")
+
+
+class ArticleCorpus:
+    """SQLite 文章语料库"""
+
+    def __init__(self, path: str):
+        """
+        Args:
+            path: SQLite 文件路径，首次写入时创建
+        """
+        self.path = path
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+        self.recorded = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls, data_dir: Optional[str] = None) -> Optional["ArticleCorpus"]:
+        """按环境变量创建语料库，WEIXIN_SEARCH_CORPUS=0 时返回 None"""
+        if os.getenv("WEIXIN_SEARCH_CORPUS", "1") == "0":
+            return None
+        return cls(os.path.join(data_dir or default_data_dir(), "corpus.sqlite3"))
+
+    def _get_db(self) -> sqlite3.Connection:
+        """打开写连接"""
+        if self._db is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            # WAL 模式下导出读取不阻塞写入
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS articles ("
+                "key TEXT PRIMARY KEY, title TEXT, url TEXT, source TEXT, date TEXT, publish_ts INTEGER, "
+                "snippet TEXT, content TEXT, query TEXT, first_seen REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS articles_updated ON articles (updated_at, key)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    async def record(self, query: str, articles: List[Dict]):
+        """在线程中写入一次搜索的结果；失败时只记录日志，不影响搜索"""
+        if not articles:
+            return
+        try:
+            await asyncio.to_thread(self.write, query, articles)
+        except Exception as e:
+            self.failed += 1
+            self.logger.warning(f"写入文章语料库失败: {str(e)}")
+
+    def write(self, query: str, articles: List[Dict]):
+        """新增或更新文章；内容未变化的文章不刷新 updated_at，避免增量导出重复输出"""
+        rows = []
+        for article in articles:
+            url = article.get("url", "")
+            if not url:
+                continue
+            rows.append((stable_article_key(article), article.get("title", ""), url, article.get("source", ""),
+                         article.get("date", ""), article.get("publish_ts"), article.get("snippet", ""),
+                         article.get("content") or None, query))
+        if not rows:
+            return
+        changed = " OR ".join(f"articles.{f} IS NOT excluded.{f}" for f in _CHANGE_FIELDS)
+        with self._lock:
+            db = self._get_db()
+            # 在写事务内取时间戳并保证大于已提交的最大值：SQLite 串行化写入，
+            # 各进程的提交顺序与 updated_at 顺序一致，导出游标不会越过尚未提交的写入
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                latest = db.execute("SELECT MAX(updated_at) FROM articles").fetchone()[0]
+                now = time.time() if latest is None else max(time.time(), math.nextafter(latest, math.inf))
+                db.executemany(
+                    "INSERT INTO articles (key, title, url, source, date, publish_ts, snippet, content, query, "
+                    "first_seen, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT(key) DO UPDATE SET title = excluded.title, url = excluded.url, "
+                    "source = excluded.source, date = excluded.date, publish_ts = excluded.publish_ts, "
+                    "snippet = excluded.snippet, content = COALESCE(excluded.content, articles.content), "
+                    "query = excluded.query, updated_at = excluded.updated_at "
+                    f"WHERE {changed} OR (excluded.content IS NOT NULL AND articles.content IS NOT excluded.content)",
+                    [row + (now, now) for row in rows]
+                )
+                db.commit()
+            except Exception:
+                db.rollback()
+                raise
+            self.recorded += len(rows)
+
+    def checkpoint(self) -> float:
+        """返回已提交的最大 updated_at 作为导出的截止时间；之后任何进程的写入都大于它"""
+        db = self._connect_readonly()
+        if db is None:
+            return 0.0
+        try:
+            return db.execute("SELECT MAX(updated_at) FROM articles").fetchone()[0] or 0.0
+        finally:
+            db.close()
+
+    def _connect_readonly(self) -> Optional[sqlite3.Connection]:
+        if not os.path.exists(self.path):
+            return None
+        db = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        # 文件已创建但建表尚未提交时按空语料库处理
+        if db.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'articles'").fetchone() is None:
+            db.close()
+            return None
+        db.row_factory = sqlite3.Row
+        return db
+
+    def fetch_page(self,
+                   since: float,
+                   after_key: Optional[str] = None,
+                   until: Optional[float] = None,
+                   limit: int = 1000,
+                   include_content: bool = False) -> List[Dict[str, Any]]:
+        """按 (updated_at, key) 键集分页读取一页文章；after_key 为空时读取 updated_at > since 的第一页"""
+        db = self._connect_readonly()
+        if db is None:
+            return []
+        fields = [f for f in EXPORT_FIELDS if include_content or f != "content"]
+        if after_key is None:
+            sql = f"SELECT {', '.join(fields)} FROM articles WHERE updated_at > ?"
+            params: list = [since]
+        else:
+            sql = f"SELECT {', '.join(fields)} FROM articles WHERE (updated_at, key) > (?, ?)"
+            params = [since, after_key]
+        if until is not None:
+            sql += " AND updated_at <= ?"
+            params.append(until)
+        sql += " ORDER BY updated_at, key LIMIT ?"
+        params.append(limit)
+        try:
+            return [dict(row) for row in db.execute(sql, params)]
+        finally:
+            db.close()
+
+    async def iter_pages(self,
+                         since: float = 0.0,
+                         until: Optional[float] = None,
+                         page_size: int = 1000,
+                         include_content: bool = False) -> AsyncIterator[List[Dict[str, Any]]]:
+        """逐页读取 since < updated_at <= until 的文章，每次只持有一页"""
+        after_key = None
+        while True:
+            page = await asyncio.to_thread(self.fetch_page, since, after_key, until, page_size, include_content)
+            if not page:
+                return
+            yield page
+            since, after_key = page[-1]["updated_at"], page[-1]["key"]
+            if len(page) < page_size:
+                return
+
+    def close(self):
+        """关闭写连接"""
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict:
+        """获取语料库统计"""
+        return {
+            "path": self.path,
+            "recorded": self.recorded,
+            "failed": self.failed,
+        }
+
+
+async def export_ndjson_gz(pages: AsyncIterator[List[Dict[str, Any]]]) -> AsyncIterator[bytes]:
+    """将分页结果编码为 gzip 压缩的 NDJSON，每页同步刷新一次，客户端可边下载边解压"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    async for page in pages:
+        data = b"".join(json_codec.dumps(row) + b"\n" for row in page)
+        yield compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+class _ChunkSink:
+    """供 pyarrow 写入的只追加缓冲区，已写出的数据随时取走"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def require_pyarrow():
+    """列式导出需要 pyarrow，未安装时抛出 ImportError"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("Parquet 导出需要安装 pyarrow") from e
+    return pyarrow
+
+
+async def export_parquet(pages: AsyncIterator[List[Dict[str, Any]]],
+                         include_content: bool = False) -> AsyncIterator[bytes]:
+    """将分页结果编码为 Parquet（zstd 压缩），每页一个行组"""
+    pa = require_pyarrow()
+    import pyarrow.parquet as pq
+
+    columns = [
+        ("key", pa.string()), ("title", pa.string()), ("url", pa.string()), ("source", pa.string()),
+        ("date", pa.string()), ("publish_ts", pa.int64()), ("snippet", pa.string()), ("content", pa.string()),
+        ("query", pa.string()), ("first_seen", pa.float64()), ("updated_at", pa.float64()),
+    ]
+    schema = pa.schema([c for c in columns if include_content or c[0] != "content"])
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(pa.PythonFile(sink, mode="w"), schema, compression="zstd")
+    try:
+        async for page in pages:
+            writer.write_table(pa.Table.from_pylist(page, schema=schema))
+            yield sink.take()
+    finally:
+        writer.close()
+    yield sink.take()
+
+
+def export_stream(corpus: ArticleCorpus,
+                  fmt: str = "ndjson",
+                  since: float = 0.0,
+                  until: Optional[float] = None,
+                  page_size: int = 1000,
+                  include_content: bool = False) -> AsyncIterator[bytes]:
+    """按格式导出语料库；列式格式在返回前检查依赖，便于调用方在开始输出前报错"""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {fmt}")
+    pages = corpus.iter_pages(since, until, page_size, include_content)
+    if fmt == "parquet":
+        require_pyarrow()
+        return export_parquet(pages, include_content)
+    return export_ndjson_gz(pages)
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地数据目录
+HTTP 服务、MCP 服务器和导出工具的工作目录各不相同，默认数据目录统一按 app 目录解析，
+保证它们读写的是同一份链接缓存、语料库和样本归档
+"""
+
+import os
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def default_data_dir() -> str:
+    """WEIXIN_SEARCH_DATA_DIR 指定的目录，默认 data；相对路径按 app 目录解析"""
+    return os.path.join(APP_DIR, os.getenv("WEIXIN_SEARCH_DATA_DIR", "data"))
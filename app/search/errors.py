@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索错误类型
+"""
+
+from typing import Dict, Optional
+
+
+class SearchError(Exception):
+    """搜索错误基类"""
+
+
+class SearchBlockedError(SearchError):
+    """搜狗返回反爬验证页，或所有出口身份均处于隔离期"""
+
+    def __init__(self, message: str, url: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.url = url
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict:
+        """转换为接口错误信息"""
+        return {
+            "error": "blocked",
+            "message": str(self),
+            "retry_after": round(self.retry_after) if self.retry_after else None,
+        }
+
+
+class SearchOverloadedError(SearchError):
+    """搜索队列已满或预计排队时间超出预算，请求被拒绝"""
+
+    def __init__(self, message: str, priority: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.priority = priority
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict:
+        """转换为接口错误信息"""
+        return {
+            "error": "overloaded",
+            "message": str(self),
+            "priority": self.priority,
+            "retry_after": round(self.retry_after) if self.retry_after else None,
+        }
+
+
+class QuotaExceededError(SearchError):
+    """租户在当前窗口内的配额已用完"""
+
+    def __init__(self, message: str, tenant: Optional[str] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.tenant = tenant
+        self.retry_after = retry_after
+
+    def to_dict(self) -> Dict:
+        """转换为接口错误信息"""
+        return {
+            "error": "quota_exceeded",
+            "message": str(self),
+            "tenant": self.tenant,
+            "retry_after": round(self.retry_after) if self.retry_after else None,
+        }
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出口身份池
+每个身份由代理、User-Agent 和独立的 Cookie 容器组成，按健康度调度并自动隔离被封禁的身份
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, List, Optional
+
+from .rate_governor import AdaptiveRateGovernor
+
+
+class EgressIdentity:
+    """出口身份：代理 + User-Agent + Cookie 容器（浏览器上下文）"""
+
+    def __init__(self,
+                 name: str,
+                 proxy: Optional[str] = None,
+                 user_agent: Optional[str] = None,
+                 storage_state: Optional[str] = None,
+                 rate_governor: Optional[AdaptiveRateGovernor] = None):
+        """
+        Args:
+            name: 身份名称
+            proxy: 代理地址，如 http://127.0.0.1:8080
+            user_agent: 该身份使用的 User-Agent
+            storage_state: Cookie 持久化文件路径（可选）
+            rate_governor: 该出口的速率调节器，每个出口 IP 独立限速
+        """
+        self.name = name
+        self.proxy = proxy
+        self.user_agent = user_agent
+        self.storage_state = storage_state
+        self.rate_governor = rate_governor or AdaptiveRateGovernor()
+
+        # 健康度 0~1，成功时上升，失败/被拦截时下降
+        self.health = 1.0
+        self.quarantined_until = 0.0
+        self.consecutive_blocks = 0
+        self.in_flight = 0
+
+        self.success_count = 0
+        self.failure_count = 0
+        self.block_count = 0
+
+        # 由搜索器维护的浏览器上下文和页面，同一页面同一时间只处理一个请求
+        self.context = None
+        self.page = None
+        self.lock = asyncio.Lock()
+
+    def is_quarantined(self, now: float) -> bool:
+        """是否处于隔离期"""
+        return now < self.quarantined_until
+
+    def stats(self, now: float) -> Dict:
+        """获取身份状态"""
+        return {
+            "name": self.name,
+            "proxy": self.proxy,
+            "health": round(self.health, 3),
+            "quarantined": self.is_quarantined(now),
+            "quarantine_remaining": round(max(0.0, self.quarantined_until - now), 1),
+            "in_flight": self.in_flight,
+            "success_count": self.success_count,
+            "failure_count": self.failure_count,
+            "block_count": self.block_count,
+            "context_open": self.context is not None,
+            "rate_governor": self.rate_governor.stats(),
+        }
+
+
+class IdentityPool:
+    """出口身份池，按健康度和限速状态调度请求"""
+
+    def __init__(self,
+                 identities: List[EgressIdentity],
+                 quarantine_base: float = 300.0,
+                 quarantine_max: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            identities: 身份列表
+            quarantine_base: 首次被拦截时的隔离时长（秒），连续拦截时翻倍
+            quarantine_max: 最长隔离时长（秒）
+            clock: 时钟函数，便于测试
+        """
+        if not identities:
+            raise ValueError("身份池不能为空")
+        self.identities = identities
+        self.quarantine_base = quarantine_base
+        self.quarantine_max = quarantine_max
+        self.clock = clock
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_proxies(cls, proxies: List[Optional[str]], user_agents: List[str], **kwargs) -> "IdentityPool":
+        """根据代理列表创建身份池，User-Agent 轮流分配"""
+        proxies = proxies or [None]
+        identities = [
+            EgressIdentity(
+                name=f"identity-{i}",
+                proxy=proxy,
+                user_agent=user_agents[i % len(user_agents)] if user_agents else None
+            )
+            for i, proxy in enumerate(proxies)
+        ]
+        return cls(identities, **kwargs)
+
+    def _score(self, identity: EgressIdentity) -> float:
+        """调度评分：健康度越高、预计等待越短、并发越少，分数越高"""
+        wait = identity.rate_governor.expected_wait()
+        return identity.health / (1.0 + wait) / (1 + identity.in_flight)
+
+    def select(self) -> Optional[EgressIdentity]:
+        """选择一个可用身份，全部被隔离时返回 None"""
+        now = self.clock()
+        available = [i for i in self.identities if not i.is_quarantined(now)]
+        if not available:
+            return None
+        return max(available, key=self._score)
+
+    def report_success(self, identity: EgressIdentity):
+        """记录请求成功"""
+        identity.success_count += 1
+        identity.consecutive_blocks = 0
+        identity.health = identity.health * 0.8 + 0.2
+        identity.rate_governor.on_success()
+
+    def report_failure(self, identity: EgressIdentity):
+        """记录请求失败（超时、网络错误等）"""
+        identity.failure_count += 1
+        identity.health *= 0.8
+
+    def report_blocked(self, identity: EgressIdentity):
+        """记录身份被反爬拦截，降速并隔离"""
+        identity.block_count += 1
+        identity.consecutive_blocks += 1
+        identity.health *= 0.5
+        identity.rate_governor.on_blocked()
+
+        duration = min(
+            self.quarantine_max,
+            self.quarantine_base * (2 ** (identity.consecutive_blocks - 1))
+        )
+        identity.quarantined_until = self.clock() + duration
+        self.logger.warning(f"出口身份 {identity.name} 被拦截，隔离 {duration:.0f}s")
+
+    def available_count(self) -> int:
+        """未被隔离的身份数量"""
+        now = self.clock()
+        return sum(1 for i in self.identities if not i.is_quarantined(now))
+
+    def has_spare_capacity(self) -> bool:
+        """是否有空闲且令牌充足的身份，可用于不影响正常请求的预取"""
+        now = self.clock()
+        return any(
+            not i.is_quarantined(now) and i.in_flight == 0 and i.rate_governor.expected_wait() <= 0
+            for i in self.identities
+        )
+
+    def next_available_in(self) -> float:
+        """距离最早有身份解除隔离的时间（秒）"""
+        now = self.clock()
+        return max(0.0, min(i.quarantined_until for i in self.identities) - now)
+
+    def stats(self) -> Dict:
+        """获取身份池状态"""
+        now = self.clock()
+        return {
+            "total": len(self.identities),
+            "available": self.available_count(),
+            "identities": [i.stats(now) for i in self.identities],
+        }
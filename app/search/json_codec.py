@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON 编码
+统一的响应编码器，安装了 orjson 时使用 orjson，否则回退到标准库 json
+"""
+
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 取决于运行环境
+    orjson = None
+
+
+def dumps(obj: Any) -> bytes:
+    """编码为 UTF-8 JSON 字节，不转义非 ASCII 字符"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def loads(data) -> Any:
+    """解码 JSON 字节或字符串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
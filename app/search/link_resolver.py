@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜狗跳转链接解析
+将 /link?url=... 跳转链接并发解析为 mp.weixin.qq.com 规范文章链接，并持久化缓存；
+一批链接经同一出口身份解析，只占用一个限速令牌，SQLite 读写在线程中批量执行
+"""
+
+import asyncio
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import aiohttp
+
+from .article_url import canonicalize_article_url, extract_link_token
+from .errors import SearchBlockedError
+from .identity_pool import IdentityPool
+
+
+# 跳转页通过 JS 分段拼接目标地址：url += 'https://mp.';
+_URL_PART_PATTERN = re.compile(r"url\s*\+=\s*'([^']*)'")
+
+
+class SogouLinkResolver:
+    """搜狗跳转链接解析器"""
+
+    def __init__(self,
+                 identity_pool: IdentityPool,
+                 cache_path: Optional[str] = None,
+                 concurrency: int = 8,
+                 timeout: float = 10.0,
+                 max_memory: int = 10000):
+        """
+        Args:
+            identity_pool: 出口身份池，解析请求同样受各身份限速和隔离约束
+            cache_path: SQLite 缓存文件路径，为空时仅使用内存缓存
+            concurrency: 最大并发解析数
+            timeout: 单个链接解析超时（秒）
+            max_memory: 内存缓存最多保留的链接数，超出时淘汰最久未使用的链接
+        """
+        self.identity_pool = identity_pool
+        self.cache_path = cache_path
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.max_memory = max_memory
+
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+        self.cache_hits = 0
+        self.resolved_count = 0
+        self.failed_count = 0
+
+        self.logger = logging.getLogger(__name__)
+
+    def _get_db(self) -> Optional[sqlite3.Connection]:
+        """打开持久化缓存，调用方需持有 _db_lock"""
+        if self._db is None and self.cache_path:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(self.cache_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS link_cache ("
+                "token TEXT PRIMARY KEY, url TEXT NOT NULL, resolved_at REAL NOT NULL)"
+            )
+        return self._db
+
+    def _remember(self, token: str, url: str):
+        """写入内存缓存"""
+        self._memory[token] = url
+        self._memory.move_to_end(token)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def _db_get_many(self, tokens: List[str]) -> Dict[str, str]:
+        """从持久化缓存批量读取（在线程中执行）"""
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return {}
+            placeholders = ",".join("?" * len(tokens))
+            rows = db.execute(f"SELECT token, url FROM link_cache WHERE token IN ({placeholders})", tokens)
+            return dict(rows.fetchall())
+
+    def _db_put_many(self, resolved: Dict[str, str]):
+        """批量写入持久化缓存，一次提交（在线程中执行）"""
+        with self._db_lock:
+            db = self._get_db()
+            if db is None:
+                return
+            now = time.time()
+            db.executemany(
+                "INSERT OR REPLACE INTO link_cache (token, url, resolved_at) VALUES (?, ?, ?)",
+                [(token, url, now) for token, url in resolved.items()]
+            )
+            db.commit()
+
+    async def _cache_get_many(self, tokens: List[str]) -> Dict[str, str]:
+        """读取缓存：先查内存，未命中的链接再一次性查询 SQLite"""
+        found = {}
+        missing = []
+        for token in tokens:
+            url = self._memory.get(token)
+            if url is None:
+                missing.append(token)
+            else:
+                self._memory.move_to_end(token)
+                found[token] = url
+        if missing and self.cache_path:
+            stored = await asyncio.to_thread(self._db_get_many, missing)
+            for token, url in stored.items():
+                self._remember(token, url)
+            found.update(stored)
+        return found
+
+    async def _cache_put_many(self, resolved: Dict[str, str]):
+        """写入缓存；SQLite 写入失败只记录日志"""
+        for token, url in resolved.items():
+            self._remember(token, url)
+        if self.cache_path:
+            try:
+                await asyncio.to_thread(self._db_put_many, resolved)
+            except sqlite3.Error as e:
+                self.logger.warning(f"写入跳转链接缓存失败: {str(e)}")
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """获取共享的连接池会话"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._session
+
+    async def resolve(self, url: str) -> str:
+        """解析单个链接，失败时返回原链接"""
+        return (await self.resolve_many([url]))[0]
+
+    async def resolve_many(self, urls: List[str]) -> List[str]:
+        """并发解析多个链接，保持原顺序，失败的链接保留原链接
+
+        同一批未缓存的链接经同一出口身份解析，每个请求占用一个限速令牌，
+        在连接池并发度内并行请求；一批中被拦截只上报一次，其余链接不再请求
+        """
+        results = list(urls)
+        pending: "OrderedDict[str, List[int]]" = OrderedDict()
+        for i, url in enumerate(urls):
+            token = extract_link_token(url)
+            if token is None:
+                results[i] = canonicalize_article_url(url)
+            else:
+                pending.setdefault(token, []).append(i)
+        if not pending:
+            return results
+
+        cached = await self._cache_get_many(list(pending))
+        for token, url in cached.items():
+            self.cache_hits += len(pending[token])
+            for i in pending.pop(token):
+                results[i] = url
+        if not pending:
+            return results
+
+        identity = self.identity_pool.select()
+        if identity is None:
+            self.failed_count += len(pending)
+            return results
+
+        session = self._get_session()
+        blocked = False
+
+        async def fetch(url: str) -> Optional[str]:
+            nonlocal blocked
+            if blocked:
+                return None
+            await identity.rate_governor.acquire()
+            if blocked:
+                return None
+            async with self._semaphore:
+                try:
+                    return await self._fetch_target(session, url, identity)
+                except SearchBlockedError:
+                    if not blocked:
+                        blocked = True
+                        self.identity_pool.report_blocked(identity)
+                    return None
+
+        targets = await asyncio.gather(*(fetch(urls[indexes[0]]) for indexes in pending.values()))
+        resolved = {}
+        for (token, indexes), target in zip(pending.items(), targets):
+            if not target:
+                self.failed_count += 1
+                continue
+            resolved[token] = canonicalize_article_url(target)
+            self.resolved_count += 1
+            for i in indexes:
+                results[i] = resolved[token]
+        if resolved:
+            await self._cache_put_many(resolved)
+        return results
+
+    async def _fetch_target(self, session: aiohttp.ClientSession, url: str, identity) -> Optional[str]:
+        """经指定出口身份请求跳转链接并提取目标地址，被反爬拦截时抛出 SearchBlockedError"""
+        try:
+            headers = {"User-Agent": identity.user_agent} if identity.user_agent else {}
+            async with session.get(url, headers=headers, proxy=identity.proxy, allow_redirects=False) as response:
+                location = response.headers.get("Location", "")
+                if "antispider" in location:
+                    raise SearchBlockedError("跳转链接解析被搜狗反爬验证拦截", url=location)
+                if "mp.weixin.qq.com" in location:
+                    self.identity_pool.report_success(identity)
+                    return location
+
+                body = await response.text(errors="ignore")
+                parts = _URL_PART_PATTERN.findall(body)
+                if parts:
+                    self.identity_pool.report_success(identity)
+                    return "".join(parts).replace("@", "")
+                return None
+        except SearchBlockedError:
+            raise
+        except Exception as e:
+            self.logger.debug(f"解析跳转链接失败: {url}, {str(e)}")
+            return None
+
+    async def close(self):
+        """关闭连接池和缓存"""
+        if self._session and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def stats(self) -> Dict:
+        """获取解析统计"""
+        return {
+            "cache_size": len(self._memory),
+            "cache_hits": self.cache_hits,
+            "resolved": self.resolved_count,
+            "failed": self.failed_count,
+        }
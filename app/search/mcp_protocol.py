@@ -0,0 +1,690 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP 协议处理
+与传输方式无关：stdio 服务器和 HTTP 端点共用同一套工具定义和调用逻辑，
+处理函数返回 JSON-RPC 响应而不直接输出；HTTP 会话只保存少量状态，
+所有会话共用同一个搜索服务（浏览器、缓存和调度）
+"""
+
+import asyncio
+import logging
+import secrets
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+from . import json_codec
+from .errors import SearchBlockedError, SearchOverloadedError
+from .text_normalize import canonicalize_query
+
+logger = logging.getLogger(__name__)
+
+# 支持的协议版本，第一个为默认版本
+SUPPORTED_PROTOCOL_VERSIONS = ("2025-06-18", "2025-03-26", "2024-11-05")
+
+SERVER_INFO = {
+    "name": "wechat-article-search",
+    "version": "1.0.0"
+}
+
+TOOLS = [{
+    "name": "search_wechat_articles",
+    "description": "搜索微信公众号文章",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "搜索关键词",
+                "minLength": 1,
+                "maxLength": 100
+            },
+            "max_results": {
+                "type": "integer",
+                "description": "最大结果数量",
+                "default": 5,
+                "minimum": 1,
+                "maximum": 20
+            },
+            "time_filter": {
+                "type": "string",
+                "description": "时间筛选",
+                "enum": ["day", "week", "month", "year"]
+            },
+            "resolve_links": {
+                "type": "boolean",
+                "description": "是否将搜狗跳转链接解析为 mp.weixin.qq.com 规范链接",
+                "default": False
+            },
+            "include_content": {
+                "type": "boolean",
+                "description": "是否同时抓取前几篇文章的正文",
+                "default": False
+            },
+            "sort_by": {
+                "type": "string",
+                "description": "排序方式：relevance（相关度）或 time（发布时间从新到旧）",
+                "enum": ["relevance", "time"],
+                "default": "relevance"
+            },
+            "content_top_k": {
+                "type": "integer",
+                "description": "抓取正文的文章数量",
+                "default": 3,
+                "minimum": 1,
+                "maximum": 10
+            }
+        },
+        "required": ["query"]
+    }
+}, {
+    "name": "fetch_article",
+    "description": "抓取微信公众号文章正文",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "urls": {
+                "type": "array",
+                "description": "文章链接列表（mp.weixin.qq.com 或搜狗跳转链接）",
+                "items": {"type": "string"},
+                "minItems": 1,
+                "maxItems": 10
+            }
+        },
+        "required": ["urls"]
+    }
+}]
+
+# 服务统计资源：缓存命中率、调度和预取等，与 REST 接口 /stats 中的搜索服务部分相同
+STATS_RESOURCE = {
+    "uri": "weixin-search://stats",
+    "name": "搜索服务统计",
+    "description": "结果缓存、调度队列和预取等运行统计",
+    "mimeType": "application/json"
+}
+
+WATCH_TOOL = {
+    "name": "watch_wechat_articles",
+    "description": "订阅关键词，有新文章时通过资源更新通知推送",
+    "inputSchema": {
+        "type": "object",
+        "properties": {
+            "query": {
+                "type": "string",
+                "description": "订阅的关键词",
+                "minLength": 1,
+                "maxLength": 100
+            },
+            "time_filter": {
+                "type": "string",
+                "description": "时间筛选",
+                "enum": ["day", "week", "month", "year"]
+            },
+            "max_results": {
+                "type": "integer",
+                "description": "每次检查的结果数量",
+                "default": 10,
+                "minimum": 1,
+                "maximum": 20
+            }
+        },
+        "required": ["query"]
+    }
+}
+
+
+class MCPError(Exception):
+    """JSON-RPC 错误，由 handle_message 转为错误响应"""
+
+    def __init__(self, code: int, message: str, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.data = data
+
+    def to_dict(self) -> Dict[str, Any]:
+        error = {"code": self.code, "message": self.message}
+        if self.data is not None:
+            error["data"] = self.data
+        return error
+
+
+def make_response(request_id: Any, result: Any = None, error: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """构造 JSON-RPC 响应"""
+    response = {
+        "jsonrpc": "2.0",
+        "id": request_id
+    }
+    if error:
+        response["error"] = error
+    else:
+        response["result"] = result
+    return response
+
+
+def _invalid_params(message: str) -> MCPError:
+    return MCPError(-32602, message)
+
+
+def _object_arg(value: Any, name: str) -> Dict[str, Any]:
+    if value is None:
+        return {}
+    if not isinstance(value, dict):
+        raise _invalid_params(f"{name} 应为对象")
+    return value
+
+
+def _string_arg(arguments: Dict[str, Any], name: str, default: Optional[str] = None,
+                choices: Optional[Iterable[str]] = None) -> Optional[str]:
+    value = arguments.get(name)
+    if value is None:
+        return default
+    if not isinstance(value, str):
+        raise _invalid_params(f"参数 {name} 应为字符串")
+    if choices is not None and value not in choices:
+        raise _invalid_params(f"参数 {name} 应为 {'/'.join(choices)} 之一")
+    return value
+
+
+def _int_arg(arguments: Dict[str, Any], name: str, default: int, minimum: int, maximum: int) -> int:
+    value = arguments.get(name)
+    if value is None:
+        return default
+    # JSON 中的 5.0 按整数处理；布尔值不是整数
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise _invalid_params(f"参数 {name} 应为整数")
+    if not minimum <= value <= maximum:
+        raise _invalid_params(f"参数 {name} 应在 {minimum} 到 {maximum} 之间")
+    return value
+
+
+def _bool_arg(arguments: Dict[str, Any], name: str, default: bool = False) -> bool:
+    value = arguments.get(name)
+    if value is None:
+        return default
+    if not isinstance(value, bool):
+        raise _invalid_params(f"参数 {name} 应为布尔值")
+    return value
+
+
+TIME_FILTERS = ("day", "week", "month", "year")
+
+
+def search_arguments(arguments: Any) -> Dict[str, Any]:
+    """校验并规范化 search_wechat_articles 的参数，无效时抛出 MCPError(-32602)"""
+    arguments = _object_arg(arguments, "arguments")
+    raw_query = (_string_arg(arguments, "query", "") or "").strip()
+    query = canonicalize_query(raw_query)
+    if not query:
+        raise _invalid_params("缺少搜索关键词")
+    return {
+        "query": query,
+        "raw_query": raw_query,
+        "max_results": _int_arg(arguments, "max_results", 5, 1, 20),
+        "time_filter": _string_arg(arguments, "time_filter", choices=TIME_FILTERS),
+        "resolve_links": _bool_arg(arguments, "resolve_links"),
+        "include_content": _bool_arg(arguments, "include_content"),
+        "content_top_k": _int_arg(arguments, "content_top_k", 3, 1, 10),
+        "sort_by": _string_arg(arguments, "sort_by", "relevance", choices=("relevance", "time")),
+    }
+
+
+def fetch_arguments(arguments: Any) -> List[str]:
+    """校验 fetch_article 的参数，返回最多 10 个链接"""
+    arguments = _object_arg(arguments, "arguments")
+    urls = arguments.get("urls")
+    if isinstance(urls, str):
+        urls = [urls]
+    if urls is not None and (not isinstance(urls, list) or not all(isinstance(u, str) for u in urls)):
+        raise _invalid_params("参数 urls 应为字符串数组")
+    if not urls:
+        raise _invalid_params("缺少文章链接")
+    return urls[:10]
+
+
+def _session_tenant(session) -> Optional[str]:
+    """会话所属租户；stdio 等本机会话没有租户"""
+    return getattr(session, "tenant", None)
+
+
+def negotiate_protocol_version(requested: Optional[str]) -> str:
+    """客户端请求的版本受支持时沿用，否则返回默认版本"""
+    if requested in SUPPORTED_PROTOCOL_VERSIONS:
+        return requested
+    return SUPPORTED_PROTOCOL_VERSIONS[0]
+
+
+class MCPProtocol:
+    """MCP 请求处理，所有工具调用以 agent 优先级经共享的搜索服务执行"""
+
+    def __init__(self, service, watcher=None):
+        """
+        Args:
+            service: SearchService 或 RemoteSearchService
+            watcher: KeywordWatcher，提供时支持关键词订阅和资源更新通知
+        """
+        self.service = service
+        self.watcher = watcher
+        # 资源 URI -> 订阅该资源的会话；会话结束后自动移除
+        self._subscribers: Dict[str, "weakref.WeakSet"] = {}
+        if watcher is not None:
+            watcher.add_listener(self._on_new_articles)
+
+    async def handle_message(self, message: Dict[str, Any], session=None) -> Optional[Dict[str, Any]]:
+        """处理一条 JSON-RPC 消息，返回响应；通知和无 id 的消息返回 None
+
+        session 为发出请求的会话，需提供 notify(message) 用于推送资源更新通知
+        """
+        if not isinstance(message, dict):
+            return make_response(None, None, MCPError(-32600, "无效的请求").to_dict())
+        method = message.get("method")
+        request_id = message.get("id")
+        params = message.get("params")
+
+        # 通知消息无需响应
+        if method is None or (isinstance(method, str) and method.startswith("notifications/")):
+            return None
+
+        handler = {
+            "initialize": self.handle_initialize,
+            "ping": self.handle_ping,
+            "tools/list": self.handle_list_tools,
+            "tools/call": self.handle_call_tool,
+            "resources/list": self.handle_list_resources,
+            "resources/read": self.handle_read_resource,
+            "resources/subscribe": self.handle_subscribe,
+            "resources/unsubscribe": self.handle_unsubscribe,
+            "prompts/list": self.handle_list_prompts,
+        }.get(method)
+
+        try:
+            if not isinstance(method, str):
+                raise MCPError(-32600, "无效的请求")
+            if handler is None:
+                raise MCPError(-32601, f"未知方法: {method}")
+            result = await handler(_object_arg(params, "params"), session)
+        except MCPError as e:
+            if request_id is None:
+                return None
+            return make_response(request_id, None, e.to_dict())
+        except Exception as e:
+            # 处理函数的意外错误同样以 JSON-RPC 错误响应，客户端不会一直等待该 id
+            logger.exception(f"处理 {method} 时出错")
+            if request_id is None:
+                return None
+            return make_response(request_id, None, MCPError(-32603, f"内部错误: {str(e)}").to_dict())
+        return make_response(request_id, result)
+
+    async def handle_initialize(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理初始化请求"""
+        return {
+            "protocolVersion": negotiate_protocol_version(params.get("protocolVersion")),
+            "capabilities": {
+                "tools": {
+                    "listChanged": False
+                },
+                "resources": {
+                    "subscribe": self.watcher is not None,
+                    "listChanged": False
+                },
+                "prompts": {
+                    "listChanged": False
+                }
+            },
+            "serverInfo": SERVER_INFO
+        }
+
+    async def handle_ping(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理心跳请求"""
+        return {}
+
+    async def handle_list_tools(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理工具列表请求"""
+        if self.watcher is not None:
+            return {"tools": TOOLS + [WATCH_TOOL]}
+        return {"tools": TOOLS}
+
+    async def handle_call_tool(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理工具调用"""
+        tool_name = params.get("name")
+        arguments = _object_arg(params.get("arguments"), "arguments")
+
+        if tool_name == "search_wechat_articles":
+            text = await self.search_articles(arguments)
+        elif tool_name == "fetch_article":
+            text = await self.fetch_articles(arguments)
+        elif tool_name == "watch_wechat_articles" and self.watcher is not None:
+            text = self.watch_articles(arguments, session)
+        else:
+            raise MCPError(-32601, f"未知工具: {tool_name}")
+
+        return {
+            "content": [
+                {
+                    "type": "text",
+                    "text": text
+                }
+            ]
+        }
+
+    async def search_articles(self, arguments: Dict[str, Any]) -> str:
+        """执行 search_wechat_articles 工具，返回格式化文本"""
+        args = search_arguments(arguments)
+        query = args["query"]
+        sort_by = args["sort_by"]
+
+        try:
+            outcome = await self.service.search(
+                query=query,
+                max_results=args["max_results"],
+                time_filter=args["time_filter"],
+                resolve_links=args["resolve_links"],
+                include_content=args["include_content"],
+                content_top_k=args["content_top_k"],
+                priority="agent",
+                raw_query=args["raw_query"]
+            )
+        except (SearchBlockedError, SearchOverloadedError) as e:
+            logger.warning(f"搜索暂不可用: {str(e)}")
+            raise MCPError(-32001, f"搜索失败: {str(e)}", e.to_dict())
+        except Exception as e:
+            logger.error(f"搜索错误: {str(e)}")
+            raise MCPError(-32603, f"搜索失败: {str(e)}")
+
+        articles = outcome.articles(sort_by)
+
+        # 格式化结果
+        result_text = f"找到 {len(articles)} 篇关于「{query}」的微信文章：\n\n"
+        if outcome.stale:
+            result_text += "（搜索暂不可用，以下为较早的缓存结果）\n\n"
+
+        for i, article in enumerate(articles, 1):
+            result_text += f"{i}. **{article['title']}**\n"
+            result_text += f"   来源：{article['source']}\n"
+            result_text += f"   时间：{article['date']}\n"
+            result_text += f"   摘要：{article['snippet'][:100]}...\n"
+            result_text += f"   链接：{article['url']}\n"
+            if article.get('content'):
+                result_text += f"   正文：\n{article['content']}\n"
+            result_text += "\n"
+        return result_text
+
+    async def fetch_articles(self, arguments: Dict[str, Any]) -> str:
+        """执行 fetch_article 工具，返回格式化文本"""
+        urls = fetch_arguments(arguments)
+
+        try:
+            articles = await self.service.fetch_articles(urls, priority="agent")
+        except (SearchBlockedError, SearchOverloadedError) as e:
+            raise MCPError(-32001, f"抓取失败: {str(e)}", e.to_dict())
+        except Exception as e:
+            logger.error(f"抓取错误: {str(e)}")
+            raise MCPError(-32603, f"抓取失败: {str(e)}")
+
+        result_text = ""
+        for i, article in enumerate(articles, 1):
+            if article.get("error"):
+                result_text += f"{i}. {article['url']}\n   抓取失败：{article['error']}\n\n"
+                continue
+            result_text += f"{i}. **{article['title']}**\n"
+            result_text += f"   公众号：{article['account']}\n"
+            result_text += f"   时间：{article['publish_time']}\n"
+            result_text += f"   链接：{article['url']}\n\n"
+            result_text += f"{article['content']}\n\n"
+        return result_text
+
+    def watch_articles(self, arguments: Dict[str, Any], session=None) -> str:
+        """执行 watch_wechat_articles 工具：注册订阅并为当前会话订阅其资源"""
+        query = canonicalize_query(_string_arg(arguments, "query", ""))
+        if not query:
+            raise MCPError(-32602, "缺少订阅关键词")
+        time_filter = _string_arg(arguments, "time_filter", choices=TIME_FILTERS)
+        max_results = _int_arg(arguments, "max_results", 10, 1, 20)
+        try:
+            watch = self.watcher.add(query, time_filter, max_results, _session_tenant(session))
+        except ValueError as e:
+            raise MCPError(-32602, str(e))
+        if session is not None:
+            self.subscribe(watch.uri, session)
+
+        result_text = f"已订阅「{query}」，资源 URI：{watch.uri}\n"
+        result_text += "有新文章时推送 notifications/resources/updated，"
+        result_text += f"用 resources/read 读取（{watch.uri}?since=序号 只读取更新的文章）"
+        return result_text
+
+    async def handle_list_resources(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理资源列表请求：服务统计，以及每个关键词订阅各是一个资源"""
+        resources = [STATS_RESOURCE]
+        if self.watcher is not None:
+            resources.extend({
+                "uri": watch.uri,
+                "name": f"订阅：{watch.query}",
+                "description": f"关键词「{watch.query}」的新文章",
+                "mimeType": "application/json"
+            } for watch in self.watcher.watches(_session_tenant(session)))
+        return {"resources": resources}
+
+    def _get_watch(self, params: Dict[str, Any], session=None):
+        uri = _string_arg(params, "uri")
+        watch = self.watcher.get_by_uri(uri) if self.watcher is not None and uri else None
+        if watch is None or not watch.owned_by(_session_tenant(session)):
+            raise MCPError(-32002, f"资源不存在: {params.get('uri')}")
+        return watch
+
+    async def handle_read_resource(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理资源读取请求：返回服务统计，或订阅状态和新文章（订阅 URI 可带 ?since=序号）"""
+        if params.get("uri") == STATS_RESOURCE["uri"]:
+            return {"contents": [{
+                "uri": STATS_RESOURCE["uri"],
+                "mimeType": "application/json",
+                "text": json_codec.dumps(await self.service.stats()).decode("utf-8")
+            }]}
+        watch = self._get_watch(params, session)
+        uri = params["uri"]
+        try:
+            since = int(parse_qs(urlsplit(uri).query).get("since", ["0"])[0])
+        except ValueError:
+            since = 0
+        payload = {"watch": watch.to_dict(), "articles": watch.articles_since(since)}
+        return {"contents": [{
+            "uri": uri,
+            "mimeType": "application/json",
+            "text": json_codec.dumps(payload).decode("utf-8")
+        }]}
+
+    async def handle_subscribe(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理资源订阅请求"""
+        watch = self._get_watch(params, session)
+        if session is None:
+            raise MCPError(-32600, "当前连接不支持订阅")
+        self.subscribe(watch.uri, session)
+        return {}
+
+    async def handle_unsubscribe(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理取消资源订阅请求"""
+        watch = self._get_watch(params, session)
+        subscribers = self._subscribers.get(watch.uri)
+        if subscribers is not None and session is not None:
+            subscribers.discard(session)
+        return {}
+
+    async def handle_list_prompts(self, params: Dict[str, Any], session=None) -> Dict[str, Any]:
+        """处理提示词列表请求"""
+        return {"prompts": []}
+
+    def subscribe(self, uri: str, session):
+        self._subscribers.setdefault(uri, weakref.WeakSet()).add(session)
+
+    def _on_new_articles(self, watch, items: List[Dict[str, Any]]):
+        """订阅发现新文章时，向订阅了该资源的会话推送更新通知"""
+        subscribers = self._subscribers.get(watch.uri)
+        if not subscribers:
+            return
+        notification = {
+            "jsonrpc": "2.0",
+            "method": "notifications/resources/updated",
+            "params": {"uri": watch.uri}
+        }
+        for session in list(subscribers):
+            session.notify(notification)
+
+
+class MCPSession:
+    """HTTP 传输的会话状态，只记录协商结果和活跃时间"""
+
+    __slots__ = ("id", "protocol_version", "client_info", "tenant", "created_at", "last_seen", "streams",
+                 "__weakref__")
+
+    def __init__(self, session_id: str, protocol_version: str, client_info: Optional[Dict[str, Any]], now: float,
+                 tenant: Optional[str] = None):
+        self.id = session_id
+        # 创建会话的租户，会话内注册的订阅归该租户所有
+        self.tenant = tenant
+        self.protocol_version = protocol_version
+        self.client_info = client_info
+        self.created_at = now
+        self.last_seen = now
+        # GET 打开的 SSE 流，用于服务器主动推送
+        self.streams: Set[asyncio.Queue] = set()
+
+    def owned_by(self, tenant: Optional[str]) -> bool:
+        """tenant 能否使用该会话；None（本机调用方）可使用所有会话"""
+        return tenant is None or self.tenant == tenant
+
+    def open_stream(self, max_pending: int = 100) -> asyncio.Queue:
+        """打开一个服务器推送流"""
+        queue = asyncio.Queue(maxsize=max_pending)
+        self.streams.add(queue)
+        return queue
+
+    def close_stream(self, queue: asyncio.Queue):
+        self.streams.discard(queue)
+
+    def notify(self, message: Dict[str, Any]) -> int:
+        """向会话的所有推送流发送消息，返回送达的流数量；积压已满的流丢弃该消息"""
+        delivered = 0
+        for queue in list(self.streams):
+            try:
+                queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                logger.warning(f"MCP 会话 {self.id} 推送积压，丢弃消息")
+        return delivered
+
+    def shutdown(self):
+        """结束会话：通知推送流退出"""
+        for queue in list(self.streams):
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self.streams.clear()
+
+
+class MCPSessionManager:
+    """HTTP 会话表：按最近活跃排序，空闲超时或超出上限时淘汰最久未活跃的会话"""
+
+    def __init__(self,
+                 idle_timeout: float = 3600.0,
+                 max_sessions: int = 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            idle_timeout: 会话空闲超时时间（秒）
+            max_sessions: 最多保留的会话数量
+            clock: 时钟函数（测试时可替换）
+        """
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self._sessions: "OrderedDict[str, MCPSession]" = OrderedDict()
+
+        self.created = 0
+        self.closed = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def create(self, protocol_version: str, client_info: Optional[Dict[str, Any]] = None,
+               tenant: Optional[str] = None) -> MCPSession:
+        """创建会话"""
+        self.expire()
+        while len(self._sessions) >= self.max_sessions:
+            _, oldest = self._sessions.popitem(last=False)
+            oldest.shutdown()
+            self.evicted += 1
+        session = MCPSession(secrets.token_urlsafe(24), protocol_version, client_info, self.clock(), tenant)
+        self._sessions[session.id] = session
+        self.created += 1
+        return session
+
+    def get(self, session_id: Optional[str]) -> Optional[MCPSession]:
+        """查找会话并刷新活跃时间，不存在或已过期时返回 None"""
+        if not session_id:
+            return None
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        now = self.clock()
+        if now - session.last_seen > self.idle_timeout and not session.streams:
+            self._remove(session_id)
+            self.expired += 1
+            return None
+        session.last_seen = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def close(self, session_id: str) -> bool:
+        """客户端主动结束会话"""
+        if self._remove(session_id):
+            self.closed += 1
+            return True
+        return False
+
+    def expire(self) -> int:
+        """清理空闲超时的会话；打开了推送流的会话视为活跃"""
+        now = self.clock()
+        stale = [sid for sid, s in self._sessions.items()
+                 if now - s.last_seen > self.idle_timeout and not s.streams]
+        for sid in stale:
+            self._remove(sid)
+        self.expired += len(stale)
+        return len(stale)
+
+    def sessions(self) -> Iterable[MCPSession]:
+        return list(self._sessions.values())
+
+    def _remove(self, session_id: str) -> bool:
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.shutdown()
+        return True
+
+    def stats(self) -> Dict:
+        """获取会话统计"""
+        return {
+            "active": len(self._sessions),
+            "streams": sum(len(s.streams) for s in self._sessions.values()),
+            "created": self.created,
+            "closed": self.closed,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+def origin_allowed(origin: Optional[str], allowed: Iterable[str] = ()) -> bool:
+    """校验 Origin 头，防止 DNS 重绑定：无 Origin（非浏览器客户端）、本机来源或显式允许的来源通过"""
+    if not origin:
+        return True
+    if origin in allowed or "*" in allowed:
+        return True
+    host = urlsplit(origin).hostname
+    return host in ("localhost", "127.0.0.1", "::1")
@@ -7,24 +7,42 @@
 
 import asyncio
 import logging
-import re
+import os
+import time
 from datetime import datetime
 from typing import List, Dict, Optional
 from urllib.parse import urlencode, urlparse, quote
 from playwright.async_api import async_playwright, Browser, Page, TimeoutError
 import aiohttp
 
+from .article_fetcher import ArticleFetcher
+from .errors import SearchBlockedError
+from .identity_pool import EgressIdentity, IdentityPool
+from .link_resolver import SogouLinkResolver
+from .rate_governor import AdaptiveRateGovernor
+from .results import RESULTS_PER_PAGE, SearchResults, truncate_results
+from .sample_archive import SampleArchive
+from .text_normalize import canonicalize_query, normalize_article, normalize_articles
+
 
 class WeChatArticleSearcher:
     """微信文章搜索器"""
     
-    def __init__(self, headless: bool = True, proxy: Optional[str] = None):
+    # 搜狗反爬验证页上的验证码表单元素
+    BLOCK_PAGE_MARKERS = "#seccodeImage, #seccodeInput, form[name='authform'], .antispider"
+    
+    def __init__(self, headless: bool = True, proxy: Optional[str] = None,
+                 rate_governor: Optional[AdaptiveRateGovernor] = None,
+                 identity_pool: Optional[IdentityPool] = None,
+                 proxies: Optional[List[str]] = None,
+                 base_url: str = "https://weixin.sogou.com",
+                 link_cache_path: Optional[str] = None,
+                 sample_archive: Optional[SampleArchive] = None):
         self.headless = headless
         self.proxy = proxy
         self.browser: Optional[Browser] = None
-        self.page: Optional[Page] = None
         self.playwright = None
-        self.base_url = "https://weixin.sogou.com"
+        self.base_url = base_url
         
         # 配置日志
         self.logger = logging.getLogger(__name__)
@@ -35,6 +53,22 @@ class WeChatArticleSearcher:
             "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
             "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
         ]
+        
+        # 出口身份池，每个身份（代理 + UA + Cookie）使用独立的浏览器上下文和速率调节器
+        if identity_pool is None:
+            identity_pool = IdentityPool.from_proxies(proxies or [proxy], self.user_agents)
+            if rate_governor:
+                identity_pool.identities[0].rate_governor = rate_governor
+        self.identity_pool = identity_pool
+        
+        # 跳转链接解析器，将 /link?url=... 解析为规范文章链接
+        self.link_resolver = SogouLinkResolver(identity_pool, cache_path=link_cache_path)
+        
+        # 文章正文抓取器，优先使用 HTTP，失败时回退到本搜索器的浏览器
+        self.article_fetcher = ArticleFetcher(self)
+        
+        # 搜索样本归档（可选），保存原始页面、耗时和解析结果供离线回放
+        self.sample_archive = sample_archive
     
     async def __aenter__(self):
         """异步上下文管理器入口"""
@@ -69,27 +103,12 @@ class WeChatArticleSearcher:
                 ]
             }
             
-            if self.proxy:
-                browser_config["proxy"] = {"server": self.proxy}
+            # 代理按上下文配置，Chromium 需要在启动时设置一个占位的全局代理
+            if any(identity.proxy for identity in self.identity_pool.identities):
+                browser_config["proxy"] = {"server": "http://per-context"}
             
             self.browser = await self.playwright.chromium.launch(**browser_config)
             
-            # 创建页面上下文
-            context = await self.browser.new_context(
-                user_agent=self.user_agents[0],
-                viewport={"width": 1920, "height": 1080},
-                ignore_https_errors=True,  # 忽略HTTPS错误
-                java_script_enabled=False  # 禁用JavaScript以避免反爬检测
-            )
-            
-            self.page = await context.new_page()
-            
-            # 设置页面加载超时
-            self.page.set_default_timeout(30000)
-            
-            # 设置请求拦截，移除不必要的资源
-            await self.page.route("**/*", self._intercept_request)
-            
             self.logger.info("浏览器初始化成功")
             
         except Exception as e:
@@ -97,6 +116,48 @@ class WeChatArticleSearcher:
             await self._cleanup_browser_resources()
             raise
     
+    async def _get_identity_page(self, identity: EgressIdentity) -> Page:
+        """获取身份对应的页面，不存在时创建独立的浏览器上下文"""
+        if identity.page and not identity.page.is_closed():
+            return identity.page
+        
+        context_config = {
+            "user_agent": identity.user_agent or self.user_agents[0],
+            "viewport": {"width": 1920, "height": 1080},
+            "ignore_https_errors": True,  # 忽略HTTPS错误
+            "java_script_enabled": False  # 禁用JavaScript以避免反爬检测
+        }
+        if identity.proxy:
+            context_config["proxy"] = {"server": identity.proxy}
+        if identity.storage_state and os.path.exists(identity.storage_state):
+            context_config["storage_state"] = identity.storage_state
+        
+        identity.context = await self.browser.new_context(**context_config)
+        identity.page = await identity.context.new_page()
+        
+        # 设置页面加载超时
+        identity.page.set_default_timeout(30000)
+        
+        # 设置请求拦截，移除不必要的资源
+        await identity.page.route("**/*", self._intercept_request)
+        
+        self.logger.info(f"出口身份 {identity.name} 的浏览器上下文已创建")
+        return identity.page
+    
+    async def _close_identity_context(self, identity: EgressIdentity, save_state: bool = False):
+        """关闭身份的浏览器上下文"""
+        context = identity.context
+        identity.context = None
+        identity.page = None
+        if context is None:
+            return
+        try:
+            if save_state and identity.storage_state:
+                await context.storage_state(path=identity.storage_state)
+            await context.close()
+        except Exception as e:
+            self.logger.warning(f"关闭出口身份 {identity.name} 的上下文时出现警告: {str(e)}")
+    
     async def _intercept_request(self, route):
         """拦截请求，只允许必要的资源"""
         resource_type = route.request.resource_type
@@ -108,9 +169,8 @@ class WeChatArticleSearcher:
     async def _cleanup_browser_resources(self):
         """清理浏览器资源"""
         try:
-            if self.page:
-                await self.page.close()
-                self.page = None
+            for identity in self.identity_pool.identities:
+                await self._close_identity_context(identity, save_state=True)
             if self.browser:
                 await self.browser.close()
                 self.browser = None
@@ -120,6 +180,8 @@ class WeChatArticleSearcher:
     async def close(self):
         """关闭浏览器"""
         try:
+            await self.link_resolver.close()
+            await self.article_fetcher.close()
             await self._cleanup_browser_resources()
             if self.playwright:
                 await self.playwright.stop()
@@ -131,7 +193,11 @@ class WeChatArticleSearcher:
     async def search_articles(self, 
                             query: str, 
                             max_results: int = 10,
-                            time_filter: Optional[str] = None) -> List[Dict]:
+                            time_filter: Optional[str] = None,
+                            resolve_links: bool = False,
+                            include_content: bool = False,
+                            content_top_k: int = 3,
+                            start_page: int = 1) -> List[Dict]:
         """
         搜索微信文章
         
@@ -139,23 +205,93 @@ class WeChatArticleSearcher:
             query: 搜索关键词
             max_results: 最大结果数量
             time_filter: 时间筛选 (可选: "day", "week", "month", "year")
+            resolve_links: 是否将搜狗跳转链接解析为 mp.weixin.qq.com 规范链接
+            include_content: 是否并发抓取前 content_top_k 篇文章的正文
+            content_top_k: 抓取正文的文章数量
+            start_page: 从第几页结果开始读取，前面的页已有缓存时用于补齐后续页
             
         Returns:
-            包含文章信息的字典列表
+            包含文章信息的字典列表，最多 max_results 篇；一页不够时继续读取下一页
+            
+        Raises:
+            SearchBlockedError: 搜狗返回反爬验证页或所有出口身份均被隔离
         """
         # 输入验证
         if not query or not query.strip():
             self.logger.warning("搜索关键词为空")
             return []
         
-        query = self._sanitize_query(query.strip())
+        query = canonicalize_query(query)
         max_results = max(1, min(max_results, 50))  # 限制范围
         
+        identity = self.identity_pool.select()
+        if identity is None:
+            self.logger.warning("所有出口身份均处于隔离期，暂停搜索")
+            raise SearchBlockedError(
+                "所有出口身份均处于隔离期",
+                retry_after=self.identity_pool.next_available_in()
+            )
+        
+        identity.in_flight += 1
         try:
-            if not self.page or not self.browser or not self.browser.is_connected():
+            async with identity.lock:
+                articles = await self._search_with_identity(identity, query, max_results, time_filter,
+                                                            max(1, start_page))
+        finally:
+            identity.in_flight -= 1
+        
+        truncate_results(articles, max_results)
+        
+        # 释放页面后再并发解析跳转链接
+        if resolve_links and articles:
+            urls = await self.link_resolver.resolve_many([article["url"] for article in articles])
+            for article, url in zip(articles, urls):
+                article["url"] = url
+        
+        if include_content and articles:
+            top = articles[:max(0, content_top_k)]
+            contents = await self.article_fetcher.fetch_many([article["url"] for article in top])
+            for article, content in zip(top, contents):
+                if not content.get("error"):
+                    article["content"] = content["content"]
+        
+        return articles
+    
+    async def fetch_page_html(self, url: str) -> str:
+        """使用浏览器打开页面并返回 HTML，供正文抓取回退使用"""
+        identity = self.identity_pool.select()
+        if identity is None:
+            raise SearchBlockedError(
+                "所有出口身份均处于隔离期",
+                retry_after=self.identity_pool.next_available_in()
+            )
+        
+        identity.in_flight += 1
+        try:
+            async with identity.lock:
+                if not self.browser or not self.browser.is_connected():
+                    await self.init_browser()
+                page = await self._get_identity_page(identity)
+                await page.goto(url, wait_until="domcontentloaded", timeout=20000)
+                return await page.content()
+        finally:
+            identity.in_flight -= 1
+    
+    async def _search_with_identity(self,
+                                    identity: EgressIdentity,
+                                    query: str,
+                                    max_results: int,
+                                    time_filter: Optional[str],
+                                    start_page: int = 1) -> List[Dict]:
+        """使用指定出口身份执行搜索，从 start_page 起逐页读取，直到结果足够或已取得全部结果"""
+        articles = SearchResults()
+        page_no = start_page
+        try:
+            if not self.browser or not self.browser.is_connected():
                 await self.init_browser()
+            page = await self._get_identity_page(identity)
             
-            self.logger.info(f"开始搜索: {query}")
+            self.logger.info(f"开始搜索: {query} (身份: {identity.name})")
             
             # 构建搜索URL
             search_url = f"{self.base_url}/weixin"
@@ -170,70 +306,163 @@ class WeChatArticleSearcher:
                 if time_code:
                     params["tsn"] = time_code
             
-            full_url = f"{search_url}?{urlencode(params)}"
-            self.logger.debug(f"搜索URL: {full_url}")
-            
-            # 访问搜索页面，添加重试机制
-            max_retries = 3
-            for attempt in range(max_retries):
-                try:
-                    await self.page.goto(full_url, wait_until="domcontentloaded", timeout=20000)
-                    break
-                except TimeoutError:
-                    if attempt == max_retries - 1:
-                        raise
-                    self.logger.warning(f"页面加载超时，重试 {attempt + 1}/{max_retries}")
-                    await asyncio.sleep(2)
-            
-            # 等待搜索结果加载，尝试多个可能的选择器
-            result_selectors = [
-                ".results",
-                ".news-list", 
-                "[data-key='search_result']",
-                ".result-item",
-                "li[id]"  # 通用的列表项选择器
-            ]
-            
-            page_loaded = False
-            for selector in result_selectors:
-                try:
-                    await self.page.wait_for_selector(selector, timeout=10000)
-                    self.logger.debug(f"找到选择器: {selector}")
-                    page_loaded = True
+            while True:
+                if page_no > 1:
+                    params["page"] = str(page_no)
+                page_articles = await self._search_page(identity, page, query, page_no, time_filter,
+                                                        f"{search_url}?{urlencode(params)}")
+                articles.extend(page_articles)
+                articles.exhaustive = page_articles.exhaustive
+                if not page_articles or articles.exhaustive or len(articles) >= max_results:
                     break
-                except TimeoutError:
-                    continue
-            
-            if not page_loaded:
-                self.logger.warning("未找到搜索结果容器，尝试解析页面内容")
-            
-            # 解析搜索结果
-            articles = await self._parse_search_results(max_results)
+                page_no += 1
             
             self.logger.info(f"搜索完成，找到 {len(articles)} 篇文章")
             return articles
             
+        except SearchBlockedError:
+            if articles:
+                # 已取得的前几页仍然有效，只是不完整
+                articles.exhaustive = False
+                return articles
+            raise
         except Exception as e:
             self.logger.error(f"搜索过程中出错: {str(e)}")
-            # 尝试重新初始化浏览器
+            self.identity_pool.report_failure(identity)
+            # 重建该身份的上下文，浏览器断开时重新初始化浏览器
             try:
-                await self._cleanup_browser_resources()
-                await self.init_browser()
+                await self._close_identity_context(identity)
+                if not self.browser or not self.browser.is_connected():
+                    await self._cleanup_browser_resources()
+                    await self.init_browser()
             except:
                 pass
-            return []
+            if articles:
+                articles.exhaustive = False
+                return articles
+            return SearchResults(failed=True)
     
-    def _sanitize_query(self, query: str) -> str:
-        """清理搜索查询，移除潜在危险字符"""
-        # 移除HTML标签和特殊字符
-        query = re.sub(r'[<>"\']', '', query)
-        # 限制长度
-        query = query[:100]
-        return query.strip()
+    async def _search_page(self, identity: EgressIdentity, page: Page, query: str, page_no: int,
+                           time_filter: Optional[str], full_url: str) -> SearchResults:
+        """读取一页搜索结果"""
+        started = time.monotonic()
+        timings = {"rate_wait": 0.0, "navigate": 0.0, "wait_results": 0.0, "parse": 0.0}
+        self.logger.debug(f"搜索URL: {full_url}")
+        
+        # 访问搜索页面，添加重试机制
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                mark = time.monotonic()
+                await identity.rate_governor.acquire()
+                timings["rate_wait"] += time.monotonic() - mark
+                mark = time.monotonic()
+                try:
+                    await page.goto(full_url, wait_until="domcontentloaded", timeout=20000)
+                finally:
+                    timings["navigate"] += time.monotonic() - mark
+                break
+            except TimeoutError:
+                if attempt == max_retries - 1:
+                    raise
+                self.logger.warning(f"页面加载超时，重试 {attempt + 1}/{max_retries}")
+                await asyncio.sleep(2)
+        
+        # 命中反爬验证页时立即失败：降速并隔离该身份，丢弃被标记的 Cookie
+        if await self._is_blocked_page(page):
+            blocked_url = page.url
+            self.logger.warning(f"搜索被反爬拦截: {blocked_url} (身份: {identity.name})")
+            self.identity_pool.report_blocked(identity)
+            await self._record_sample(page, identity, query, page_no, time_filter,
+                                      full_url, timings, started, [], blocked=True)
+            await self._close_identity_context(identity)
+            raise SearchBlockedError(
+                "搜索被搜狗反爬验证拦截",
+                url=blocked_url,
+                retry_after=self.identity_pool.next_available_in()
+            )
+        self.identity_pool.report_success(identity)
+        
+        # 等待搜索结果加载，尝试多个可能的选择器
+        result_selectors = [
+            ".results",
+            ".news-list", 
+            "[data-key='search_result']",
+            ".result-item",
+            "li[id]"  # 通用的列表项选择器
+        ]
+        
+        page_loaded = False
+        mark = time.monotonic()
+        for selector in result_selectors:
+            try:
+                await page.wait_for_selector(selector, timeout=10000)
+                self.logger.debug(f"找到选择器: {selector}")
+                page_loaded = True
+                break
+            except TimeoutError:
+                continue
+        
+        timings["wait_results"] = time.monotonic() - mark
+        
+        if not page_loaded:
+            self.logger.warning("未找到搜索结果容器，尝试解析页面内容")
+        
+        # 解析搜索结果
+        mark = time.monotonic()
+        articles = await self._parse_search_results(page)
+        timings["parse"] = time.monotonic() - mark
+        if not page_loaded:
+            # 结果容器未加载时条目少不代表结果已全部取得
+            articles.exhaustive = False
+        
+        await self._record_sample(page, identity, query, page_no, time_filter,
+                                  full_url, timings, started, articles)
+        return articles
     
-    async def _parse_search_results(self, max_results: int) -> List[Dict]:
-        """解析搜索结果页面"""
-        articles = []
+    async def _record_sample(self, page: Page, identity: EgressIdentity, query: str,
+                             page_no: int, time_filter: Optional[str], url: str,
+                             timings: Dict[str, float], started: float, articles: List[Dict],
+                             blocked: bool = False):
+        """按采样策略保存原始页面、各阶段耗时和解析结果，不影响搜索本身"""
+        if self.sample_archive is None:
+            return
+        total = time.monotonic() - started
+        if not self.sample_archive.should_record(total, len(articles), blocked):
+            return
+        try:
+            html = await page.content()
+            final_url = page.url
+        except Exception as e:
+            self.logger.debug(f"读取样本页面失败: {str(e)}")
+            return
+        await self.sample_archive.save({
+            "recorded_at": datetime.now().isoformat(),
+            "query": query,
+            "page": page_no,
+            "time_filter": time_filter,
+            "url": url,
+            "final_url": final_url,
+            "identity": identity.name,
+            "blocked": blocked,
+            "timings": {k: round(v, 4) for k, v in dict(timings, total=total).items()},
+            "html": html,
+            "articles": articles,
+        })
+    
+    async def _is_blocked_page(self, page: Page) -> bool:
+        """判断当前页面是否为搜狗反爬验证页（URL 特征 + 验证码 DOM 标记）"""
+        if "antispider" in (page.url or ""):
+            return True
+        try:
+            marker = await page.query_selector(self.BLOCK_PAGE_MARKERS)
+            return marker is not None
+        except Exception:
+            return False
+    
+    async def _parse_search_results(self, page: Page) -> SearchResults:
+        """解析搜索结果页面；页面上的条目少于一整页时标记为已取得全部结果"""
+        articles = SearchResults()
         
         try:
             # 尝试多种选择器策略
@@ -248,7 +477,7 @@ class WeChatArticleSearcher:
             article_elements = []
             for selector in article_selectors:
                 try:
-                    elements = await self.page.query_selector_all(selector)
+                    elements = await page.query_selector_all(selector)
                     if elements:
                         article_elements = elements
                         self.logger.debug(f"使用选择器找到文章: {selector}, 数量: {len(elements)}")
@@ -259,25 +488,31 @@ class WeChatArticleSearcher:
             
             if not article_elements:
                 self.logger.warning("未找到文章元素，尝试备用解析方法")
-                return await self._fallback_parse()
+                return SearchResults(await self._fallback_parse(page))
             
-            for i, element in enumerate(article_elements[:max_results]):
+            raw_items = []
+            # 解析整页条目，完整性按整页判断，由调用方截取需要的数量
+            for i, element in enumerate(article_elements):
                 try:
-                    article = await self._extract_article_info(element, i)
-                    if article and article.get('title') and article.get('url'):
-                        articles.append(article)
+                    raw_item = await self._extract_article_info(page, element, i)
+                    if raw_item:
+                        raw_items.append(raw_item)
                         
                 except Exception as e:
                     self.logger.warning(f"解析第 {i+1} 篇文章时出错: {str(e)}")
                     continue
             
+            # 整页结果一次性清洗
+            articles = SearchResults(normalize_articles(raw_items),
+                                     exhaustive=len(article_elements) < RESULTS_PER_PAGE)
+            
         except Exception as e:
             self.logger.error(f"解析搜索结果时出错: {str(e)}")
         
         return articles
     
-    async def _extract_article_info(self, element, index: int) -> Optional[Dict]:
-        """从元素中提取文章信息"""
+    async def _extract_article_info(self, page: Page, element, index: int) -> Optional[Dict]:
+        """从元素中提取文章的原始字段，清洗由 normalize_articles 统一完成"""
         try:
             # 获取文章标题和链接
             title_element = await element.query_selector("a")
@@ -298,7 +533,7 @@ class WeChatArticleSearcher:
                 try:
                     container = await element.evaluate(f"el => el.closest('{selector}')")
                     if container:
-                        article_container = await self.page.query_selector(f"xpath=//li[{index + 1}]")
+                        article_container = await page.query_selector(f"xpath=//li[{index + 1}]")
                         break
                 except:
                     continue
@@ -319,8 +554,7 @@ class WeChatArticleSearcher:
                         continue
             
             # 获取来源和时间信息
-            source = ""
-            publish_time = ""
+            meta_text = ""
             
             if article_container:
                 meta_selectors = [".s-p", ".time", ".source", ".meta-info"]
@@ -330,32 +564,38 @@ class WeChatArticleSearcher:
                         if meta_element:
                             meta_text = await meta_element.inner_text()
                             if meta_text:
-                                source, publish_time = self._parse_meta_info(meta_text)
                                 break
                     except:
                         continue
             
-            # 清理和标准化数据
-            article = {
-                "title": self._clean_text(title),
+            # 搜狗在元信息容器上内嵌发布时间戳：<div class="s-p" t="1700000000">
+            timestamp = ""
+            if article_container:
+                try:
+                    ts_element = await article_container.query_selector("[t]")
+                    if ts_element:
+                        timestamp = await ts_element.get_attribute("t") or ""
+                except:
+                    pass
+            
+            return {
+                "title": title,
                 "url": self._resolve_url(link),
-                "source": self._clean_text(source) or "微信公众号",
-                "date": publish_time or datetime.now().strftime("%Y-%m-%d"),
-                "snippet": self._clean_text(description)[:200] + "..." if len(description) > 200 else self._clean_text(description)
+                "description": description,
+                "meta": meta_text or "",
+                "timestamp": timestamp
             }
             
-            return article
-            
         except Exception as e:
             self.logger.debug(f"提取文章信息失败: {str(e)}")
             return None
     
-    async def _fallback_parse(self) -> List[Dict]:
+    async def _fallback_parse(self, page: Page) -> List[Dict]:
         """备用解析方法，直接查找页面中的链接"""
         articles = []
         try:
             # 查找所有微信文章链接
-            links = await self.page.query_selector_all("a[href*='mp.weixin.qq.com']")
+            links = await page.query_selector_all("a[href*='mp.weixin.qq.com']")
             
             for i, link in enumerate(links[:10]):  # 限制数量
                 try:
@@ -363,13 +603,7 @@ class WeChatArticleSearcher:
                     url = await link.get_attribute("href")
                     
                     if title and url:
-                        articles.append({
-                            "title": self._clean_text(title),
-                            "url": self._resolve_url(url),
-                            "source": "微信公众号",
-                            "date": datetime.now().strftime("%Y-%m-%d"),
-                            "snippet": ""
-                        })
+                        articles.append(normalize_article(title, self._resolve_url(url)))
                 except:
                     continue
                     
@@ -378,40 +612,6 @@ class WeChatArticleSearcher:
         
         return articles
     
-    def _parse_meta_info(self, meta_text: str) -> tuple:
-        """解析元信息，提取来源和时间"""
-        if not meta_text:
-            return "", ""
-        
-        # 尝试多种格式解析
-        patterns = [
-            r'(.+?)\s+(\d{4}-\d{2}-\d{2})',  # 来源 日期
-            r'(.+?)\s+(\d+天前|\d+小时前|\d+分钟前)',  # 来源 相对时间
-            r'(.+?)\s+(.+)',  # 通用格式
-        ]
-        
-        for pattern in patterns:
-            match = re.match(pattern, meta_text.strip())
-            if match:
-                return match.group(1).strip(), match.group(2).strip()
-        
-        # 如果没有匹配，返回原文本作为来源
-        return meta_text.strip(), ""
-    
-    def _clean_text(self, text: str) -> str:
-        """清理文本，移除多余空格和特殊字符"""
-        if not text:
-            return ""
-        
-        # 移除HTML标签
-        text = re.sub(r'<[^>]+>', '', text)
-        # 移除多余空格和换行
-        text = re.sub(r'\s+', ' ', text)
-        # 去除首尾空格
-        text = text.strip()
-        
-        return text
-    
     def _resolve_url(self, url: str) -> str:
         """解析URL，处理相对路径"""
         if not url:
@@ -448,7 +648,10 @@ async def get_wexin_article(query: str, top_num: int = 5) -> List[Dict]:
         文章列表
     """
     async with WeChatArticleSearcher() as searcher:
-        articles = await searcher.search_articles(query, top_num)
+        try:
+            articles = await searcher.search_articles(query, top_num)
+        except SearchBlockedError:
+            return []
         
         # 转换为兼容格式
         compatible_articles = []
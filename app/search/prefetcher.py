@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索预取
+每次搜索后，在浏览器和出口令牌空闲时预取同一查询的下一页结果，
+以及近期历史中紧随该查询出现的后续查询，写入缓存
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .results import RESULTS_PER_PAGE
+
+
+class PrefetchJob:
+    """一次预取任务"""
+
+    __slots__ = ("query", "max_results", "time_filter", "context", "reason")
+
+    def __init__(self, query: str, max_results: int, time_filter: Optional[str], context: Any, reason: str):
+        self.query = query
+        self.max_results = max_results
+        self.time_filter = time_filter
+        # 调用方的请求选项，原样传给执行函数
+        self.context = context
+        self.reason = reason
+
+    def key(self):
+        return (self.query, self.max_results, self.time_filter, repr(self.context))
+
+
+class SearchPrefetcher:
+    """基于后续查询共现统计的预取器"""
+
+    def __init__(self,
+                 runner: Callable[[PrefetchJob], Awaitable[bool]],
+                 is_idle: Callable[[], bool],
+                 max_results_limit: int = 20,
+                 followups: int = 2,
+                 followup_window: float = 300.0,
+                 max_history: int = 1000,
+                 max_pending: int = 2,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            runner: 执行预取并写入缓存，已有缓存时返回 False
+            is_idle: 是否有空闲容量（调度器无排队、出口令牌充足）
+            max_results_limit: 预取结果数量上限，不超过接口允许的最大结果数量
+            followups: 每次预取的后续查询数量
+            followup_window: 同一客户端两次查询间隔在此时间内视为后续查询（秒）
+            max_history: 最多记录的查询数量
+            max_pending: 同时进行的预取任务上限
+            clock: 时钟函数（测试时可替换）
+        """
+        self.runner = runner
+        self.is_idle = is_idle
+        self.max_results_limit = max_results_limit
+        self.followups = followups
+        self.followup_window = followup_window
+        self.max_history = max_history
+        self.max_pending = max_pending
+        self.clock = clock
+
+        self._followups: "OrderedDict[str, Counter]" = OrderedDict()
+        self._last_query: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._pending: Set[tuple] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.scheduled = 0
+        self.completed = 0
+        self.already_cached = 0
+        self.skipped_busy = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+
+    def record(self, client: Any, query: str):
+        """记录客户端的查询序列，统计查询之后紧随出现的查询"""
+        now = self.clock()
+        last = self._last_query.pop(client, None)
+        if last is not None:
+            last_query, last_time = last
+            if last_query != query and now - last_time <= self.followup_window:
+                counter = self._followups.pop(last_query, None) or Counter()
+                counter[query] += 1
+                self._followups[last_query] = counter
+                while len(self._followups) > self.max_history:
+                    self._followups.popitem(last=False)
+        self._last_query[client] = (query, now)
+        while len(self._last_query) > self.max_history:
+            self._last_query.popitem(last=False)
+
+    def candidates(self, query: str, max_results: int, time_filter: Optional[str], context: Any) -> List[PrefetchJob]:
+        """生成预取任务：下一页结果及最常见的后续查询"""
+        jobs = []
+        # 已服务的结果页之后的一页；前面的页已在缓存中，上游只读取这一页
+        next_page = (-(-max_results // RESULTS_PER_PAGE) + 1) * RESULTS_PER_PAGE
+        if next_page <= self.max_results_limit:
+            jobs.append(PrefetchJob(query, next_page, time_filter, context, "next_page"))
+        counter = self._followups.get(query)
+        if counter:
+            for followup, _ in counter.most_common(self.followups):
+                jobs.append(PrefetchJob(followup, max_results, time_filter, context, "followup"))
+        return jobs
+
+    def after_search(self, client: Any, query: str, max_results: int, time_filter: Optional[str], context: Any = None):
+        """在一次搜索返回后调用：记录历史并在空闲时启动预取"""
+        self.record(client, query)
+        for job in self.candidates(query, max_results, time_filter, context):
+            key = job.key()
+            if key in self._pending:
+                continue
+            if len(self._pending) >= self.max_pending or not self.is_idle():
+                self.skipped_busy += 1
+                continue
+            self._pending.add(key)
+            self.scheduled += 1
+            task = asyncio.create_task(self._run(job, key))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: PrefetchJob, key: tuple):
+        try:
+            if await self.runner(job):
+                self.completed += 1
+                self.logger.info(f"预取完成: {job.query} ({job.reason}, {job.max_results})")
+            else:
+                self.already_cached += 1
+        except Exception as e:
+            self.failed += 1
+            self.logger.debug(f"预取失败: {job.query}, {str(e)}")
+        finally:
+            self._pending.discard(key)
+
+    async def close(self):
+        """取消进行中的预取"""
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self, prefetch_hits: Optional[int] = None) -> Dict:
+        """获取预取统计，prefetch_hits 为缓存中预取条目被命中的次数"""
+        stats = {
+            "scheduled": self.scheduled,
+            "completed": self.completed,
+            "already_cached": self.already_cached,
+            "skipped_busy": self.skipped_busy,
+            "failed": self.failed,
+            "pending": len(self._pending),
+            "tracked_queries": len(self._followups),
+        }
+        if prefetch_hits is not None:
+            stats["hits"] = prefetch_hits
+            stats["hit_ratio"] = round(prefetch_hits / self.completed, 4) if self.completed else 0.0
+        return stats
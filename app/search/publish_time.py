@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+发布时间规范化
+将搜狗返回的相对/绝对时间转换为 epoch 时间戳，支持在缓存数据上按时间筛选、排序和合并
+"""
+
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+# 搜狗微信搜索的时间均为北京时间
+CHINA_TZ = timezone(timedelta(hours=8))
+
+# 时间筛选对应的时间窗口（秒），与搜狗 tsn 参数一致
+TIME_FILTER_SECONDS = {
+    "day": 86400,
+    "week": 7 * 86400,
+    "month": 30 * 86400,
+    "year": 365 * 86400,
+}
+
+_RELATIVE_PATTERN = re.compile(r'(\d+)\s*(秒|分钟|小时|天|周|个月|月)前')
+_DATE_PATTERN = re.compile(
+    r'(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})日?(?:\s+(\d{1,2}):(\d{2}))?'
+)
+_EPOCH_PATTERN = re.compile(r'^\d{9,11}$')
+
+_RELATIVE_UNITS = {
+    "秒": 1,
+    "分钟": 60,
+    "小时": 3600,
+    "天": 86400,
+    "周": 7 * 86400,
+    "个月": 30 * 86400,
+    "月": 30 * 86400,
+}
+
+_DAY_WORDS = {"今天": 0, "昨天": 1, "前天": 2}
+
+
+def parse_publish_time(text: str, now: Optional[float] = None) -> Optional[int]:
+    """将时间文本转换为 epoch 时间戳，无法识别时返回 None
+
+    支持 epoch 数字、2024-01-02 / 2024年1月2日（可带时分）、N天前/小时前/分钟前、
+    刚刚、今天/昨天/前天 等格式。
+    """
+    if not text:
+        return None
+    text = text.strip()
+    now = time.time() if now is None else now
+
+    if _EPOCH_PATTERN.match(text):
+        return int(text)
+
+    match = _DATE_PATTERN.search(text)
+    if match:
+        year, month, day, hour, minute = match.groups()
+        try:
+            moment = datetime(int(year), int(month), int(day),
+                              int(hour or 0), int(minute or 0), tzinfo=CHINA_TZ)
+        except ValueError:
+            return None
+        return int(moment.timestamp())
+
+    match = _RELATIVE_PATTERN.search(text)
+    if match:
+        return int(now - int(match.group(1)) * _RELATIVE_UNITS[match.group(2)])
+
+    if "刚刚" in text:
+        return int(now)
+
+    for word, days_ago in _DAY_WORDS.items():
+        if word in text:
+            today = datetime.fromtimestamp(now, CHINA_TZ).replace(hour=0, minute=0, second=0, microsecond=0)
+            return int((today - timedelta(days=days_ago)).timestamp())
+
+    return None
+
+
+def format_date(timestamp: Optional[int]) -> str:
+    """将时间戳格式化为北京时间日期"""
+    if timestamp is None:
+        return ""
+    return datetime.fromtimestamp(timestamp, CHINA_TZ).strftime("%Y-%m-%d")
+
+
+def time_filter_cutoff(time_filter: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """时间筛选对应的最早发布时间，不筛选时返回 None"""
+    if not time_filter:
+        return None
+    window = TIME_FILTER_SECONDS.get(time_filter.lower())
+    if window is None:
+        return None
+    return (time.time() if now is None else now) - window
+
+
+def sort_by_time(articles: Iterable[Dict], newest_first: bool = True) -> List[Dict]:
+    """按发布时间排序，发布时间未知的文章排在最后"""
+    articles = list(articles)
+    known = [a for a in articles if a.get("publish_ts") is not None]
+    unknown = [a for a in articles if a.get("publish_ts") is None]
+    known.sort(key=lambda a: a["publish_ts"], reverse=newest_first)
+    return known + unknown
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+租户配额
+按 API Key 区分租户，按请求的实际开销计费：缓存命中几乎免费，
+上游搜索按结果页、正文抓取和链接解析按篇计费；
+计数保存在 limits 的存储后端（memory://、redis:// 等），多实例可共用，
+以滑动窗口计数近似令牌桶（窗口配额即桶容量，按窗口匀速恢复）
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict
+
+from limits import parse
+from limits.aio.strategies import SlidingWindowCounterRateLimiter
+from limits.storage import storage_from_string
+
+from .errors import QuotaExceededError
+from .results import RESULTS_PER_PAGE
+
+# 计费单位
+CACHE_HIT_COST = 1
+UPSTREAM_PAGE_COST = 100
+CONTENT_FETCH_COST = 50
+LINK_RESOLVE_COST = 10
+
+
+def search_cost(plan: str,
+                max_results: int,
+                resolve_links: bool = False,
+                include_content: bool = False,
+                content_top_k: int = 3) -> int:
+    """一次搜索的开销；plan 为 SearchService.plan 的预判结果"""
+    if plan != "upstream":
+        # 缓存命中或合并到进行中的相同搜索，不产生上游请求
+        return CACHE_HIT_COST
+    # 按需要读取的结果页数计费，前几页已有缓存时实际开销更低
+    cost = -(-max_results // RESULTS_PER_PAGE) * UPSTREAM_PAGE_COST
+    if include_content:
+        cost += min(content_top_k, max_results) * CONTENT_FETCH_COST
+    if resolve_links:
+        cost += max_results * LINK_RESOLVE_COST
+    return cost
+
+
+def fetch_cost(url_count: int) -> int:
+    """正文抓取的开销"""
+    return url_count * CONTENT_FETCH_COST
+
+
+def parse_api_keys(spec: str) -> Dict[str, str]:
+    """解析 "租户:key,租户:key" 格式的配置，返回 key -> 租户"""
+    keys = {}
+    for item in spec.split(","):
+        tenant, sep, key = item.strip().partition(":")
+        if sep and tenant and key:
+            keys[key.strip()] = tenant.strip()
+    return keys
+
+
+class _TenantUsage:
+    """单个租户的用量统计"""
+
+    __slots__ = ("requests", "cache_hits", "upstream", "units", "rejected", "last_seen")
+
+    def __init__(self):
+        self.requests = 0
+        self.cache_hits = 0
+        self.upstream = 0
+        self.units = 0
+        self.rejected = 0
+        self.last_seen = 0.0
+
+
+class TenantQuota:
+    """按租户计费的配额"""
+
+    def __init__(self,
+                 limit: str = "1000/minute",
+                 storage_uri: str = "memory://",
+                 max_tracked: int = 10000):
+        """
+        Args:
+            limit: 每个租户的配额，limits 格式，如 1000/minute
+            storage_uri: 计数存储，如 memory://、redis://host:6379
+            max_tracked: 本地最多统计的租户数量
+        """
+        self.item = parse(limit)
+        self.storage_uri = storage_uri
+        if not storage_uri.startswith("async+"):
+            storage_uri = f"async+{storage_uri}"
+        self.limiter = SlidingWindowCounterRateLimiter(storage_from_string(storage_uri))
+        self.max_tracked = max_tracked
+        self.enabled = True
+
+        self._usage: "OrderedDict[str, _TenantUsage]" = OrderedDict()
+        self.logger = logging.getLogger(__name__)
+
+    def _usage_for(self, tenant: str) -> _TenantUsage:
+        usage = self._usage.pop(tenant, None) or _TenantUsage()
+        self._usage[tenant] = usage
+        while len(self._usage) > self.max_tracked:
+            self._usage.popitem(last=False)
+        return usage
+
+    async def charge(self, tenant: str, cost: int, kind: str = "upstream"):
+        """扣除配额，不足时抛出 QuotaExceededError
+
+        Args:
+            tenant: 租户
+            cost: 开销，超过窗口配额时按配额计
+            kind: cached / coalesced / upstream，仅用于统计
+        """
+        usage = self._usage_for(tenant)
+        usage.last_seen = time.time()
+        cost = min(max(cost, 0), self.item.amount)
+        if self.enabled and cost and not await self.limiter.hit(self.item, tenant, cost=cost):
+            usage.rejected += 1
+            window = await self.limiter.get_window_stats(self.item, tenant)
+            retry_after = max(1.0, window.reset_time - time.time())
+            self.logger.warning(f"租户 {tenant} 配额不足: 需要 {cost}, 剩余 {window.remaining}")
+            raise QuotaExceededError("配额已用完，请稍后重试", tenant=tenant, retry_after=retry_after)
+
+        usage.requests += 1
+        usage.units += cost
+        if kind == "upstream":
+            usage.upstream += 1
+        else:
+            usage.cache_hits += 1
+
+    async def remaining(self, tenant: str) -> int:
+        window = await self.limiter.get_window_stats(self.item, tenant)
+        return window.remaining
+
+    async def stats(self, max_tenants: int = 100) -> Dict:
+        """获取配额和最近活跃租户的用量"""
+        tenants = {}
+        for tenant, usage in list(reversed(self._usage.items()))[:max_tenants]:
+            tenants[tenant] = {
+                "requests": usage.requests,
+                "cache_hits": usage.cache_hits,
+                "upstream": usage.upstream,
+                "units": usage.units,
+                "rejected": usage.rejected,
+                "remaining": await self.remaining(tenant),
+                "last_seen": usage.last_seen,
+            }
+        return {
+            "enabled": self.enabled,
+            "limit": str(self.item),
+            "backend": self.storage_uri.split(":", 1)[0],
+            "costs": {
+                "cache_hit": CACHE_HIT_COST,
+                "upstream_page": UPSTREAM_PAGE_COST,
+                "content_fetch": CONTENT_FETCH_COST,
+                "link_resolve": LINK_RESOLVE_COST,
+            },
+            "tracked_tenants": len(self._usage),
+            "tenants": tenants,
+        }
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出站速率调节器
+基于令牌桶 + AIMD 的自适应限速，控制对搜狗微信搜索的总请求速率
+"""
+
+import asyncio
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+
+class AdaptiveRateGovernor:
+    """自适应出站速率调节器
+
+    - 令牌桶：按当前速率补充令牌，每次访问搜狗前消耗一个令牌
+    - 加性增：请求成功且速率确实限制了调用方（有请求在等待令牌）时缓慢提高速率，
+      空闲时不增长，避免低负载期间速率虚高、流量回升时一次突发触发拦截
+    - 乘性减：检测到验证码/反爬页面时速率减半，并进入冷却期
+    """
+
+    def __init__(self,
+                 initial_rate: float = 0.5,
+                 min_rate: float = 0.05,
+                 max_rate: float = 3.0,
+                 burst: int = 3,
+                 increase_step: float = 0.02,
+                 decrease_factor: float = 0.5,
+                 cooldown: float = 60.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            initial_rate: 初始速率（请求/秒）
+            min_rate: 最低速率
+            max_rate: 最高速率
+            burst: 令牌桶容量（允许的突发请求数）
+            increase_step: 每次成功后增加的速率
+            decrease_factor: 被拦截后速率乘以的系数
+            cooldown: 被拦截后暂停出站请求的时间（秒）
+            clock: 时钟函数（测试时可替换）
+        """
+        self.rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self.cooldown = cooldown
+        self.clock = clock
+
+        self.tokens = float(burst)
+        self.last_refill = clock()
+        self.blocked_until = 0.0
+        # 上次被拦截时的速率，接近该速率时放慢增长
+        self.last_block_rate: Optional[float] = None
+
+        self.success_count = 0
+        self.block_count = 0
+        self.total_wait = 0.0
+        self.waiting = 0
+        # 自上次提速以来是否有请求因令牌不足而等待
+        self.throttled = False
+
+        self._lock = asyncio.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def _refill(self, now: float):
+        """按当前速率补充令牌"""
+        elapsed = now - self.last_refill
+        if elapsed > 0:
+            self.tokens = min(float(self.burst), self.tokens + elapsed * self.rate)
+            self.last_refill = now
+
+    async def acquire(self):
+        """获取一个出站令牌，必要时等待"""
+        self.waiting += 1
+        start = self.clock()
+        try:
+            # 串行化等待者，保证先到先得
+            async with self._lock:
+                while True:
+                    now = self.clock()
+                    if now < self.blocked_until:
+                        await asyncio.sleep(self.blocked_until - now)
+                        continue
+
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+
+                    self.throttled = True
+                    await asyncio.sleep((1 - self.tokens) / self.rate)
+        finally:
+            self.waiting -= 1
+            self.total_wait += self.clock() - start
+
+    def expected_wait(self) -> float:
+        """估算下一个令牌可用前需要等待的时间（秒）"""
+        now = self.clock()
+        self._refill(now)
+        wait = max(0.0, self.blocked_until - now)
+        if self.tokens < 1:
+            wait += (1 - self.tokens) / self.rate
+        # 已排队的请求会先消耗令牌
+        return wait + self.waiting / self.rate
+
+    def on_success(self):
+        """请求成功；有请求在等待令牌或近期因令牌不足等待过时，加性提高速率"""
+        self.success_count += 1
+        if not (self.waiting or self.throttled):
+            return
+        self.throttled = False
+        step = self.increase_step
+        # 接近上次被拦截的速率时谨慎增长，尽量停留在可持续速率附近
+        if self.last_block_rate and self.rate >= self.last_block_rate * 0.9:
+            step /= 4
+        self.rate = min(self.max_rate, self.rate + step)
+
+    def on_blocked(self):
+        """检测到反爬页面，乘性降低速率并进入冷却期"""
+        self.block_count += 1
+        self.last_block_rate = self.rate
+        self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+        self.tokens = 0.0
+        self.throttled = False
+        self.last_refill = self.clock()
+        self.blocked_until = self.last_refill + self.cooldown
+        self.logger.warning(
+            f"检测到反爬拦截，出站速率降至 {self.rate:.3f}/s，冷却 {self.cooldown:.0f}s"
+        )
+
+    def stats(self) -> Dict:
+        """获取调节器当前状态"""
+        now = self.clock()
+        self._refill(now)
+        return {
+            "rate": round(self.rate, 4),
+            "min_rate": self.min_rate,
+            "max_rate": self.max_rate,
+            "tokens": round(self.tokens, 2),
+            "burst": self.burst,
+            "waiting": self.waiting,
+            "cooldown_remaining": round(max(0.0, self.blocked_until - now), 1),
+            "last_block_rate": round(self.last_block_rate, 4) if self.last_block_rate else None,
+            "success_count": self.success_count,
+            "block_count": self.block_count,
+            "total_wait": round(self.total_wait, 2),
+        }
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索样本回放
+将 SampleArchive 中保存的原始页面经浏览器路由拦截重新交给搜索器解析，
+全程不访问网络，用于对比解析结果是否变化以及解析耗时的回归
+"""
+
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from .errors import SearchBlockedError
+from .identity_pool import EgressIdentity, IdentityPool
+from .playwright_search import WeChatArticleSearcher
+from .rate_governor import AdaptiveRateGovernor
+from .results import RESULTS_PER_PAGE
+from .sample_archive import SampleArchive
+
+
+def _percentile(values: List[float], pct: float) -> Optional[float]:
+    values = sorted(values)
+    if not values:
+        return None
+    return round(values[min(len(values) - 1, int(len(values) * pct / 100))], 4)
+
+
+def _article_keys(articles: List[Dict]) -> List[tuple]:
+    return [(a.get("title"), a.get("url")) for a in articles]
+
+
+class ReplaySearcher(WeChatArticleSearcher):
+    """回放搜索器：导航请求由当前样本的 HTML 应答，其余请求一律中止"""
+
+    def __init__(self, **kwargs):
+        # 回放不需要限速和隔离
+        kwargs.setdefault("identity_pool", IdentityPool(
+            [EgressIdentity("replay", rate_governor=AdaptiveRateGovernor(
+                initial_rate=1e6, min_rate=1e6, max_rate=1e6, burst=1000000, cooldown=0))],
+            quarantine_base=0, quarantine_max=0))
+        super().__init__(**kwargs)
+        self._sample: Optional[Dict[str, Any]] = None
+        self.logger = logging.getLogger(__name__)
+
+    async def _intercept_request(self, route):
+        request = route.request
+        sample = self._sample
+        if sample is None or not request.is_navigation_request():
+            await route.abort()
+            return
+        final_url = sample.get("final_url") or sample.get("url")
+        if request.url != final_url and request.url == sample.get("url"):
+            # 录制时发生过跳转（如反爬验证页），按原样重定向
+            await route.fulfill(status=302, headers={"location": final_url})
+            return
+        await route.fulfill(status=200, content_type="text/html; charset=utf-8", body=sample.get("html", ""))
+
+    async def replay(self, sample: Dict[str, Any]) -> Dict[str, Any]:
+        """回放一个样本，返回与录制结果的对比"""
+        self._sample = sample
+        blocked = False
+        started = time.monotonic()
+        try:
+            # 每个样本是一页结果，按整页解析
+            articles = await self.search_articles(sample["query"],
+                                                  max_results=RESULTS_PER_PAGE,
+                                                  time_filter=sample.get("time_filter"),
+                                                  start_page=sample.get("page", 1))
+        except SearchBlockedError:
+            articles, blocked = [], True
+        finally:
+            self._sample = None
+        elapsed = time.monotonic() - started
+
+        expected = _article_keys(sample.get("articles", []))
+        actual = _article_keys(articles)
+        return {
+            "file": sample.get("file"),
+            "query": sample["query"],
+            "matched": expected == actual and blocked == sample.get("blocked", False),
+            "blocked": blocked,
+            "recorded_blocked": sample.get("blocked", False),
+            "recorded_count": len(expected),
+            "replayed_count": len(actual),
+            "missing": [title for title, url in expected if (title, url) not in actual],
+            "extra": [title for title, url in actual if (title, url) not in expected],
+            "elapsed": round(elapsed, 4),
+            "recorded_timings": sample.get("timings", {}),
+        }
+
+
+async def replay_archive(archive: SampleArchive,
+                         limit: Optional[int] = None,
+                         searcher: Optional[ReplaySearcher] = None) -> Dict[str, Any]:
+    """回放归档中的样本，汇总解析差异和耗时分布"""
+    own_searcher = searcher is None
+    searcher = searcher or ReplaySearcher(headless=True)
+    results = []
+    try:
+        for sample in archive:
+            if limit is not None and len(results) >= limit:
+                break
+            results.append(await searcher.replay(sample))
+    finally:
+        if own_searcher:
+            await searcher.close()
+
+    replayed = [r["elapsed"] for r in results]
+    recorded_parse = [r["recorded_timings"]["parse"] for r in results if "parse" in r["recorded_timings"]]
+    recorded_total = [r["recorded_timings"]["total"] for r in results if "total" in r["recorded_timings"]]
+    return {
+        "samples": len(results),
+        "matched": sum(1 for r in results if r["matched"]),
+        "changed": [{k: r[k] for k in ("file", "query", "recorded_count", "replayed_count", "missing", "extra",
+                                       "blocked", "recorded_blocked")}
+                    for r in results if not r["matched"]],
+        "replay_time": {"p50": _percentile(replayed, 50), "p95": _percentile(replayed, 95)},
+        "recorded_parse_time": {"p50": _percentile(recorded_parse, 50), "p95": _percentile(recorded_parse, 95)},
+        "recorded_total_time": {"p50": _percentile(recorded_total, 50), "p95": _percentile(recorded_total, 95)},
+    }
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索结果缓存
+缓存条目只保存文章记录引用和少量元信息，文章本体由 ArticleStore 共享；
+较窄的时间筛选可以由较宽时间筛选的缓存结果在本地过滤得到
+"""
+
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from .article_store import ArticleRecord, ArticleStore, stable_article_key
+from .publish_time import time_filter_cutoff
+
+# 每种时间筛选可以由哪些更宽的筛选结果推导，按从窄到宽排列
+WIDER_TIME_FILTERS = {
+    "day": ("week", "month", "year"),
+    "week": ("month", "year"),
+    "month": ("year",),
+    "year": (),
+}
+
+
+# 每个缓存条目最多保留的预编码响应数量
+MAX_ENCODED_VARIANTS = 8
+
+
+def make_cache_key(base_key: str, time_filter: Optional[str]) -> str:
+    """组合查询键和时间筛选"""
+    return f"{base_key}|{time_filter or 'all'}"
+
+
+class CacheEntry:
+    """一次查询的缓存结果"""
+
+    __slots__ = ("records", "requested", "query", "search_time", "timestamp", "cached_at", "include_content",
+                 "raw_queries", "prefetched", "exhaustive", "encoded")
+
+    def __init__(self,
+                 records: Tuple[ArticleRecord, ...],
+                 requested: int,
+                 query: str,
+                 search_time: float,
+                 timestamp: str,
+                 include_content: bool,
+                 raw_query: Optional[str] = None,
+                 prefetched: bool = False,
+                 exhaustive: bool = False):
+        self.records = records
+        self.requested = requested
+        self.query = query
+        self.search_time = search_time
+        self.timestamp = timestamp
+        self.cached_at = time.time()
+        self.include_content = include_content
+        # 规范化前出现过的原始查询写法，用于统计规范化带来的额外命中
+        self.raw_queries = {raw_query} if raw_query is not None else set()
+        # 由预取写入且尚未被请求命中
+        self.prefetched = prefetched
+        # 搜索器确认已取得该查询的全部结果（结果页正常加载且不足一整页）
+        self.exhaustive = exhaustive
+        # 预编码的响应字节，按响应变体和命中的记录区分
+        self.encoded: Dict[tuple, bytes] = {}
+
+    def age(self) -> float:
+        """缓存条目存在的时间（秒）"""
+        return time.time() - self.cached_at
+
+    def is_exhaustive(self) -> bool:
+        """已包含该查询的全部结果，可以回答请求数量更大的查询
+
+        结果少于请求数量本身不能说明这一点：搜索器只读取一页结果，出错时也可能返回空结果
+        """
+        return self.exhaustive
+
+    def articles(self) -> List[Dict]:
+        """还原为文章字典列表"""
+        return [record.to_dict(self.include_content) for record in self.records]
+
+
+class CacheHit:
+    """缓存命中结果：条目及截取/过滤后的文章记录"""
+
+    __slots__ = ("entry", "records", "derived_from")
+
+    def __init__(self, entry: CacheEntry, records: Tuple[ArticleRecord, ...], derived_from: Optional[str] = None):
+        self.entry = entry
+        self.records = records
+        # 由更宽时间筛选推导时记录来源筛选
+        self.derived_from = derived_from
+
+    def articles(self) -> List[Dict]:
+        """还原为文章字典列表"""
+        return [record.to_dict(self.entry.include_content) for record in self.records]
+
+    def encoded(self, variant: Hashable, encode: Callable[["CacheHit"], bytes]) -> bytes:
+        """获取该命中结果的预编码响应，首次使用时编码；文章记录被刷新后重新编码"""
+        key = (variant, self.records, max((r.updated_at for r in self.records), default=0.0))
+        memo = self.entry.encoded
+        data = memo.get(key)
+        if data is None:
+            data = encode(self)
+            if len(memo) >= MAX_ENCODED_VARIANTS:
+                memo.clear()
+            memo[key] = data
+        return data
+
+
+def transient_hit(articles: List[Dict],
+                  requested: int,
+                  query: str,
+                  search_time: float,
+                  timestamp: str,
+                  include_content: bool = False) -> CacheHit:
+    """不写入缓存的结果，与缓存命中使用同样的接口"""
+    records = tuple(ArticleRecord(stable_article_key(a), a) for a in articles)
+    entry = CacheEntry(records, requested, query, search_time, timestamp, include_content)
+    return CacheHit(entry, records)
+
+
+class SearchResultCache:
+    """LRU 搜索结果缓存，过期条目保留用于被拦截时降级返回"""
+
+    def __init__(self, store: Optional[ArticleStore] = None, max_entries: int = 1000):
+        """
+        Args:
+            store: 共享文章存储
+            max_entries: 最多保留的查询条目数，超出时淘汰最久未使用的条目
+        """
+        self.store = store or ArticleStore()
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+
+        self.hits = 0
+        self.derived_hits = 0
+        self.normalization_hits = 0
+        self.prefetch_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str, max_age: Optional[float] = None) -> Optional[CacheEntry]:
+        """获取缓存条目，max_age 为空时忽略过期时间"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if max_age is not None and entry.age() >= max_age:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def lookup(self,
+               base_key: str,
+               time_filter: Optional[str],
+               max_results: int,
+               max_age: Optional[float] = None,
+               raw_query: Optional[str] = None) -> Optional[CacheHit]:
+        """查找可以满足请求的缓存结果
+
+        先查同一时间筛选的条目（缓存的数量足够，或已是全部结果）；
+        未命中时用更宽时间筛选的条目按发布时间本地过滤，过滤后数量足够时命中。
+        raw_query 为规范化前的查询，该写法首次命中某条目时计为规范化带来的命中。
+        """
+        hit = self.peek(base_key, time_filter, max_results, max_age)
+        if hit is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        if hit.derived_from:
+            self.derived_hits += 1
+        self._note_raw_query(hit.entry, raw_query)
+        if hit.entry.prefetched:
+            hit.entry.prefetched = False
+            self.prefetch_hits += 1
+        return hit
+
+    def peek(self,
+             base_key: str,
+             time_filter: Optional[str],
+             max_results: int,
+             max_age: Optional[float] = None) -> Optional[CacheHit]:
+        """查找可以满足请求的缓存结果，不计入命中统计"""
+        entry = self.get(make_cache_key(base_key, time_filter), max_age)
+        if entry is not None and (entry.requested >= max_results or entry.is_exhaustive()):
+            return CacheHit(entry, entry.records[:max_results])
+
+        if time_filter:
+            cutoff = time_filter_cutoff(time_filter)
+            for wider in WIDER_TIME_FILTERS.get(time_filter, ()):
+                wider_entry = self.get(make_cache_key(base_key, wider), max_age)
+                if wider_entry is None:
+                    continue
+                records = tuple(
+                    r for r in wider_entry.records
+                    if r.publish_ts is not None and r.publish_ts >= cutoff
+                )
+                if len(records) >= max_results or wider_entry.is_exhaustive():
+                    return CacheHit(wider_entry, records[:max_results], derived_from=wider)
+        return None
+
+    def _note_raw_query(self, entry: CacheEntry, raw_query: Optional[str]):
+        """记录命中条目的原始查询写法，未见过的写法说明命中来自查询规范化"""
+        if raw_query is None or raw_query in entry.raw_queries:
+            return
+        entry.raw_queries.add(raw_query)
+        self.normalization_hits += 1
+
+    def put(self,
+            base_key: str,
+            time_filter: Optional[str],
+            requested: int,
+            articles: List[Dict],
+            query: str,
+            search_time: float,
+            timestamp: str,
+            include_content: bool = False,
+            raw_query: Optional[str] = None,
+            prefetched: bool = False,
+            exhaustive: bool = False) -> CacheEntry:
+        """写入查询结果，文章写入共享存储；exhaustive 由搜索器给出，见 CacheEntry.is_exhaustive"""
+        key = make_cache_key(base_key, time_filter)
+        records = tuple(self.store.acquire(articles))
+        self._discard(key)
+        entry = CacheEntry(records, requested, query, search_time, timestamp, include_content, raw_query,
+                           prefetched, exhaustive)
+        self._entries[key] = entry
+
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.store.release(evicted.records)
+        return entry
+
+    def _discard(self, key: str):
+        """移除条目并释放文章引用"""
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.store.release(entry.records)
+
+    def clear(self) -> int:
+        """清空缓存，返回清理的条目数"""
+        count = len(self._entries)
+        self._entries.clear()
+        self.store.clear()
+        return count
+
+    def stats(self) -> Dict:
+        """获取缓存统计"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "derived_hits": self.derived_hits,
+            "normalization_hits": self.normalization_hits,
+            "prefetch_hits": self.prefetch_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "article_store": self.store.stats(),
+        }
@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+上游搜索结果
+搜索器返回的文章列表附带本次搜索的完整性信息，缓存据此决定能否用较少的结果回答较大的请求
+"""
+
+from typing import Dict, Iterable, List
+
+# 搜狗每页结果数
+RESULTS_PER_PAGE = 10
+
+
+class SearchResults(list):
+    """文章列表
+
+    exhaustive: 结果页正常加载且解析到的条目少于一整页，说明已包含该查询的全部结果
+    failed: 搜索过程出错，列表为空但并不代表没有结果，不能写入缓存
+    """
+
+    __slots__ = ("exhaustive", "failed")
+
+    def __init__(self, articles: Iterable[Dict] = (), exhaustive: bool = False, failed: bool = False):
+        super().__init__(articles)
+        self.exhaustive = exhaustive
+        self.failed = failed
+
+
+def truncate_results(articles: List[Dict], limit: int) -> List[Dict]:
+    """原地只保留前 limit 篇；截掉了文章的结果不再是全部结果"""
+    if len(articles) > limit:
+        del articles[limit:]
+        if isinstance(articles, SearchResults):
+            articles.exhaustive = False
+    return articles
+
+
+def is_exhaustive(articles) -> bool:
+    """普通列表（替身搜索器等）不携带完整性信息，按不完整处理"""
+    return getattr(articles, "exhaustive", False)
+
+
+def is_failed(articles) -> bool:
+    return getattr(articles, "failed", False)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索样本归档
+按采样率（以及解析为空或耗时过长时）保存搜狗返回的原始 HTML、各阶段耗时和解析结果，
+每个样本一个 gzip 压缩的 JSON 文件，总大小超出上限时删除最早的样本；
+归档可由 replay 模块离线回放，用于页面改版后的回归和性能检查
+"""
+
+import asyncio
+import gzip
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, Optional
+
+from . import json_codec
+from .data_dir import default_data_dir
+
+SAMPLE_VERSION = 1
+SAMPLE_SUFFIX = ".json.gz"
+
+
+class SampleArchive:
+    """大小受限的搜索样本归档"""
+
+    def __init__(self,
+                 path: str,
+                 sample_rate: float = 0.01,
+                 max_bytes: int = 200 * 1024 * 1024,
+                 slow_threshold: Optional[float] = 10.0,
+                 record_empty: bool = True,
+                 rng: Callable[[], float] = random.random):
+        """
+        Args:
+            path: 归档目录
+            sample_rate: 随机采样比例（0-1）
+            max_bytes: 归档总大小上限（字节）
+            slow_threshold: 搜索总耗时超过该值（秒）时总是保存，None 表示不按耗时保存
+            record_empty: 解析结果为空或命中反爬页时总是保存
+            rng: 随机数函数（测试时可替换）
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.slow_threshold = slow_threshold
+        self.record_empty = record_empty
+        self.rng = rng
+
+        # 按时间顺序的 (文件名, 大小)，首次写入时从目录加载
+        self._files: Optional[deque] = None
+        self._total_bytes = 0
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+        self.recorded = 0
+        self.evicted = 0
+        self.failed = 0
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls, data_dir: Optional[str] = None) -> Optional["SampleArchive"]:
+        """按环境变量创建归档，未开启采样时返回 None"""
+        sample_rate = float(os.getenv("WEIXIN_SEARCH_SAMPLE_RATE", "0") or 0)
+        if sample_rate <= 0:
+            return None
+        path = os.getenv("WEIXIN_SEARCH_SAMPLE_DIR") or os.path.join(data_dir or default_data_dir(), "samples")
+        max_mb = float(os.getenv("WEIXIN_SEARCH_SAMPLE_MAX_MB", "200") or 200)
+        return cls(path, sample_rate=min(sample_rate, 1.0), max_bytes=int(max_mb * 1024 * 1024))
+
+    def should_record(self, total_time: float, result_count: int, blocked: bool = False) -> bool:
+        """搜索结束后决定是否保存本次样本"""
+        if self.record_empty and (blocked or result_count == 0):
+            return True
+        if self.slow_threshold is not None and total_time >= self.slow_threshold:
+            return True
+        return self.rng() < self.sample_rate
+
+    async def save(self, sample: Dict[str, Any]) -> Optional[str]:
+        """在线程中压缩并写入样本，返回文件路径；失败时只记录日志"""
+        try:
+            return await asyncio.to_thread(self.write, sample)
+        except Exception as e:
+            self.failed += 1
+            self.logger.warning(f"保存搜索样本失败: {str(e)}")
+            return None
+
+    def write(self, sample: Dict[str, Any]) -> str:
+        """压缩写入一个样本并按大小上限淘汰最早的样本"""
+        sample = dict(sample, version=SAMPLE_VERSION)
+        data = gzip.compress(json_codec.dumps(sample), compresslevel=6)
+        with self._lock:
+            return self._write_locked(data)
+
+    def _write_locked(self, data: bytes) -> str:
+        os.makedirs(self.path, exist_ok=True)
+        if self._files is None:
+            self._load_index()
+        name = f"{time.time_ns():020d}-{os.getpid()}-{next(self._counter):06d}{SAMPLE_SUFFIX}"
+        target = os.path.join(self.path, name)
+        tmp = target + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, target)
+
+        self._files.append((name, len(data)))
+        self._total_bytes += len(data)
+        self.recorded += 1
+        self._enforce_cap()
+        return target
+
+    def _load_index(self):
+        self._files = deque()
+        self._total_bytes = 0
+        for name in self._list_names():
+            try:
+                size = os.path.getsize(os.path.join(self.path, name))
+            except OSError:
+                continue
+            self._files.append((name, size))
+            self._total_bytes += size
+
+    def _enforce_cap(self):
+        # 至少保留刚写入的样本
+        while self._total_bytes > self.max_bytes and len(self._files) > 1:
+            name, size = self._files.popleft()
+            self._total_bytes -= size
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            self.evicted += 1
+
+    def _list_names(self):
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(n for n in os.listdir(self.path) if n.endswith(SAMPLE_SUFFIX))
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        """按时间顺序逐个读取样本，每个样本带 file 字段"""
+        for name in self._list_names():
+            try:
+                sample = load_sample(os.path.join(self.path, name))
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"跳过损坏的样本 {name}: {str(e)}")
+                continue
+            sample["file"] = name
+            yield sample
+
+    def __len__(self) -> int:
+        return len(self._list_names())
+
+    def stats(self) -> Dict:
+        """获取归档统计"""
+        return {
+            "path": self.path,
+            "sample_rate": self.sample_rate,
+            "samples": len(self._files) if self._files is not None else len(self),
+            "bytes": self._total_bytes,
+            "max_bytes": self.max_bytes,
+            "recorded": self.recorded,
+            "evicted": self.evicted,
+            "failed": self.failed,
+        }
+
+
+def load_sample(path: str) -> Dict[str, Any]:
+    """读取一个样本文件"""
+    with gzip.open(path, "rb") as f:
+        return json_codec.loads(f.read())
@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索优先级调度
+交互式、智能体和批量请求分级排队，严格按优先级分派浏览器并发槽位；
+队列已满、预计等待超出预算或排队超时的请求被拒绝，由调用方返回 503
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Union
+
+from .errors import SearchOverloadedError
+
+
+class PriorityClass:
+    """优先级类别配置"""
+
+    def __init__(self, name: str, max_queue: int, max_queue_time: float, wait_budget: float):
+        """
+        Args:
+            name: 类别名称
+            max_queue: 队列最大长度
+            max_queue_time: 排队超时时间（秒），超时的请求被移出队列
+            wait_budget: 预计等待时间预算（秒），超出时直接拒绝
+        """
+        self.name = name
+        self.max_queue = max_queue
+        self.max_queue_time = max_queue_time
+        self.wait_budget = wait_budget
+
+
+# 按优先级从高到低排列
+DEFAULT_PRIORITY_CLASSES = (
+    PriorityClass("interactive", max_queue=20, max_queue_time=10.0, wait_budget=8.0),
+    PriorityClass("agent", max_queue=50, max_queue_time=30.0, wait_budget=25.0),
+    PriorityClass("batch", max_queue=200, max_queue_time=300.0, wait_budget=240.0),
+)
+
+PRIORITY_NAMES = tuple(c.name for c in DEFAULT_PRIORITY_CLASSES)
+
+
+class _ClassStats:
+    """单个优先级类别的统计"""
+
+    __slots__ = ("admitted", "shed", "expired", "completed", "total_wait", "max_wait", "recent_waits")
+
+    def __init__(self):
+        self.admitted = 0
+        self.shed = 0
+        self.expired = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.recent_waits = deque(maxlen=200)
+
+    def record_wait(self, wait: float):
+        self.admitted += 1
+        self.total_wait += wait
+        self.max_wait = max(self.max_wait, wait)
+        self.recent_waits.append(wait)
+
+    def p95_wait(self) -> float:
+        if not self.recent_waits:
+            return 0.0
+        waits = sorted(self.recent_waits)
+        return waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+
+
+class Ticket:
+    """一次排队的凭据；合并到同一次搜索的更高优先级请求可借此提升仍在排队的请求"""
+
+    __slots__ = ("priority", "future", "admitted")
+
+    def __init__(self, priority: str):
+        self.priority = priority
+        # 排队期间等待分派的 future
+        self.future: Optional[asyncio.Future] = None
+        self.admitted = False
+
+
+class PriorityScheduler:
+    """带准入控制的优先级调度器"""
+
+    def __init__(self,
+                 concurrency: int = 1,
+                 classes=DEFAULT_PRIORITY_CLASSES,
+                 initial_service_time: float = 3.0,
+                 clock: Callable[[], float] = time.monotonic):
+        """
+        Args:
+            concurrency: 并发槽位数，一般等于出口身份数量
+            classes: 优先级类别，按优先级从高到低排列
+            initial_service_time: 初始的单次搜索耗时估计（秒）
+            clock: 时钟函数（测试时可替换）
+        """
+        self.concurrency = max(1, concurrency)
+        self.classes: Dict[str, PriorityClass] = {c.name: c for c in classes}
+        self.service_time = initial_service_time
+        self.clock = clock
+        self.running = 0
+
+        self._queues: Dict[str, deque] = {name: deque() for name in self.classes}
+        self._stats: Dict[str, _ClassStats] = {name: _ClassStats() for name in self.classes}
+        self.logger = logging.getLogger(__name__)
+
+    def queue_depth(self, priority: Optional[str] = None) -> int:
+        """排队中的请求数"""
+        if priority is not None:
+            return len(self._queues[priority])
+        return sum(len(q) for q in self._queues.values())
+
+    def predicted_wait(self, priority: str) -> float:
+        """按同级及更高优先级的排队数量估计新请求的等待时间"""
+        ahead = 0
+        for name in self.classes:
+            ahead += len(self._queues[name])
+            if name == priority:
+                break
+        if ahead == 0 and self.running < self.concurrency:
+            return 0.0
+        return (ahead + 1) * self.service_time / self.concurrency
+
+    async def run(self, priority: Union[str, Ticket], func: Callable[..., Awaitable[Any]], *args, **kwargs) -> Any:
+        """获得槽位后执行 func，结束后释放槽位；priority 为优先级名称或可提升的 Ticket"""
+        priority = await self.acquire(priority)
+        started = self.clock()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            self.release(priority, self.clock() - started)
+
+    def rank(self, priority: str) -> int:
+        """优先级序号，越小越优先"""
+        return list(self.classes).index(priority)
+
+    def promote(self, ticket: Ticket, priority: str) -> bool:
+        """将尚未分派的请求提升到更高优先级，移到该级队列末尾；已在执行的请求不变"""
+        if ticket.admitted or self.rank(priority) >= self.rank(ticket.priority):
+            return False
+        future = ticket.future
+        if future is not None:
+            if future.done():
+                return False
+            try:
+                self._queues[ticket.priority].remove(future)
+            except ValueError:
+                return False
+            self._queues[priority].append(future)
+        self.logger.info(f"提升排队请求: {ticket.priority} -> {priority}")
+        ticket.priority = priority
+        return True
+
+    async def acquire(self, priority: Union[str, Ticket]) -> str:
+        """等待并获得一个并发槽位，返回获得槽位时的优先级；被拒绝或排队超时时抛出 SearchOverloadedError
+
+        排队超时按入队时的类别计算
+        """
+        ticket = priority if isinstance(priority, Ticket) else Ticket(priority)
+        priority = ticket.priority
+        if priority not in self.classes:
+            raise ValueError(f"未知的优先级: {priority}")
+        config = self.classes[priority]
+        stats = self._stats[priority]
+
+        if self.running < self.concurrency and self.queue_depth() == 0:
+            self.running += 1
+            ticket.admitted = True
+            stats.record_wait(0.0)
+            return priority
+
+        queue = self._queues[priority]
+        predicted = self.predicted_wait(priority)
+        if len(queue) >= config.max_queue or predicted > config.wait_budget:
+            stats.shed += 1
+            self.logger.warning(f"拒绝 {priority} 请求: 排队 {len(queue)}, 预计等待 {predicted:.1f}s")
+            raise SearchOverloadedError("搜索请求过多，请稍后重试", priority=priority,
+                                        retry_after=max(predicted, self.service_time))
+
+        future = asyncio.get_running_loop().create_future()
+        queue.append(future)
+        ticket.future = future
+        enqueued_at = self.clock()
+        try:
+            await asyncio.wait({future}, timeout=config.max_queue_time)
+        except asyncio.CancelledError:
+            self._abandon(self._queues[ticket.priority], future)
+            raise
+        finally:
+            ticket.future = None
+
+        # 排队期间可能已被提升
+        priority = ticket.priority
+        stats = self._stats[priority]
+        if not future.done():
+            self._abandon(self._queues[priority], future)
+            stats.expired += 1
+            raise SearchOverloadedError("排队超时，请稍后重试", priority=priority,
+                                        retry_after=self.predicted_wait(priority))
+        ticket.admitted = True
+        stats.record_wait(self.clock() - enqueued_at)
+        return priority
+
+    def release(self, priority: str, service_time: Optional[float] = None):
+        """释放槽位，并按优先级唤醒排队中的请求"""
+        self.running -= 1
+        stats = self._stats.get(priority)
+        if stats is not None:
+            stats.completed += 1
+        if service_time is not None:
+            self.service_time = self.service_time * 0.8 + service_time * 0.2
+        self._dispatch()
+
+    def _abandon(self, queue: deque, future: asyncio.Future):
+        """放弃排队：已分到的槽位交还，未分到则移出队列"""
+        if future.done() and not future.cancelled():
+            self.running -= 1
+            self._dispatch()
+            return
+        future.cancel()
+        try:
+            queue.remove(future)
+        except ValueError:
+            pass
+
+    def _dispatch(self):
+        """将空闲槽位按优先级分给队首请求"""
+        for name in self.classes:
+            queue = self._queues[name]
+            while queue and self.running < self.concurrency:
+                future = queue.popleft()
+                if future.done():
+                    continue
+                self.running += 1
+                future.set_result(None)
+            if self.running >= self.concurrency:
+                return
+
+    def stats(self) -> Dict:
+        """获取调度统计"""
+        classes = {}
+        for name, stats in self._stats.items():
+            classes[name] = {
+                "queued": len(self._queues[name]),
+                "admitted": stats.admitted,
+                "shed": stats.shed,
+                "expired": stats.expired,
+                "completed": stats.completed,
+                "avg_wait": round(stats.total_wait / stats.admitted, 3) if stats.admitted else 0.0,
+                "p95_wait": round(stats.p95_wait(), 3),
+                "max_wait": round(stats.max_wait, 3),
+                "predicted_wait": round(self.predicted_wait(name), 3),
+            }
+        return {
+            "concurrency": self.concurrency,
+            "running": self.running,
+            "queued": self.queue_depth(),
+            "service_time": round(self.service_time, 3),
+            "classes": classes,
+        }
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索服务层
+REST 接口和 MCP 服务器共用的搜索核心：结果缓存、并发请求合并、优先级调度、预取和统计；
+也可以将请求转发到本机运行中的 FastAPI 服务，使每台主机只运行一个浏览器
+"""
+
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+from .article_url import extract_link_token
+from .corpus import ArticleCorpus
+from .data_dir import default_data_dir
+from .errors import SearchBlockedError, SearchError, SearchOverloadedError
+from .prefetcher import PrefetchJob, SearchPrefetcher
+from .publish_time import sort_by_time
+from .result_cache import CacheHit, SearchResultCache, make_cache_key, transient_hit
+from .results import RESULTS_PER_PAGE, SearchResults, is_exhaustive, is_failed
+from .sample_archive import SampleArchive
+from .scheduler import PriorityScheduler, Ticket
+from .text_normalize import canonicalize_query
+
+
+class SearchOutcome:
+    """一次搜索的结果"""
+
+    __slots__ = ("hit", "stale", "cached")
+
+    def __init__(self, hit: CacheHit, stale: bool = False, cached: bool = False):
+        self.hit = hit
+        # 被拦截或过载时返回的过期缓存
+        self.stale = stale
+        self.cached = cached
+
+    @property
+    def query(self) -> str:
+        return self.hit.entry.query
+
+    def articles(self, sort_by: str = "relevance") -> List[Dict]:
+        """文章字典列表，按发布时间排序时在本地完成"""
+        articles = self.hit.articles()
+        return sort_by_time(articles) if sort_by == "time" else articles
+
+
+def search_cache_key(query: str, resolve_links: bool, include_content: bool, content_top_k: int) -> str:
+    """缓存按查询和选项分组，结果数量和时间筛选在查找时匹配"""
+    return f"{query}_{resolve_links}_{content_top_k if include_content else 0}"
+
+
+def _default_searcher_factory(proxies: List[str], data_dir: str):
+    sample_archive = SampleArchive.from_env(data_dir)
+
+    def factory():
+        # 延迟导入 Playwright，只在真正需要浏览器时加载
+        from .playwright_search import WeChatArticleSearcher
+        return WeChatArticleSearcher(
+            headless=True,
+            proxies=proxies,
+            link_cache_path=os.path.join(data_dir, "link_cache.sqlite3"),
+            sample_archive=sample_archive
+        )
+    return factory
+
+
+class SearchService:
+    """进程内搜索服务"""
+
+    def __init__(self,
+                 proxies: Optional[List[str]] = None,
+                 data_dir: Optional[str] = None,
+                 cache_ttl: float = 300,
+                 max_entries: int = 1000,
+                 prefetch: bool = False,
+                 searcher_factory: Optional[Callable[[], Any]] = None,
+                 corpus: Optional[ArticleCorpus] = None):
+        """
+        Args:
+            proxies: 出口代理列表，每个代理一个并发槽位
+            data_dir: 本地数据目录，默认为 app 目录下的 WEIXIN_SEARCH_DATA_DIR
+            cache_ttl: 缓存有效期（秒），过期条目保留用于降级返回
+            max_entries: 最多缓存的查询条目数
+            prefetch: 是否在空闲容量上预取
+            searcher_factory: 创建搜索器的函数（测试或压测时可替换）
+            corpus: 文章语料库，上游搜索结果同时写入，供批量导出
+        """
+        self.proxies = proxies or []
+        self.data_dir = data_dir = data_dir or default_data_dir()
+        self.cache_ttl = cache_ttl
+        self.searcher_factory = searcher_factory or _default_searcher_factory(self.proxies, data_dir)
+        self.searcher = None
+        self.corpus = corpus
+
+        self.cache = SearchResultCache(max_entries=max_entries)
+        self.scheduler = PriorityScheduler(concurrency=max(1, len(self.proxies)))
+        self.prefetcher = SearchPrefetcher(self._run_prefetch, self.has_idle_capacity) if prefetch else None
+
+        self._searcher_lock = asyncio.Lock()
+        self._inflight: Dict[tuple, Tuple[asyncio.Task, Ticket]] = {}
+        self._corpus_writes: Set[asyncio.Task] = set()
+        self.coalesced = 0
+        self.started_at = time.time()
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls, **kwargs) -> "SearchService":
+        """按环境变量创建服务"""
+        proxies = [p.strip() for p in os.getenv("WEIXIN_SEARCH_PROXIES", "").split(",") if p.strip()]
+        kwargs.setdefault("proxies", proxies)
+        kwargs.setdefault("data_dir", default_data_dir())
+        kwargs.setdefault("prefetch", os.getenv("WEIXIN_SEARCH_PREFETCH", "0") == "1")
+        kwargs.setdefault("corpus", ArticleCorpus.from_env(kwargs["data_dir"]))
+        return cls(**kwargs)
+
+    async def get_searcher(self):
+        """获取搜索器实例，首次调用时启动浏览器"""
+        async with self._searcher_lock:
+            if self.searcher is None:
+                searcher = self.searcher_factory()
+                await searcher.init_browser()
+                self.searcher = searcher
+                self.logger.info("搜索器初始化成功")
+        return self.searcher
+
+    async def close_searcher(self):
+        """关闭搜索器"""
+        async with self._searcher_lock:
+            if self.searcher is not None:
+                await self.searcher.close()
+                self.searcher = None
+
+    async def close(self):
+        """关闭服务"""
+        if self.prefetcher:
+            await self.prefetcher.close()
+        await self.close_searcher()
+        if self.corpus is not None:
+            # 等待后台写入完成再关闭连接
+            if self._corpus_writes:
+                await asyncio.gather(*self._corpus_writes, return_exceptions=True)
+            self.corpus.close()
+
+    async def search(self,
+                     query: str,
+                     max_results: int = 5,
+                     time_filter: Optional[str] = None,
+                     resolve_links: bool = False,
+                     include_content: bool = False,
+                     content_top_k: int = 3,
+                     use_cache: bool = True,
+                     priority: str = "interactive",
+                     raw_query: Optional[str] = None,
+                     client: Any = None) -> SearchOutcome:
+        """搜索文章
+
+        优先使用缓存；相同的并发请求合并为一次上游搜索；
+        被拦截或过载时返回过期缓存，没有缓存时抛出 SearchBlockedError / SearchOverloadedError。
+        """
+        query = canonicalize_query(query)
+        if not query:
+            raise ValueError("搜索关键词不能为空")
+        options = {
+            "resolve_links": resolve_links,
+            "include_content": include_content,
+            "content_top_k": content_top_k,
+        }
+        cache_key = search_cache_key(query, **options)
+
+        if use_cache:
+            hit = self.cache.lookup(cache_key, time_filter, max_results,
+                                    max_age=self.cache_ttl, raw_query=raw_query)
+            if hit is not None:
+                if hit.derived_from:
+                    self.logger.info(f"使用缓存结果: {query} ({hit.derived_from} -> {time_filter})")
+                else:
+                    self.logger.info(f"使用缓存结果: {query}")
+                self._after_search(client, query, max_results, time_filter, options)
+                return SearchOutcome(hit, cached=True)
+
+        try:
+            if use_cache:
+                hit = await self._coalesced_search(cache_key, query, max_results, time_filter,
+                                                   options, priority, raw_query)
+            else:
+                hit = await self._search_upstream(cache_key, query, max_results, time_filter,
+                                                  options, priority, raw_query, store=False)
+        except (SearchBlockedError, SearchOverloadedError) as e:
+            stale = self.cache.lookup(cache_key, time_filter, max_results)
+            if stale is not None:
+                self.logger.warning(f"搜索暂不可用，返回过期缓存: {query}")
+                return SearchOutcome(stale, stale=True, cached=True)
+            self.logger.warning(f"搜索暂不可用: {query}, {str(e)}")
+            raise
+
+        self._after_search(client, query, max_results, time_filter, options)
+        return SearchOutcome(hit)
+
+    def plan(self,
+             query: str,
+             max_results: int = 5,
+             time_filter: Optional[str] = None,
+             resolve_links: bool = False,
+             include_content: bool = False,
+             content_top_k: int = 3,
+             use_cache: bool = True) -> str:
+        """预判一次搜索的执行方式（不计入缓存统计）：
+
+        cached 缓存命中，coalesced 合并到进行中的相同搜索，upstream 需要访问上游
+        """
+        query = canonicalize_query(query)
+        cache_key = search_cache_key(query, resolve_links, include_content, content_top_k)
+        if use_cache:
+            if self.cache.peek(cache_key, time_filter, max_results, max_age=self.cache_ttl) is not None:
+                return "cached"
+            if (cache_key, time_filter, max_results) in self._inflight:
+                return "coalesced"
+        return "upstream"
+
+    async def _coalesced_search(self, cache_key: str, query: str, max_results: int,
+                                time_filter: Optional[str], options: Dict, priority: str,
+                                raw_query: Optional[str]) -> CacheHit:
+        """相同查询正在上游搜索时等待其结果，不再重复发起；
+        等待者优先级更高且该搜索仍在排队时，将其提升到等待者的优先级
+        """
+        flight_key = (cache_key, time_filter, max_results)
+        flight = self._inflight.get(flight_key)
+        if flight is not None:
+            task, ticket = flight
+            self.scheduler.promote(ticket, priority)
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        ticket = Ticket(priority)
+        task = asyncio.create_task(self._search_upstream(cache_key, query, max_results, time_filter,
+                                                         options, ticket, raw_query))
+        self._inflight[flight_key] = (task, ticket)
+
+        def forget(done: asyncio.Task):
+            flight = self._inflight.get(flight_key)
+            if flight is not None and flight[0] is done:
+                del self._inflight[flight_key]
+
+        task.add_done_callback(forget)
+        return await asyncio.shield(task)
+
+    async def _search_upstream(self, cache_key: str, query: str, max_results: int,
+                               time_filter: Optional[str], options: Dict, priority: Union[str, Ticket],
+                               raw_query: Optional[str] = None, store: bool = True,
+                               prefetched: bool = False) -> CacheHit:
+        """经调度器执行上游搜索，结果写入缓存"""
+        searcher = await self.get_searcher()
+        started = time.time()
+        self.logger.info(f"开始搜索: {query}")
+        # 取回整页结果写入缓存，之后同一查询更大的请求无需再访问上游；
+        # 解析跳转链接按篇访问搜狗，只取请求的数量
+        if options["resolve_links"]:
+            fetch_count, cached = max_results, []
+        else:
+            fetch_count = -(-max_results // RESULTS_PER_PAGE) * RESULTS_PER_PAGE
+            cached = self._cached_pages(cache_key, time_filter) if store else []
+        articles = await self.scheduler.run(
+            priority,
+            searcher.search_articles,
+            query=query,
+            max_results=fetch_count - len(cached),
+            time_filter=time_filter,
+            start_page=len(cached) // RESULTS_PER_PAGE + 1,
+            **options
+        )
+        search_time = round(time.time() - started, 2)
+        timestamp = datetime.now().isoformat()
+        self.logger.info(f"搜索完成: {query}, 耗时: {search_time:.2f}s, 结果: {len(articles)}篇")
+        if is_failed(articles):
+            # 出错时的空结果不代表没有文章，不写入缓存和语料库
+            self.logger.warning(f"搜索出错，结果不写入缓存: {query}")
+            store = False
+        elif self.corpus is not None:
+            # 写入语料库在后台进行，不增加搜索延迟
+            task = asyncio.create_task(self.corpus.record(query, list(articles)))
+            self._corpus_writes.add(task)
+            task.add_done_callback(self._corpus_writes.discard)
+        if cached:
+            # 前几页来自缓存，只读取了后续页
+            seen = {article["url"] for article in cached}
+            articles = SearchResults(cached + [a for a in articles if a["url"] not in seen],
+                                     exhaustive=is_exhaustive(articles), failed=is_failed(articles))
+
+        if not store:
+            return transient_hit(articles[:max_results], max_results, query, search_time, timestamp,
+                                 options["include_content"])
+        entry = self.cache.put(
+            cache_key,
+            time_filter,
+            max(max_results, len(articles)),
+            articles,
+            query=query,
+            search_time=search_time,
+            timestamp=timestamp,
+            include_content=options["include_content"],
+            raw_query=raw_query,
+            prefetched=prefetched,
+            exhaustive=is_exhaustive(articles)
+        )
+        return CacheHit(entry, entry.records[:max_results])
+
+    def _cached_pages(self, cache_key: str, time_filter: Optional[str]) -> List[Dict]:
+        """同一查询已缓存的完整结果页，请求更多结果时从下一页接着读取"""
+        entry = self.cache.get(make_cache_key(cache_key, time_filter), self.cache_ttl)
+        if entry is None or entry.is_exhaustive():
+            return []
+        pages = len(entry.records) // RESULTS_PER_PAGE
+        if pages == 0 or len(entry.records) != pages * RESULTS_PER_PAGE:
+            return []
+        return entry.articles()
+
+    async def fetch_articles(self, urls: List[str], use_cache: bool = True, priority: str = "agent") -> List[Dict]:
+        """抓取文章正文；访问搜狗的跳转链接解析和占用浏览器的回退抓取都经调度器按 priority 排队"""
+        searcher = await self.get_searcher()
+        if any(extract_link_token(url) for url in urls):
+            urls = await self.scheduler.run(priority, searcher.link_resolver.resolve_many, urls)
+
+        async def browser(url: str) -> str:
+            return await self.scheduler.run(priority, searcher.fetch_page_html, url)
+
+        return await searcher.article_fetcher.fetch_many(urls, use_cache=use_cache, browser=browser)
+
+    def _after_search(self, client: Any, query: str, max_results: int, time_filter: Optional[str], options: Dict):
+        """搜索返回后记录查询历史并触发预取"""
+        if self.prefetcher is not None:
+            self.prefetcher.after_search(client, query, max_results, time_filter, options)
+
+    def has_idle_capacity(self) -> bool:
+        """调度器无排队且有空闲出口令牌时才进行预取"""
+        return (
+            self.searcher is not None
+            and self.scheduler.running < self.scheduler.concurrency
+            and self.scheduler.queue_depth() == 0
+            and self.searcher.identity_pool.has_spare_capacity()
+        )
+
+    async def _run_prefetch(self, job: PrefetchJob) -> bool:
+        """以批量优先级执行预取并写入缓存，已有缓存时跳过"""
+        cache_key = search_cache_key(job.query, **job.context)
+        if self.cache.peek(cache_key, job.time_filter, job.max_results, max_age=self.cache_ttl) is not None:
+            return False
+        await self._search_upstream(cache_key, job.query, job.max_results, job.time_filter,
+                                    job.context, "batch", prefetched=True)
+        return True
+
+    def clear_cache(self) -> int:
+        """清空搜索缓存，返回清理的条目数"""
+        return self.cache.clear()
+
+    async def stats(self) -> Dict:
+        """获取服务统计"""
+        searcher = self.searcher
+        return {
+            "cache_size": len(self.cache),
+            "cache": self.cache.stats(),
+            "coalesced_requests": self.coalesced,
+            "scheduler": self.scheduler.stats(),
+            "prefetch": self.prefetcher.stats(self.cache.prefetch_hits) if self.prefetcher else None,
+            "browser_status": "running" if searcher is not None and searcher.browser else "stopped",
+            "identity_pool": searcher.identity_pool.stats() if searcher is not None else None,
+            "link_resolver": searcher.link_resolver.stats() if searcher is not None else None,
+            "article_fetcher": searcher.article_fetcher.stats() if searcher is not None else None,
+            "corpus": self.corpus.stats() if self.corpus is not None else None,
+            "sample_archive": searcher.sample_archive.stats()
+            if getattr(searcher, "sample_archive", None) is not None else None,
+        }
+
+
+class RemoteSearchService:
+    """将请求转发到本机运行中的 FastAPI 服务（Unix 套接字或本地 HTTP）"""
+
+    def __init__(self, url: str, timeout: float = 120.0):
+        """
+        Args:
+            url: 服务地址，如 unix:/run/weixin-search.sock 或 http://127.0.0.1:8000
+            timeout: 单次请求超时（秒）
+        """
+        self.url = url
+        self.timeout = timeout
+        self._session = None
+        self.logger = logging.getLogger(__name__)
+
+        if url.startswith("unix:"):
+            self.socket_path = url[len("unix:"):]
+            self.base_url = "http://localhost"
+        else:
+            self.socket_path = None
+            self.base_url = url.rstrip("/")
+
+    async def _get_session(self):
+        import aiohttp
+
+        if self._session is None or self._session.closed:
+            connector = aiohttp.UnixConnector(path=self.socket_path) if self.socket_path else None
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        return self._session
+
+    async def _post(self, path: str, payload: Dict) -> Dict:
+        session = await self._get_session()
+        async with session.post(f"{self.base_url}{path}", json=payload) as resp:
+            data = await resp.json(content_type=None)
+            if resp.status == 200:
+                return data
+            detail = data.get("detail") if isinstance(data, dict) else None
+            if resp.status == 503 and isinstance(detail, dict):
+                error_class = SearchOverloadedError if detail.get("error") == "overloaded" else SearchBlockedError
+                raise error_class(detail.get("message", "搜索暂不可用"), retry_after=detail.get("retry_after"))
+            raise SearchError(f"搜索服务返回 {resp.status}: {detail}")
+
+    async def get_searcher(self):
+        """远程模式下浏览器由 FastAPI 服务管理"""
+        return None
+
+    async def search(self,
+                     query: str,
+                     max_results: int = 5,
+                     time_filter: Optional[str] = None,
+                     resolve_links: bool = False,
+                     include_content: bool = False,
+                     content_top_k: int = 3,
+                     use_cache: bool = True,
+                     priority: str = "agent",
+                     raw_query: Optional[str] = None,
+                     client: Any = None) -> SearchOutcome:
+        """通过 REST 接口搜索"""
+        data = await self._post("/search_articles", {
+            "query": raw_query or query,
+            "max_results": max_results,
+            "time_filter": time_filter,
+            "resolve_links": resolve_links,
+            "include_content": include_content,
+            "content_top_k": content_top_k,
+            "use_cache": use_cache,
+            "priority": priority,
+        })
+        hit = transient_hit(data["articles"], max_results, data["query"], data["search_time"],
+                            data["timestamp"], include_content)
+        return SearchOutcome(hit, stale=data.get("stale", False))
+
+    async def fetch_articles(self, urls: List[str], use_cache: bool = True, priority: str = "agent") -> List[Dict]:
+        """通过 REST 接口抓取文章正文"""
+        data = await self._post("/fetch_article", {"urls": urls, "use_cache": use_cache, "priority": priority})
+        return data["articles"]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def stats(self) -> Dict:
+        """读取 FastAPI 服务的统计，失败时只返回服务地址"""
+        try:
+            session = await self._get_session()
+            async with session.get(f"{self.base_url}/stats") as resp:
+                stats = await resp.json(content_type=None)
+        except Exception as e:
+            self.logger.warning(f"读取搜索服务统计失败: {str(e)}")
+            return {"remote": self.url}
+        return {"remote": self.url, **stats}
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文本规范化
+预编译正则的单遍清洗函数，供搜索结果解析和查询清理共用，支持整批清洗搜索结果
+"""
+
+import logging
+import os
+import re
+import time
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .publish_time import format_date, parse_publish_time
+
+
+# 连续的空白和 HTML 标签作为一个整体处理：含空白时替换为一个空格，只有标签时删除
+_TAG_OR_SPACE_PATTERN = re.compile(r'(?:(\s)|<[^>]+>)+')
+
+# 元信息中的日期和相对时间
+_META_DATE_PATTERN = re.compile(r'\s+(\d{4}-\d{2}-\d{2})')
+_META_RELATIVE_PATTERN = re.compile(r'\s+(\d+天前|\d+小时前|\d+分钟前)')
+_SPACE_RUN_PATTERN = re.compile(r'\s+')
+
+# 查询中需要移除的潜在危险字符
+_UNSAFE_CHARS_PATTERN = re.compile(r'[<>"\']')
+
+SNIPPET_LENGTH = 200
+DEFAULT_SOURCE = "微信公众号"
+
+# 查询规范化时是否将繁体转换为简体（需要安装 opencc）
+QUERY_TO_SIMPLIFIED = os.getenv("WEIXIN_QUERY_T2S", "0") == "1"
+
+_t2s_converter = None
+_t2s_unavailable = False
+
+logger = logging.getLogger(__name__)
+
+
+def _tag_or_space_repl(match) -> str:
+    return " " if match.group(1) is not None else ""
+
+
+def clean_text(text: str) -> str:
+    """清理文本：移除 HTML 标签，合并空白，去除首尾空格"""
+    if not text:
+        return ""
+    # 不含标签时只需合并空白，str.split 与 \s+ 的空白定义一致
+    if "<" not in text:
+        return " ".join(text.split())
+    return _TAG_OR_SPACE_PATTERN.sub(_tag_or_space_repl, text).strip()
+
+
+def strip_unsafe_chars(text: str) -> str:
+    """移除 < > " ' 等潜在危险字符"""
+    return _UNSAFE_CHARS_PATTERN.sub("", text)
+
+
+def _get_t2s_converter():
+    """获取繁体转简体转换器，未安装 opencc 时返回 None"""
+    global _t2s_converter, _t2s_unavailable
+    if _t2s_converter is None and not _t2s_unavailable:
+        try:
+            import opencc
+            try:
+                _t2s_converter = opencc.OpenCC("t2s")
+            except Exception:
+                _t2s_converter = opencc.OpenCC("t2s.json")
+        except Exception as e:
+            _t2s_unavailable = True
+            logger.warning(f"繁简转换不可用，已跳过: {str(e)}")
+    return _t2s_converter
+
+
+def canonicalize_query(query: str, to_simplified: Optional[bool] = None) -> str:
+    """规范化搜索查询，使等价的查询得到相同的缓存键
+
+    依次进行 NFKC 规范化（全角转半角）、移除危险字符、合并空白、大小写折叠，
+    以及可选的繁体转简体，最后限制长度。
+    """
+    if not query:
+        return ""
+    query = unicodedata.normalize("NFKC", query)
+    query = " ".join(strip_unsafe_chars(query).split()).casefold()
+
+    if QUERY_TO_SIMPLIFIED if to_simplified is None else to_simplified:
+        converter = _get_t2s_converter()
+        if converter is not None:
+            query = converter.convert(query)
+
+    return query[:100].strip()
+
+
+def parse_meta_info(meta_text: str) -> Tuple[str, str]:
+    """解析元信息，提取来源和时间
+
+    依次尝试「来源 日期」「来源 相对时间」「来源 其他」三种格式，
+    每种格式只做一次线性扫描，不在每个位置上回溯。
+    """
+    if not meta_text:
+        return "", ""
+
+    text = meta_text.strip()
+    # 来源部分不能跨行
+    newline = text.find("\n")
+    limit = len(text) if newline < 0 else newline
+
+    for pattern in (_META_DATE_PATTERN, _META_RELATIVE_PATTERN):
+        match = pattern.search(text, 1)
+        if match and match.start() <= limit:
+            return text[:match.start()].strip(), match.group(1).strip()
+
+    match = _SPACE_RUN_PATTERN.search(text, 1)
+    if match and match.start() <= limit:
+        value_end = text.find("\n", match.end())
+        value = text[match.end():] if value_end < 0 else text[match.end():value_end]
+        return text[:match.start()].strip(), value.strip()
+
+    # 如果没有匹配，返回原文本作为来源
+    return text, ""
+
+
+def make_snippet(description: str) -> str:
+    """生成摘要：清理后截断到 200 字"""
+    cleaned = clean_text(description)
+    if len(description) > SNIPPET_LENGTH:
+        return cleaned[:SNIPPET_LENGTH] + "..."
+    return cleaned
+
+
+def normalize_article(title: str,
+                      url: str,
+                      description: str = "",
+                      meta_text: str = "",
+                      timestamp: str = "",
+                      now: Optional[float] = None) -> Dict:
+    """将一条原始解析结果规范化为文章字典
+
+    发布时间优先使用页面内嵌的时间戳属性，其次解析元信息中的日期或相对时间，
+    在抓取时即转换为绝对时间戳，缓存老化后依然准确。
+    """
+    source, publish_time = parse_meta_info(meta_text) if meta_text else ("", "")
+    publish_ts = parse_publish_time(timestamp, now) if timestamp else None
+    if publish_ts is None:
+        publish_ts = parse_publish_time(publish_time, now)
+    return {
+        "title": clean_text(title),
+        "url": url,
+        "source": clean_text(source) or DEFAULT_SOURCE,
+        "date": format_date(publish_ts) if publish_ts is not None else publish_time,
+        "publish_ts": publish_ts,
+        "snippet": make_snippet(description),
+    }
+
+
+def normalize_articles(raw_items: Iterable[Dict], now: Optional[float] = None) -> List[Dict]:
+    """批量规范化整页搜索结果
+
+    raw_items 中每项包含 title/url/description/meta/timestamp 原始字段，
+    标题或链接为空的条目被丢弃。整批结果使用同一个参考时间换算相对时间。
+    """
+    now = time.time() if now is None else now
+    articles = []
+    for item in raw_items:
+        article = normalize_article(
+            item.get("title", ""),
+            item.get("url", ""),
+            item.get("description", ""),
+            item.get("meta", ""),
+            item.get("timestamp", ""),
+            now
+        )
+        if article["title"] and article["url"]:
+            articles.append(article)
+    return articles
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词订阅
+按关键词定期以批量优先级搜索，只推送此前未见过的文章；
+轮询间隔按新文章出现的频率自适应：有新文章时减半，没有时逐步放大，
+上游开销随内容变化速度而不是客户端轮询频率增长
+"""
+
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from .article_store import stable_article_key
+from .errors import QuotaExceededError, SearchBlockedError, SearchOverloadedError
+
+WATCH_URI_PREFIX = "weixin-watch://"
+
+
+def watch_id_for(query: str, time_filter: Optional[str], max_results: int, tenant: Optional[str] = None) -> str:
+    """由订阅参数和所属租户生成稳定的订阅 ID，重启后重新注册得到相同 ID"""
+    key = f"{query}|{time_filter or ''}|{max_results}"
+    if tenant is not None:
+        key += f"|{tenant}"
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return digest[:12]
+
+
+class Watch:
+    """一个关键词订阅"""
+
+    __slots__ = ("id", "tenant", "query", "time_filter", "max_results", "interval", "next_poll",
+                 "created_at", "last_polled", "polls", "new_total", "seq", "seen", "recent",
+                 "last_error", "baselined", "streams")
+
+    def __init__(self, query: str, time_filter: Optional[str], max_results: int,
+                 interval: float, now: float, created_at: float, max_recent: int,
+                 tenant: Optional[str] = None):
+        self.id = watch_id_for(query, time_filter, max_results, tenant)
+        # 所属租户，轮询开销计入该租户的配额；None 表示不计配额的本机调用方
+        self.tenant = tenant
+        self.query = query
+        self.time_filter = time_filter
+        self.max_results = max_results
+        self.interval = interval
+        self.next_poll = now
+        self.created_at = created_at
+        self.last_polled: Optional[float] = None
+        self.polls = 0
+        self.new_total = 0
+        # 新文章序号，客户端按序号增量拉取
+        self.seq = 0
+        self.seen: "OrderedDict[str, None]" = OrderedDict()
+        self.recent: deque = deque(maxlen=max_recent)
+        self.last_error: Optional[str] = None
+        # 首次轮询只记录已有文章，不作为新文章推送
+        self.baselined = False
+        # 订阅的 SSE 推送流
+        self.streams: Set[asyncio.Queue] = set()
+
+    @property
+    def uri(self) -> str:
+        return f"{WATCH_URI_PREFIX}{self.id}"
+
+    def owned_by(self, tenant: Optional[str]) -> bool:
+        """tenant 能否访问该订阅；None（本机调用方）可访问所有订阅"""
+        return tenant is None or self.tenant == tenant
+
+    def articles_since(self, since: int = 0) -> List[Dict[str, Any]]:
+        """序号大于 since 的新文章"""
+        return [item for item in self.recent if item["seq"] > since]
+
+    def open_stream(self, max_pending: int = 100) -> asyncio.Queue:
+        """打开一个新文章推送流"""
+        queue = asyncio.Queue(maxsize=max_pending)
+        self.streams.add(queue)
+        return queue
+
+    def close_stream(self, queue: asyncio.Queue):
+        self.streams.discard(queue)
+
+    def publish(self, items: List[Dict[str, Any]]):
+        """向推送流发送新文章；积压已满的流丢弃，客户端可按序号补拉"""
+        for queue in list(self.streams):
+            for item in items:
+                try:
+                    queue.put_nowait(item)
+                except asyncio.QueueFull:
+                    break
+
+    def shutdown(self):
+        """订阅删除时通知推送流退出"""
+        for queue in list(self.streams):
+            try:
+                queue.put_nowait(None)
+            except asyncio.QueueFull:
+                pass
+        self.streams.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "uri": self.uri,
+            "query": self.query,
+            "time_filter": self.time_filter,
+            "max_results": self.max_results,
+            "interval": round(self.interval, 1),
+            "created_at": self.created_at,
+            "last_polled": self.last_polled,
+            "polls": self.polls,
+            "new_articles": self.new_total,
+            "seq": self.seq,
+            "seen": len(self.seen),
+            "last_error": self.last_error,
+        }
+
+
+class KeywordWatcher:
+    """关键词订阅调度器"""
+
+    def __init__(self,
+                 runner: Callable[[Watch], Awaitable[List[Dict[str, Any]]]],
+                 min_interval: float = 300.0,
+                 max_interval: float = 21600.0,
+                 initial_interval: float = 900.0,
+                 max_watches: int = 200,
+                 max_seen: int = 2000,
+                 max_recent: int = 200,
+                 clock: Callable[[], float] = time.monotonic,
+                 wall_clock: Callable[[], float] = time.time):
+        """
+        Args:
+            runner: 执行一次订阅搜索，返回文章列表
+            min_interval: 最短轮询间隔（秒），不低于搜索缓存有效期时轮询总是访问上游
+            max_interval: 最长轮询间隔（秒）
+            initial_interval: 新订阅的初始轮询间隔（秒）
+            max_watches: 订阅数量上限
+            max_seen: 每个订阅记住的文章数量
+            max_recent: 每个订阅保留的新文章数量，供增量拉取
+            clock: 调度时钟（测试时可替换）
+            wall_clock: 时间戳时钟
+        """
+        self.runner = runner
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.initial_interval = initial_interval
+        self.max_watches = max_watches
+        self.max_seen = max_seen
+        self.max_recent = max_recent
+        self.clock = clock
+        self.wall_clock = wall_clock
+
+        self._watches: Dict[str, Watch] = {}
+        self._listeners: List[Callable[[Watch, List[Dict[str, Any]]], None]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+        self.total_polls = 0
+        self.failed_polls = 0
+        self.logger = logging.getLogger(__name__)
+
+    def __len__(self) -> int:
+        return len(self._watches)
+
+    def add(self, query: str, time_filter: Optional[str] = None, max_results: int = 10,
+            tenant: Optional[str] = None) -> Watch:
+        """注册订阅；同一租户参数相同的订阅只保留一个"""
+        watch_id = watch_id_for(query, time_filter, max_results, tenant)
+        watch = self._watches.get(watch_id)
+        if watch is not None:
+            return watch
+        if len(self._watches) >= self.max_watches:
+            raise ValueError(f"订阅数量已达上限 {self.max_watches}")
+        watch = Watch(query, time_filter, max_results, self.initial_interval,
+                      self.clock(), self.wall_clock(), self.max_recent, tenant)
+        self._watches[watch.id] = watch
+        self.logger.info(f"新增订阅: {query} ({watch.id})")
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return watch
+
+    def get(self, watch_id: str) -> Optional[Watch]:
+        return self._watches.get(watch_id)
+
+    def get_by_uri(self, uri: str) -> Optional[Watch]:
+        """按资源 URI（weixin-watch://<id>，可带 ?since=序号）查找订阅"""
+        if not uri or not uri.startswith(WATCH_URI_PREFIX):
+            return None
+        return self._watches.get(uri[len(WATCH_URI_PREFIX):].split("?", 1)[0])
+
+    def remove(self, watch_id: str) -> bool:
+        watch = self._watches.pop(watch_id, None)
+        if watch is None:
+            return False
+        watch.shutdown()
+        self.logger.info(f"删除订阅: {watch.query} ({watch.id})")
+        return True
+
+    def watches(self, tenant: Optional[str] = None) -> List[Watch]:
+        """tenant 可访问的订阅"""
+        return [watch for watch in self._watches.values() if watch.owned_by(tenant)]
+
+    def add_listener(self, callback: Callable[[Watch, List[Dict[str, Any]]], None]):
+        """注册新文章回调 callback(watch, items)，items 为带序号的新文章"""
+        self._listeners.append(callback)
+
+    async def poll(self, watch: Watch) -> List[Dict[str, Any]]:
+        """轮询一次订阅，返回新文章并调整轮询间隔"""
+        self.total_polls += 1
+        watch.polls += 1
+        try:
+            articles = await self.runner(watch)
+        except (SearchBlockedError, SearchOverloadedError, QuotaExceededError) as e:
+            self.failed_polls += 1
+            watch.last_error = str(e)
+            watch.interval = min(self.max_interval, watch.interval * 2)
+            watch.next_poll = self.clock() + max(watch.interval, e.retry_after or 0)
+            self.logger.warning(f"订阅搜索暂不可用: {watch.query}, {str(e)}")
+            return []
+        except Exception as e:
+            self.failed_polls += 1
+            watch.last_error = str(e)
+            watch.interval = min(self.max_interval, watch.interval * 2)
+            watch.next_poll = self.clock() + watch.interval
+            self.logger.error(f"订阅搜索失败: {watch.query}, {str(e)}")
+            return []
+
+        watch.last_error = None
+        watch.last_polled = self.wall_clock()
+        new_items = []
+        for article in articles:
+            key = stable_article_key(article)
+            if key in watch.seen:
+                continue
+            watch.seen[key] = None
+            if watch.baselined:
+                watch.seq += 1
+                new_items.append({"seq": watch.seq, "found_at": watch.last_polled, "article": article})
+        while len(watch.seen) > self.max_seen:
+            watch.seen.popitem(last=False)
+
+        if not watch.baselined:
+            watch.baselined = True
+        elif new_items:
+            watch.interval = max(self.min_interval, watch.interval / 2)
+        else:
+            watch.interval = min(self.max_interval, watch.interval * 1.5)
+        watch.next_poll = self.clock() + watch.interval
+
+        if new_items:
+            watch.new_total += len(new_items)
+            watch.recent.extend(new_items)
+            self.logger.info(f"订阅 {watch.query} 发现 {len(new_items)} 篇新文章")
+            watch.publish(new_items)
+            for callback in self._listeners:
+                try:
+                    callback(watch, new_items)
+                except Exception as e:
+                    self.logger.error(f"订阅推送失败: {str(e)}")
+        return new_items
+
+    async def run_due(self) -> int:
+        """依次轮询所有到期的订阅，返回轮询数量"""
+        now = self.clock()
+        due = sorted((w for w in self._watches.values() if w.next_poll <= now), key=lambda w: w.next_poll)
+        for watch in due:
+            # 轮询期间订阅可能已被删除
+            if watch.id in self._watches:
+                await self.poll(watch)
+        return len(due)
+
+    def next_due_in(self) -> Optional[float]:
+        """距下一个订阅到期的时间，没有订阅时返回 None"""
+        if not self._watches:
+            return None
+        return max(0.0, min(w.next_poll for w in self._watches.values()) - self.clock())
+
+    def start(self):
+        """启动后台轮询"""
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._loop())
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                self.logger.error(f"订阅轮询错误: {str(e)}")
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.next_due_in())
+            except asyncio.TimeoutError:
+                pass
+
+    async def close(self):
+        """停止后台轮询"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def stats(self) -> Dict:
+        """获取订阅统计"""
+        return {
+            "watches": len(self._watches),
+            "polls": self.total_polls,
+            "failed_polls": self.failed_polls,
+            "new_articles": sum(w.new_total for w in self._watches.values()),
+            "next_poll_in": round(self.next_due_in(), 1) if self._watches else None,
+        }
+
+
+def service_runner(service,
+                   charge: Optional[Callable[[Watch], Awaitable[None]]] = None
+                   ) -> Callable[[Watch], Awaitable[List[Dict[str, Any]]]]:
+    """以批量优先级经搜索服务执行订阅搜索；缓存有效期内其他请求的结果可直接复用
+
+    charge 在每次搜索前按本次开销扣除订阅所属租户的配额，配额不足时抛出 QuotaExceededError，
+    本次轮询按暂不可用处理
+    """
+    async def run(watch: Watch) -> List[Dict[str, Any]]:
+        if charge is not None:
+            await charge(watch)
+        outcome = await service.search(
+            watch.query,
+            max_results=watch.max_results,
+            time_filter=watch.time_filter,
+            priority="batch",
+            client=("watch", watch.id)
+        )
+        if outcome.stale:
+            raise SearchBlockedError("搜索暂不可用，仅有过期缓存")
+        return outcome.articles()
+    return run
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章语料库导出工具
+直接读取本地 SQLite 语料库，按 updated_at 游标增量导出为 gzip 压缩的 NDJSON 或 Parquet，
+不启动浏览器、不访问上游，可在搜索服务运行时执行。
+
+用法:
+    python export_articles.py --output articles.ndjson.gz
+    python export_articles.py --format parquet --output articles.parquet  # 需要 pyarrow
+    python export_articles.py --cursor-file export.cursor --output part.ndjson.gz  # 从上次的截止时间继续
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(ROOT_DIR, 'app')
+
+# 将app目录添加到路径中
+sys.path.insert(0, APP_DIR)
+
+from search.corpus import EXPORT_FORMATS, ArticleCorpus, export_stream
+from search.data_dir import default_data_dir
+
+
+def read_cursor(path: str) -> float:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return float(f.read().strip() or 0)
+    except FileNotFoundError:
+        return 0.0
+
+
+async def run_export(args) -> dict:
+    """导出到文件，成功后才替换目标文件并更新游标"""
+    corpus = ArticleCorpus(os.path.join(args.data_dir, "corpus.sqlite3"))
+    since = args.since if args.since is not None else (read_cursor(args.cursor_file) if args.cursor_file else 0.0)
+    until = args.until if args.until is not None else corpus.checkpoint()
+    stream = export_stream(corpus, args.format, since, until, args.page_size, args.include_content)
+
+    tmp = args.output + ".tmp"
+    written = 0
+    with open(tmp, "wb") as f:
+        async for chunk in stream:
+            f.write(chunk)
+            written += len(chunk)
+    os.replace(tmp, args.output)
+
+    if args.cursor_file:
+        with open(args.cursor_file, "w", encoding="utf-8") as f:
+            f.write(repr(until))
+    return {"output": args.output, "format": args.format, "since": since, "cursor": until, "bytes": written}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="导出微信文章语料库")
+    parser.add_argument("--data-dir", default=default_data_dir(),
+                        help="数据目录（包含 corpus.sqlite3）")
+    parser.add_argument("--output", required=True, help="输出文件")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--since", type=float, help="只导出 updated_at 大于该时间戳的文章")
+    parser.add_argument("--until", type=float, help="截止时间戳，默认为当前时间")
+    parser.add_argument("--cursor-file", help="游标文件：未指定 --since 时从中读取起点，导出成功后写入截止时间")
+    parser.add_argument("--include-content", action="store_true", help="包含已抓取的正文")
+    parser.add_argument("--page-size", type=int, default=1000, help="每次读取和压缩的文章数")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        summary = asyncio.run(run_export(args))
+    except ImportError as e:
+        sys.exit(str(e))
+    print(json.dumps(summary, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
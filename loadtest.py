@@ -0,0 +1,526 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+负载测试工具
+按 Zipf 分布的查询组合以目标速率压测 FastAPI 服务（HTTP）或 MCP 服务器（stdio），
+搜索器替换为本地替身，无需浏览器和网络，可在 CI 中离线运行。
+
+用法:
+    python loadtest.py run --mode http --rate 20 --duration 30
+    python loadtest.py run --mode stdio --rate 5 --duration 10 --json result.json
+    python loadtest.py run --mode http --url http://127.0.0.1:8000  # 压测已运行的服务
+    python loadtest.py handshake --runs 5  # 测量 MCP 服务器 initialize/tools/list 延迟
+    python loadtest.py replay --archive data/samples --json replay.json  # 离线回放生产采样（需要 Chromium）
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import socket
+import sys
+import time
+import zlib
+from typing import Dict, List, Optional
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(ROOT_DIR, 'app')
+
+# 将app目录添加到路径中
+sys.path.insert(0, APP_DIR)
+
+from search.data_dir import default_data_dir
+from search.mcp_protocol import STATS_RESOURCE
+from search.playwright_search import WeChatArticleSearcher
+from search.text_normalize import canonicalize_query, normalize_articles
+
+
+class FixtureSearcher(WeChatArticleSearcher):
+    """本地替身搜索器：不启动浏览器，按模拟延迟返回确定性的固定结果"""
+
+    def __init__(self, latency: float = 0.05, seed: int = 0, **kwargs):
+        super().__init__(**kwargs)
+        self.latency = latency
+        self.rng = random.Random(seed)
+        # 与真实搜索器一样同一时刻只有一个页面在搜索
+        self._page_lock = asyncio.Lock()
+
+    async def init_browser(self):
+        self.logger.info("使用替身搜索器，不启动浏览器")
+
+    async def search_articles(self, query: str, max_results: int = 10, time_filter: Optional[str] = None,
+                              **kwargs) -> List[Dict]:
+        query = canonicalize_query(query)
+        if not query:
+            return []
+        async with self._page_lock:
+            await asyncio.sleep(self.latency * self.rng.uniform(0.5, 1.5))
+        now = int(time.time())
+        raw_items = [
+            {
+                "title": f"<em>{query}</em> 相关文章 {i + 1}",
+                "url": f"https://mp.weixin.qq.com/s/{zlib.crc32(f'{query}|{i}'.encode('utf-8')):010d}",
+                "description": f"关于{query}的第 {i + 1} 篇文章摘要。" * 3,
+                "meta": f"替身公众号{i % 7}",
+                "timestamp": str(now - i * 3600 * 7),
+            }
+            for i in range(min(max_results, 50))
+        ]
+        return normalize_articles(raw_items)
+
+
+class ZipfQueryMix:
+    """Zipf 分布的查询组合，排名越靠前的查询出现越频繁"""
+
+    def __init__(self, queries: List[str], exponent: float = 1.1, seed: int = 1):
+        self.queries = queries
+        self.rng = random.Random(seed)
+        weights = [1.0 / (rank ** exponent) for rank in range(1, len(queries) + 1)]
+        self.cum_weights = list(itertools.accumulate(weights))
+
+    def sample(self) -> str:
+        return self.rng.choices(self.queries, cum_weights=self.cum_weights)[0]
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """已排序列表的百分位数"""
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * pct / 100))]
+
+
+def read_rss_mb(pid: Optional[int]) -> Optional[float]:
+    """读取进程常驻内存（MB），仅支持 Linux"""
+    if pid is None:
+        return None
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+class LoadStats:
+    """延迟与错误统计，支持按报告区间和全程汇总"""
+
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.dropped = 0
+        self._interval_latencies: List[float] = []
+        self._interval_errors = 0
+
+    def record(self, latency: float, error: Optional[str] = None):
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+            self._interval_errors += 1
+        else:
+            self.latencies.append(latency)
+            self._interval_latencies.append(latency)
+
+    def take_interval(self) -> Dict:
+        latencies = sorted(self._interval_latencies)
+        snapshot = {
+            "ok": len(latencies),
+            "errors": self._interval_errors,
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+        }
+        self._interval_latencies = []
+        self._interval_errors = 0
+        return snapshot
+
+    def summary(self) -> Dict:
+        latencies = sorted(self.latencies)
+        errors = sum(self.errors.values())
+        total = len(latencies) + errors
+        return {
+            "requests": total,
+            "ok": len(latencies),
+            "errors": self.errors,
+            "error_rate": round(errors / total, 4) if total else 0.0,
+            "dropped": self.dropped,
+            "latency": {
+                "p50": percentile(latencies, 50),
+                "p90": percentile(latencies, 90),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "max": latencies[-1] if latencies else None,
+            },
+        }
+
+
+class HttpTarget:
+    """FastAPI 服务压测目标"""
+
+    def __init__(self, url: Optional[str], args):
+        self.url = url
+        self.args = args
+        self.process = None
+        self.session = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else self.args.pid
+
+    async def start(self):
+        import aiohttp
+
+        if self.url is None:
+            port = _free_port()
+            self.url = f"http://127.0.0.1:{port}"
+            self.process = await asyncio.create_subprocess_exec(
+                sys.executable, os.path.abspath(__file__), "serve-http",
+                "--port", str(port), "--latency", str(self.args.latency),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=None if self.args.verbose else asyncio.subprocess.DEVNULL,
+            )
+        self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.args.timeout))
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                async with self.session.get(f"{self.url}/health") as resp:
+                    if resp.status == 200:
+                        return
+            except Exception:
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"服务未能启动: {self.url}")
+            await asyncio.sleep(0.2)
+
+    async def search(self, query: str) -> Optional[str]:
+        payload = {"query": query, "max_results": self.args.max_results, "priority": self.args.priority}
+        async with self.session.post(f"{self.url}/search_articles", json=payload) as resp:
+            await resp.read()
+            return None if resp.status == 200 else f"http_{resp.status}"
+
+    async def cache_stats(self) -> Optional[Dict]:
+        try:
+            async with self.session.get(f"{self.url}/stats") as resp:
+                stats = await resp.json()
+                return stats.get("cache")
+        except Exception:
+            return None
+
+    async def stop(self):
+        if self.session:
+            await self.session.close()
+        if self.process:
+            self.process.terminate()
+            await self.process.wait()
+
+
+class StdioTarget:
+    """MCP stdio 服务器压测目标，请求以流水线方式写入"""
+
+    def __init__(self, args, command: Optional[List[str]] = None):
+        self.args = args
+        # 默认启动使用替身搜索器的 MCP 服务器
+        self.command = command or [sys.executable, os.path.abspath(__file__), "serve-stdio",
+                                   "--latency", str(args.latency)]
+        self.process = None
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._reader = None
+
+    @property
+    def pid(self) -> Optional[int]:
+        return self.process.pid if self.process else None
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(
+            *self.command,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=None if self.args.verbose else asyncio.subprocess.DEVNULL,
+            limit=16 * 1024 * 1024,
+        )
+        self._reader = asyncio.create_task(self._read_loop())
+        await asyncio.wait_for(self.call("initialize", {"protocolVersion": "2025-06-18", "capabilities": {},
+                                                        "clientInfo": {"name": "loadtest", "version": "1"}}), 60)
+        self._write({"jsonrpc": "2.0", "method": "notifications/initialized"})
+
+    def _write(self, message: Dict):
+        self.process.stdin.write((json.dumps(message, ensure_ascii=False) + "\n").encode("utf-8"))
+
+    async def _read_loop(self):
+        while True:
+            line = await self.process.stdout.readline()
+            if not line:
+                break
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            future = self._pending.pop(message.get("id"), None)
+            if future and not future.done():
+                future.set_result(message)
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(ConnectionError("MCP 服务器已退出"))
+
+    async def call(self, method: str, params: Dict) -> Dict:
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self._write({"jsonrpc": "2.0", "id": request_id, "method": method, "params": params})
+        await self.process.stdin.drain()
+        return await future
+
+    async def search(self, query: str) -> Optional[str]:
+        response = await asyncio.wait_for(self.call("tools/call", {
+            "name": "search_wechat_articles",
+            "arguments": {"query": query, "max_results": self.args.max_results},
+        }), self.args.timeout)
+        if "error" in response:
+            return f"rpc_{response['error'].get('code')}"
+        return None
+
+    async def cache_stats(self) -> Optional[Dict]:
+        """经 MCP 服务统计资源读取结果缓存统计"""
+        try:
+            response = await asyncio.wait_for(self.call("resources/read", {"uri": STATS_RESOURCE["uri"]}),
+                                              self.args.timeout)
+            return json.loads(response["result"]["contents"][0]["text"]).get("cache")
+        except Exception:
+            return None
+
+    async def stop(self):
+        if self.process:
+            if self.process.returncode is None:
+                self.process.stdin.close()
+                try:
+                    await asyncio.wait_for(self.process.wait(), 10)
+                except asyncio.TimeoutError:
+                    self.process.kill()
+                    await self.process.wait()
+        if self._reader:
+            self._reader.cancel()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _load_queries(args) -> List[str]:
+    if args.query_file:
+        with open(args.query_file, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        queries = [f"关键词{i}" for i in range(1, args.queries + 1)]
+    return queries
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+async def run_load(args) -> Dict:
+    """按目标速率发送请求（开环到达），定期输出区间统计，返回汇总结果"""
+    target = HttpTarget(args.url, args) if args.mode == "http" else StdioTarget(args)
+    mix = ZipfQueryMix(_load_queries(args), args.zipf, args.seed)
+    arrivals = random.Random(args.seed + 1)
+    stats = LoadStats()
+    timeline = []
+    tasks = set()
+
+    async def one(query: str):
+        started = time.perf_counter()
+        try:
+            error = await target.search(query)
+        except Exception as e:
+            error = type(e).__name__
+        stats.record(time.perf_counter() - started, error)
+
+    async def report_loop(started: float):
+        while True:
+            await asyncio.sleep(args.report_interval)
+            interval = stats.take_interval()
+            cache = await target.cache_stats()
+            point = {
+                "t": round(time.monotonic() - started, 1),
+                "in_flight": len(tasks),
+                "rss_mb": read_rss_mb(target.pid),
+                "cache_hit_rate": cache.get("hit_rate") if cache else None,
+                **interval,
+            }
+            timeline.append(point)
+            if not args.quiet:
+                print(f"[{point['t']:>6}s] ok={point['ok']:<5} err={point['errors']:<4} "
+                      f"p50={_format_ms(point['p50'])}ms p95={_format_ms(point['p95'])}ms "
+                      f"p99={_format_ms(point['p99'])}ms in_flight={point['in_flight']:<4} "
+                      f"rss={point['rss_mb']}MB cache_hit={point['cache_hit_rate']}", file=sys.stderr)
+
+    await target.start()
+    try:
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        reporter = asyncio.create_task(report_loop(time.monotonic()))
+        next_at = started
+        while True:
+            next_at += arrivals.expovariate(args.rate)
+            if next_at - started > args.duration:
+                break
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            if len(tasks) >= args.max_in_flight:
+                stats.dropped += 1
+                continue
+            task = asyncio.create_task(one(mix.sample()))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        reporter.cancel()
+
+        elapsed = loop.time() - started
+        summary = stats.summary()
+        cache = await target.cache_stats()
+        summary.update({
+            "mode": args.mode,
+            "target_rate": args.rate,
+            "achieved_rate": round(summary["ok"] / elapsed, 2) if elapsed else 0.0,
+            "duration": round(elapsed, 2),
+            "cache": cache,
+            "rss_mb": read_rss_mb(target.pid),
+            "peak_rss_mb": max((p["rss_mb"] for p in timeline if p["rss_mb"] is not None), default=None),
+            "timeline": timeline,
+        })
+        return summary
+    finally:
+        await target.stop()
+
+
+async def measure_handshake(args) -> Dict:
+    """多次启动真实的 MCP 服务器，统计 initialize 和 tools/list 响应距启动的时间"""
+    command = [sys.executable, os.path.join(ROOT_DIR, "mcp_server.py")]
+    initialize_ms, tools_list_ms = [], []
+    for _ in range(args.runs):
+        target = StdioTarget(args, command=command)
+        started = time.perf_counter()
+        try:
+            await target.start()
+            initialize_ms.append((time.perf_counter() - started) * 1000)
+            await asyncio.wait_for(target.call("tools/list", {}), args.timeout)
+            tools_list_ms.append((time.perf_counter() - started) * 1000)
+        finally:
+            await target.stop()
+
+    def describe(values: List[float]) -> Dict:
+        values = sorted(values)
+        return {
+            "min": round(values[0], 1),
+            "p50": round(percentile(values, 50), 1),
+            "max": round(values[-1], 1),
+        }
+
+    return {"runs": args.runs, "initialize_ms": describe(initialize_ms), "tools_list_ms": describe(tools_list_ms)}
+
+
+def serve_http(args):
+    """启动使用替身搜索器的 FastAPI 服务"""
+    import uvicorn
+
+    os.chdir(APP_DIR)
+    import main
+
+    # 压测时关闭租户配额，替身结果不写入文章语料库
+    main.quota.enabled = False
+    main.search_service.corpus = None
+    main.search_service.searcher_factory = lambda: FixtureSearcher(latency=args.latency)
+    uvicorn.run(main.app, host="127.0.0.1", port=args.port, log_level="warning")
+
+
+def serve_stdio(args):
+    """启动使用替身搜索器的 MCP stdio 服务器"""
+    sys.path.insert(0, ROOT_DIR)
+    import mcp_server
+
+    from search.service import SearchService
+
+    service = SearchService(searcher_factory=lambda: FixtureSearcher(latency=args.latency))
+    asyncio.run(mcp_server.main(service))
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="微信文章搜索服务负载测试")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="运行负载测试")
+    run.add_argument("--mode", choices=["http", "stdio"], default="http")
+    run.add_argument("--url", help="压测已运行的 HTTP 服务，不指定时启动替身服务")
+    run.add_argument("--pid", type=int, help="已运行服务的进程号，用于采集内存")
+    run.add_argument("--rate", type=float, default=10.0, help="目标请求速率（次/秒）")
+    run.add_argument("--duration", type=float, default=30.0, help="持续时间（秒）")
+    run.add_argument("--queries", type=int, default=200, help="查询词数量")
+    run.add_argument("--query-file", help="查询词文件，每行一个，按出现频率从高到低排列")
+    run.add_argument("--zipf", type=float, default=1.1, help="Zipf 分布指数")
+    run.add_argument("--seed", type=int, default=1)
+    run.add_argument("--max-results", type=int, default=5)
+    run.add_argument("--priority", default="interactive", help="HTTP 请求优先级")
+    run.add_argument("--latency", type=float, default=0.05, help="替身搜索器的平均搜索耗时（秒）")
+    run.add_argument("--timeout", type=float, default=60.0, help="单个请求超时（秒）")
+    run.add_argument("--max-in-flight", type=int, default=1000, help="最大并发请求数，超出时丢弃")
+    run.add_argument("--report-interval", type=float, default=5.0, help="区间统计输出间隔（秒）")
+    run.add_argument("--json", help="将汇总结果写入 JSON 文件")
+    run.add_argument("--quiet", action="store_true", help="不输出区间统计")
+    run.add_argument("--verbose", action="store_true", help="显示被测服务的日志")
+
+    handshake = sub.add_parser("handshake", help="测量 MCP 服务器的握手延迟")
+    handshake.add_argument("--runs", type=int, default=5, help="启动次数")
+    handshake.add_argument("--timeout", type=float, default=60.0)
+    handshake.add_argument("--verbose", action="store_true", help="显示 MCP 服务器的日志")
+
+    http = sub.add_parser("serve-http", help="启动使用替身搜索器的 HTTP 服务")
+    http.add_argument("--port", type=int, default=8000)
+    http.add_argument("--latency", type=float, default=0.05)
+
+    stdio = sub.add_parser("serve-stdio", help="启动使用替身搜索器的 MCP stdio 服务器")
+    stdio.add_argument("--latency", type=float, default=0.05)
+
+    replay = sub.add_parser("replay", help="离线回放搜索样本归档，对比解析结果和耗时")
+    replay.add_argument("--archive", default=os.path.join(default_data_dir(), "samples"), help="样本归档目录")
+    replay.add_argument("--limit", type=int, help="最多回放的样本数")
+    replay.add_argument("--json", help="将回放报告写入 JSON 文件")
+    return parser
+
+
+async def run_replay(args) -> Dict:
+    """回放样本归档"""
+    from search.replay import replay_archive
+    from search.sample_archive import SampleArchive
+    return await replay_archive(SampleArchive(args.archive), limit=args.limit)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "serve-http":
+        serve_http(args)
+    elif args.command == "serve-stdio":
+        serve_stdio(args)
+    elif args.command == "handshake":
+        print(json.dumps(asyncio.run(measure_handshake(args)), ensure_ascii=False, indent=2))
+    elif args.command == "replay":
+        report = asyncio.run(run_replay(args))
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+    else:
+        summary = asyncio.run(run_load(args))
+        output = {k: v for k, v in summary.items() if k != "timeline"}
+        print(json.dumps(output, ensure_ascii=False, indent=2))
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as f:
+                json.dump(summary, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
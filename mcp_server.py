@@ -6,211 +6,122 @@
 """
 
 import asyncio
+import importlib
 import json
 import sys
 import os
-from typing import Any, Dict, List
+import time
+from typing import Any, Dict, Set
+
+# 进程启动时间，用于统计握手延迟
+PROCESS_START = time.monotonic()
 
 # 添加 app 目录到路径
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
 
-from search.playwright_search import WeChatArticleSearcher
+from search.mcp_protocol import MCPError, MCPProtocol, make_response
+from search.service import RemoteSearchService, SearchService
+from search.watcher import KeywordWatcher, service_runner
+from search import json_codec
 
 
 class MCPServer:
     """标准 MCP 服务器实现"""
     
-    def __init__(self):
-        self.searcher = None
-        self.request_id = 0
+    def __init__(self, service=None):
+        self.service = service
+        self.protocol = None
+        self.watcher = None
+        self._warmup = None
+        # 进行中的请求，每个请求一个任务
+        self._requests: Set[asyncio.Task] = set()
+        # 握手各阶段响应时距进程启动的时间（毫秒）
+        self.handshake_ms: Dict[str, float] = {}
         
     async def start(self):
-        """启动服务器"""
-        self.searcher = WeChatArticleSearcher()
-        await self.searcher.__aenter__()
+        """启动服务器
+
+        设置 WEIXIN_SEARCH_SERVICE_URL（如 unix:/run/weixin-search.sock）时将请求转发到
+        本机运行中的 FastAPI 服务，共用其浏览器和缓存；否则在进程内使用搜索服务。
+        """
+        if self.service is None:
+            service_url = os.getenv("WEIXIN_SEARCH_SERVICE_URL")
+            if service_url:
+                self.service = RemoteSearchService(service_url)
+                print(f"请求将转发到搜索服务: {service_url}", file=sys.stderr)
+            else:
+                self.service = SearchService.from_env()
+        # 关键词订阅的新文章以 notifications/resources/updated 推送到本连接
+        self.watcher = KeywordWatcher(service_runner(self.service))
+        self.protocol = MCPProtocol(self.service, self.watcher)
+        self.watcher.start()
+        # 浏览器在后台启动，与握手并行；第一次 tools/call 经 get_searcher 等待其完成
+        self._warmup = asyncio.create_task(self._warm_up())
         print("微信文章搜索 MCP 服务器已启动", file=sys.stderr)
         
-    async def stop(self):
-        """停止服务器"""
-        if self.searcher:
-            await self.searcher.__aexit__(None, None, None)
-            
-    def send_response(self, request_id: int, result: Any = None, error: Any = None):
-        """发送响应"""
-        response = {
-            "jsonrpc": "2.0",
-            "id": request_id
-        }
+    async def _warm_up(self):
+        """后台启动浏览器，失败时由首次工具调用重试"""
+        started = time.monotonic()
+        try:
+            # 在线程中预先导入 Playwright，避免阻塞事件循环上的握手
+            await asyncio.to_thread(importlib.import_module, "search.playwright_search")
+            await self.service.get_searcher()
+            print(f"浏览器后台启动完成，耗时 {time.monotonic() - started:.2f}s", file=sys.stderr)
+        except Exception as e:
+            print(f"浏览器后台启动失败，将在首次调用时重试: {e}", file=sys.stderr)
         
-        if error:
-            response["error"] = error
-        else:
-            response["result"] = result
+    async def stop(self):
+        """停止服务器：先回答已收到的请求"""
+        if self._requests:
+            await asyncio.gather(*self._requests, return_exceptions=True)
+        if self._warmup and not self._warmup.done():
+            self._warmup.cancel()
+            await asyncio.gather(self._warmup, return_exceptions=True)
+        if self.watcher:
+            await self.watcher.close()
+        if self.service:
+            await self.service.close()
             
-        print(json.dumps(response, ensure_ascii=False))
+    def send_response(self, response: Dict[str, Any]):
+        """发送响应；同步写出整行，并发处理的请求之间不会交错"""
+        print(json_codec.dumps(response).decode("utf-8"))
         sys.stdout.flush()
         
-    async def handle_initialize(self, request_id: int, params: Dict[str, Any]):
-        """处理初始化请求"""
-        result = {
-            "protocolVersion": "2025-06-18",
-            "capabilities": {
-                "tools": {
-                    "listChanged": False
-                },
-                "resources": {
-                    "subscribe": False,
-                    "listChanged": False
-                },
-                "prompts": {
-                    "listChanged": False
-                }
-            },
-            "serverInfo": {
-                "name": "wechat-article-search",
-                "version": "1.0.0"
-            }
-        }
-        self.send_response(request_id, result)
-        
-    async def handle_list_tools(self, request_id: int, params: Dict[str, Any]):
-        """处理工具列表请求"""
-        tools = [{
-            "name": "search_wechat_articles",
-            "description": "搜索微信公众号文章",
-            "inputSchema": {
-                "type": "object",
-                "properties": {
-                    "query": {
-                        "type": "string",
-                        "description": "搜索关键词",
-                        "minLength": 1,
-                        "maxLength": 100
-                    },
-                    "max_results": {
-                        "type": "integer", 
-                        "description": "最大结果数量",
-                        "default": 5,
-                        "minimum": 1,
-                        "maximum": 20
-                    },
-                    "time_filter": {
-                        "type": "string",
-                        "description": "时间筛选",
-                        "enum": ["day", "week", "month", "year"]
-                    }
-                },
-                "required": ["query"]
-            }
-        }]
-        
-        self.send_response(request_id, {"tools": tools})
-        
-    async def handle_call_tool(self, request_id: int, params: Dict[str, Any]):
-        """处理工具调用"""
-        tool_name = params.get("name")
-        arguments = params.get("arguments", {})
-        
-        if tool_name == "search_wechat_articles":
-            query = arguments.get("query", "")
-            max_results = arguments.get("max_results", 5)
-            time_filter = arguments.get("time_filter")
-            
-            if not query:
-                self.send_response(request_id, None, {
-                    "code": -32602,
-                    "message": "缺少搜索关键词"
-                })
-                return
-                
-            try:
-                articles = await self.searcher.search_articles(
-                    query=query,
-                    max_results=max_results,
-                    time_filter=time_filter
-                )
-                
-                # 格式化结果
-                result_text = f"找到 {len(articles)} 篇关于「{query}」的微信文章：\n\n"
-                
-                for i, article in enumerate(articles, 1):
-                    result_text += f"{i}. **{article['title']}**\n"
-                    result_text += f"   来源：{article['source']}\n"
-                    result_text += f"   时间：{article['date']}\n"
-                    result_text += f"   摘要：{article['snippet'][:100]}...\n"
-                    result_text += f"   链接：{article['url']}\n\n"
-                
-                self.send_response(request_id, {
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": result_text
-                        }
-                    ]
-                })
-                
-            except Exception as e:
-                print(f"搜索错误: {str(e)}", file=sys.stderr)
-                self.send_response(request_id, None, {
-                    "code": -32603,
-                    "message": f"搜索失败: {str(e)}"
-                })
-        else:
-            self.send_response(request_id, None, {
-                "code": -32601,
-                "message": f"未知工具: {tool_name}"
-            })
+    def notify(self, message: Dict[str, Any]):
+        """发送服务器主动通知"""
+        self.send_response(message)
             
-    async def handle_list_resources(self, request_id: int, params: Dict[str, Any]):
-        """处理资源列表请求"""
-        self.send_response(request_id, {"resources": []})
-        
-    async def handle_list_prompts(self, request_id: int, params: Dict[str, Any]):
-        """处理提示词列表请求"""
-        self.send_response(request_id, {"prompts": []})
-        
-    async def handle_notifications_initialized(self):
-        """处理初始化完成通知"""
-        # 不需要响应，这是通知消息
-        pass
+    def record_handshake(self, method: str):
+        """记录握手请求首次响应的时间"""
+        if method not in self.handshake_ms:
+            elapsed = (time.monotonic() - PROCESS_START) * 1000
+            self.handshake_ms[method] = round(elapsed, 1)
+            print(f"{method} 已响应，距进程启动 {elapsed:.0f}ms", file=sys.stderr)
             
+    def dispatch(self, message: Dict[str, Any]):
+        """在独立任务中处理请求，慢的 tools/call 不阻塞之后的 ping、tools/list 等请求"""
+        task = asyncio.create_task(self.handle_request(message))
+        self._requests.add(task)
+        task.add_done_callback(self._requests.discard)
+
     async def handle_request(self, message: Dict[str, Any]):
         """处理请求"""
-        method = message.get("method")
-        request_id = message.get("id")
-        params = message.get("params", {})
-        
-        # 处理通知消息（无需响应）
-        if method == "notifications/initialized":
-            await self.handle_notifications_initialized()
+        try:
+            response = await self.protocol.handle_message(message, self)
+        except Exception as e:
+            print(f"处理请求错误: {e}", file=sys.stderr)
             return
-        elif method and method.startswith("notifications/"):
-            # 忽略其他通知消息
+        if response is None:
             return
-            
-        # 处理请求消息（需要响应）
-        if method == "initialize":
-            await self.handle_initialize(request_id, params)
-        elif method == "tools/list":
-            await self.handle_list_tools(request_id, params)
-        elif method == "tools/call":
-            await self.handle_call_tool(request_id, params)
-        elif method == "resources/list":
-            await self.handle_list_resources(request_id, params)
-        elif method == "prompts/list":
-            await self.handle_list_prompts(request_id, params)
-        else:
-            # 对于未知方法，只有在有 request_id 时才响应
-            if request_id is not None:
-                self.send_response(request_id, None, {
-                    "code": -32601,
-                    "message": f"未知方法: {method}"
-                })
+        self.send_response(response)
+        method = message.get("method") if isinstance(message, dict) else None
+        if method in ("initialize", "tools/list"):
+            self.record_handshake(method)
 
 
-async def main():
+async def main(service=None):
     """主函数"""
-    server = MCPServer()
+    server = MCPServer(service)
     
     try:
         await server.start()
@@ -231,9 +142,10 @@ async def main():
                     
                 try:
                     message = json.loads(line)
-                    await server.handle_request(message)
+                    server.dispatch(message)
                 except json.JSONDecodeError as e:
                     print(f"JSON 解析错误: {e}", file=sys.stderr)
+                    server.send_response(make_response(None, None, MCPError(-32700, "JSON 解析错误").to_dict()))
                     
             except EOFError:
                 break
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章正文抓取测试：元信息与正文提取、发布时间时区、HTTP 失败时的浏览器回退
+"""
+
+import asyncio
+import sys
+import os
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.article_fetcher import ArticleFetcher, extract_article
+
+
+URL = "https://mp.weixin.qq.com/s?__biz=B&mid=1&idx=1&sn=s"
+
+# 1700000000 为北京时间 2023-11-15 06:13:20（UTC 前一天 22:13:20）
+ARTICLE_HTML = """<html><head>
+<meta property="og:title" content="备用标题">
+<meta name="author" content="张三">
+<meta property="og:description" content="文章摘要">
+<script>var ct = "1700000000";</script>
+</head><body>
+<h1 id="activity-name">  大模型应用实践  </h1>
+<a id="js_name"> 科技公众号 </a>
+<div id="js_content">
+  <section><p>第一段&nbsp;内容</p><p>第二段<br>换行</p></section>
+  <script>var ignored = 1;</script>
+  <img src="x.png"><p>第三段</p>
+</div>
+</body></html>"""
+
+# 验证页：没有正文
+VERIFY_HTML = "<html><body><p>环境异常，请完成验证</p></body></html>"
+
+
+class FakeResponse:
+    def __init__(self, status, html):
+        self.status = status
+        self.html = html
+
+    async def text(self, errors="strict"):
+        return self.html
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self, status=200, html=ARTICLE_HTML):
+        self.status = status
+        self.html = html
+        self.requests = 0
+
+    def get(self, url):
+        self.requests += 1
+        return FakeResponse(self.status, self.html)
+
+
+class FakeSearcher:
+    user_agents = ["test-agent"]
+
+    def __init__(self, html=ARTICLE_HTML):
+        self.html = html
+        self.pages = 0
+
+    async def fetch_page_html(self, url):
+        self.pages += 1
+        if self.html is None:
+            raise RuntimeError("浏览器不可用")
+        return self.html
+
+
+def make_fetcher(session, searcher=None):
+    fetcher = ArticleFetcher(searcher=searcher)
+    fetcher._session = session
+    fetcher._semaphore = asyncio.Semaphore(fetcher.concurrency)
+    return fetcher
+
+
+def test_extract_article_reads_metadata_time_and_body():
+    article = extract_article(ARTICLE_HTML, URL)
+    assert article["title"] == "大模型应用实践"
+    assert article["account"] == "科技公众号"
+    assert article["author"] == "张三"
+    assert article["description"] == "文章摘要"
+    assert article["publish_time"] == "2023-11-15 06:13:20"
+    assert article["content"] == "第一段 内容\n\n第二段\n换行\n\n第三段"
+
+
+def test_extract_article_falls_back_to_og_title_and_empty_fields():
+    article = extract_article('<meta property="og:title" content="备用标题"><div id="js_content">正文</div>', URL)
+    assert article["title"] == "备用标题"
+    assert article["account"] == article["author"] == article["publish_time"] == ""
+    assert article["content"] == "正文"
+    assert extract_article(VERIFY_HTML, URL)["content"] == ""
+
+
+def test_fetch_uses_http_and_caches_the_result():
+    session = FakeSession()
+    fetcher = make_fetcher(session, FakeSearcher())
+
+    async def run():
+        return [await fetcher.fetch(URL + "&chksm=x"), await fetcher.fetch(URL)]
+
+    first, second = asyncio.run(run())
+    assert first["fetched_via"] == "http" and first["url"] == URL
+    assert second is first
+    assert session.requests == 1
+    assert fetcher.stats()["cache_hits"] == 1
+
+
+def test_fetch_falls_back_to_browser_when_http_has_no_content():
+    searcher = FakeSearcher()
+    fetcher = make_fetcher(FakeSession(html=VERIFY_HTML), searcher)
+    article = asyncio.run(fetcher.fetch(URL))
+    assert article["fetched_via"] == "browser"
+    assert article["title"] == "大模型应用实践"
+    assert searcher.pages == 1
+
+    failing = make_fetcher(FakeSession(status=404), FakeSearcher(html=None))
+    assert asyncio.run(failing.fetch(URL)) == {"url": URL, "error": "文章抓取失败"}
+    assert failing.stats()["failures"] == 1
+
+
+def test_fetch_rejects_non_wechat_urls():
+    fetcher = make_fetcher(FakeSession())
+    assert "error" in asyncio.run(fetcher.fetch("https://example.com/a"))
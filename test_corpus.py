@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文章语料库测试：去重写入、跨进程导出游标、游标分页、压缩导出、搜索后台写入语料库与导出接口/CLI、默认数据目录
+"""
+
+import asyncio
+import gzip
+import json
+import sys
+import os
+import tempfile
+import time
+import zlib
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.corpus import ArticleCorpus, export_ndjson_gz, export_stream
+from search.service import SearchService
+from test_service import StubSearcher
+
+
+def article(n, title=None, content=None):
+    item = {"title": title or f"文章{n}", "url": f"https://mp.weixin.qq.com/s?__biz=B&mid={n}&idx=1&sn=s{n}",
+            "source": "公众号", "date": "", "publish_ts": 1700000000 + n, "snippet": f"摘要{n}"}
+    if content:
+        item["content"] = content
+    return item
+
+
+async def collect(pages):
+    return [page async for page in pages]
+
+
+def test_unchanged_articles_are_not_reexported():
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ArticleCorpus(os.path.join(tmp, "corpus.sqlite3"))
+        corpus.write("q1", [article(1), article(2)])
+        cursor = corpus.checkpoint()
+        # 同一文章（追踪参数不同）再次出现且内容未变，不刷新 updated_at
+        again = dict(article(1), url=article(1)["url"] + "&chksm=x&scene=1")
+        corpus.write("q2", [again, article(3)])
+        corpus.write("q3", [article(2, title="文章2（修订）")])
+        corpus.write("q4", [article(3, content="正文")])
+
+        full = asyncio.run(collect(corpus.iter_pages()))
+        incremental = asyncio.run(collect(corpus.iter_pages(since=cursor, include_content=True)))
+        corpus.close()
+
+    rows = [row for page in full for row in page]
+    assert len(rows) == 3 and "content" not in rows[0]
+    changed = {row["title"]: row for page in incremental for row in page}
+    assert set(changed) == {"文章2（修订）", "文章3"}
+    assert changed["文章3"]["content"] == "正文" and changed["文章3"]["query"] == "q4"
+    assert changed["文章3"]["first_seen"] < changed["文章3"]["updated_at"]
+
+
+def test_unresolved_links_with_new_tokens_are_the_same_article():
+    def unresolved(token):
+        return dict(article(1), url=f"https://weixin.sogou.com/link?url={token}&type=2")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ArticleCorpus(os.path.join(tmp, "corpus.sqlite3"))
+        corpus.write("q", [unresolved("first-token")])
+        cursor = corpus.checkpoint()
+        # 再次搜索时搜狗给出新的跳转参数，仍是同一篇文章
+        corpus.write("q", [unresolved("second-token")])
+        rows = [row for page in asyncio.run(collect(corpus.iter_pages())) for row in page]
+        incremental = asyncio.run(collect(corpus.iter_pages(since=cursor)))
+        corpus.close()
+
+    assert len(rows) == 1 and rows[0]["key"] == "公众号|文章1"
+    assert incremental == []
+
+
+def test_checkpoint_never_passes_a_later_write_from_another_process(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "corpus.sqlite3")
+        server, exporter = ArticleCorpus(path), ArticleCorpus(path)
+        assert exporter.checkpoint() == 0.0
+        server.write("q", [article(1)])
+        cursor = exporter.checkpoint()
+
+        # 时钟回拨时，之后提交的写入仍排在游标之后
+        real_time = time.time
+        monkeypatch.setattr(time, "time", lambda: real_time() - 3600)
+        server.write("q", [article(2)])
+        monkeypatch.setattr(time, "time", real_time)
+
+        before = [row["title"] for page in asyncio.run(collect(exporter.iter_pages(until=cursor))) for row in page]
+        after = [row["title"] for page in asyncio.run(collect(exporter.iter_pages(since=cursor))) for row in page]
+        server.close()
+
+    assert before == ["文章1"] and after == ["文章2"]
+
+
+def test_pages_cover_rows_with_identical_timestamps_exactly_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ArticleCorpus(os.path.join(tmp, "corpus.sqlite3"))
+        # 一次写入的文章共享同一个 updated_at，分页须按 key 续读
+        corpus.write("q", [article(n) for n in range(25)])
+        pages = asyncio.run(collect(corpus.iter_pages(page_size=10)))
+        empty = ArticleCorpus(os.path.join(tmp, "missing.sqlite3"))
+        assert asyncio.run(collect(empty.iter_pages())) == []
+        corpus.close()
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    keys = [row["key"] for page in pages for row in page]
+    assert len(set(keys)) == 25
+
+
+def test_ndjson_export_is_streamable_gzip():
+    async def pages():
+        yield [{"title": "一"}, {"title": "二"}]
+        yield [{"title": "三"}]
+
+    async def run():
+        return [chunk async for chunk in export_ndjson_gz(pages())]
+
+    chunks = asyncio.run(run())
+    # 每页刷新后即可解压出完整的行
+    partial = zlib.decompressobj(31).decompress(chunks[0])
+    assert partial.count(b"\n") == 2
+    lines = gzip.decompress(b"".join(chunks)).decode("utf-8").splitlines()
+    assert [json.loads(line)["title"] for line in lines] == ["一", "二", "三"]
+
+
+def test_unknown_format_and_missing_pyarrow_are_rejected_before_streaming():
+    corpus = ArticleCorpus("unused.sqlite3")
+    with pytest.raises(ValueError):
+        export_stream(corpus, "csv")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        with pytest.raises(ImportError):
+            export_stream(corpus, "parquet")
+
+
+def test_parquet_export_round_trips():
+    pq = pytest.importorskip("pyarrow.parquet")
+    import io
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ArticleCorpus(os.path.join(tmp, "corpus.sqlite3"))
+        corpus.write("q", [article(n) for n in range(5)])
+
+        async def run():
+            return b"".join([chunk async for chunk in export_stream(corpus, "parquet", page_size=2)])
+
+        data = asyncio.run(run())
+        corpus.close()
+    table = pq.read_table(io.BytesIO(data))
+    assert table.num_rows == 5 and table.num_row_groups == 3
+
+
+def test_upstream_searches_are_recorded_but_cache_hits_are_not_rewritten():
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = ArticleCorpus(os.path.join(tmp, "corpus.sqlite3"))
+
+        async def run():
+            searcher = StubSearcher(delay=0)
+            service = SearchService(searcher_factory=lambda: searcher, corpus=corpus)
+            await service.search("语料", max_results=3)
+            await service.search("语料", max_results=3)
+            # 关闭服务时等待后台写入完成
+            await service.close()
+            rows = [row for page in await collect(corpus.iter_pages()) for row in page]
+            return rows, (await service.stats())["corpus"]
+
+        rows, stats = asyncio.run(run())
+    # 上游返回的整页结果都写入语料库
+    assert sorted(row["title"] for row in rows) == [f"语料{i}" for i in range(10)]
+    assert stats["recorded"] == 10
+
+
+def test_search_does_not_wait_for_the_corpus_write():
+    class SlowCorpus:
+        def __init__(self):
+            self.release = asyncio.Event()
+            self.written = []
+
+        async def record(self, query, articles):
+            await self.release.wait()
+            self.written.append(query)
+
+        def close(self):
+            pass
+
+    async def run():
+        corpus = SlowCorpus()
+        service = SearchService(searcher_factory=lambda: StubSearcher(delay=0), corpus=corpus)
+        outcome = await asyncio.wait_for(service.search("后台", max_results=3), timeout=1)
+        assert corpus.written == []
+        corpus.release.set()
+        await service.close()
+        return outcome, corpus
+
+    outcome, corpus = asyncio.run(run())
+    assert len(outcome.articles()) == 3
+    assert corpus.written == ["后台"]
+
+
+def test_export_endpoint_and_cli():
+    uvicorn = pytest.importorskip("uvicorn")
+    aiohttp = pytest.importorskip("aiohttp")
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    import export_articles
+
+    original = main.search_service.corpus
+
+    async def run(tmp):
+        socket_path = os.path.join(tmp, "export.sock")
+        server = uvicorn.Server(uvicorn.Config(main.app, uds=socket_path, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        session = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=socket_path))
+        try:
+            async with session.get("http://localhost/export/articles?page_size=2") as resp:
+                first = (resp.status, resp.headers["X-Export-Cursor"], await resp.read())
+            main.search_service.corpus.write("q", [article(9)])
+            async with session.get(f"http://localhost/export/articles?since={first[1]}") as resp:
+                second = await resp.read()
+            async with session.get("http://localhost/export/articles?format=csv") as resp:
+                bad = resp.status
+        finally:
+            await session.close()
+            server.should_exit = True
+            await serving
+        return first, second, bad
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            corpus = ArticleCorpus(os.path.join(tmp, "corpus.sqlite3"))
+            corpus.write("q", [article(n) for n in range(5)])
+            main.search_service.corpus = corpus
+            (status, cursor, body), second, bad = asyncio.run(run(tmp))
+
+            output = os.path.join(tmp, "out.ndjson.gz")
+            cursor_file = os.path.join(tmp, "export.cursor")
+            export_articles.main(["--data-dir", tmp, "--output", output, "--cursor-file", cursor_file])
+            with gzip.open(output, "rt", encoding="utf-8") as f:
+                cli_rows = [json.loads(line) for line in f]
+            export_articles.main(["--data-dir", tmp, "--output", output, "--cursor-file", cursor_file])
+            with gzip.open(output, "rt", encoding="utf-8") as f:
+                cli_again = f.read()
+            corpus.close()
+    finally:
+        main.search_service.corpus = original
+
+    assert status == 200 and float(cursor) > 0
+    assert len(gzip.decompress(body).splitlines()) == 5
+    assert [json.loads(line)["title"] for line in gzip.decompress(second).splitlines()] == ["文章9"]
+    assert bad == 400
+    assert len(cli_rows) == 6
+    assert cli_again == ""
+
+
+def test_service_and_cli_default_to_the_same_data_dir(monkeypatch):
+    import export_articles
+
+    monkeypatch.delenv("WEIXIN_SEARCH_DATA_DIR", raising=False)
+    app_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app')
+    service = SearchService(searcher_factory=lambda: StubSearcher())
+    cli_data_dir = export_articles.build_parser().parse_args(["--output", "x"]).data_dir
+    assert service.data_dir == cli_data_dir == os.path.join(app_dir, "data")
+    assert ArticleCorpus.from_env().path == os.path.join(app_dir, "data", "corpus.sqlite3")
+
+    monkeypatch.setenv("WEIXIN_SEARCH_DATA_DIR", "/srv/weixin")
+    assert SearchService.from_env(searcher_factory=lambda: StubSearcher(), corpus=None).data_dir == "/srv/weixin"
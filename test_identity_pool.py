@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出口身份池测试
+调度与隔离逻辑使用模拟时钟测试；端到端测试使用本地替身代理，无需访问外网
+"""
+
+import asyncio
+import sys
+import os
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.errors import SearchBlockedError
+from search.identity_pool import EgressIdentity, IdentityPool
+from search.playwright_search import WeChatArticleSearcher
+from test_helpers import FakeClock
+
+
+FIXTURE_HTML = """<html><body><ul class="news-list">
+<li id="sogou_vr_11002601_box_0"><div class="txt-box">
+<h3><a href="/link?url=fixture-token-1">替身代理返回的文章</a></h3>
+<p class="txt-info">这是一段用于测试的文章摘要内容，长度超过十个字符</p>
+<div class="s-p"><a class="account">测试公众号</a> <span class="s2">2024-01-02</span></div>
+</div></li>
+</ul></body></html>"""
+
+
+def make_pool(clock, count=2):
+    identities = [EgressIdentity(f"id-{i}", proxy=f"http://127.0.0.1:{9000 + i}") for i in range(count)]
+    return IdentityPool(identities, quarantine_base=60, quarantine_max=240, clock=clock)
+
+
+def test_blocked_identity_is_quarantined_and_skipped():
+    clock = FakeClock(1000.0)
+    pool = make_pool(clock)
+    first = pool.select()
+    pool.report_blocked(first)
+
+    assert first.is_quarantined(clock())
+    assert pool.available_count() == 1
+    assert pool.select() is not first
+
+    clock.now += 61
+    assert pool.available_count() == 2
+
+
+def test_quarantine_doubles_on_consecutive_blocks():
+    clock = FakeClock(1000.0)
+    pool = make_pool(clock, count=1)
+    identity = pool.identities[0]
+
+    durations = []
+    for _ in range(4):
+        pool.report_blocked(identity)
+        durations.append(identity.quarantined_until - clock())
+    assert durations == [60, 120, 240, 240]
+
+    pool.report_success(identity)
+    assert identity.consecutive_blocks == 0
+
+
+def test_all_quarantined_returns_none():
+    clock = FakeClock(1000.0)
+    pool = make_pool(clock)
+    for identity in pool.identities:
+        pool.report_blocked(identity)
+    assert pool.select() is None
+
+
+def test_select_prefers_healthy_idle_identity():
+    clock = FakeClock(1000.0)
+    pool = make_pool(clock)
+    a, b = pool.identities
+    pool.report_failure(a)
+    assert pool.select() is b
+
+    b.in_flight = 3
+    assert pool.select() is a
+
+
+class StandInProxy:
+    """本地替身 HTTP 代理：直接返回固定页面，或模拟搜狗反爬重定向"""
+
+    def __init__(self, blocked: bool = False):
+        self.blocked = blocked
+        self.requests = []
+        self.server = None
+
+    @property
+    def url(self):
+        port = self.server.sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        target = head.split(b" ", 2)[1].decode()
+        self.requests.append(target)
+
+        if self.blocked and "antispider" not in target:
+            response = (b"HTTP/1.1 302 Found\r\n"
+                        b"Location: http://weixin.sogou.test/antispider/?from=%2Fweixin\r\n"
+                        b"Content-Length: 0\r\nConnection: close\r\n\r\n")
+        else:
+            body = FIXTURE_HTML.encode("utf-8")
+            response = (b"HTTP/1.1 200 OK\r\nContent-Type: text/html; charset=utf-8\r\n"
+                        + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                        + body)
+        writer.write(response)
+        await writer.drain()
+        writer.close()
+
+
+def test_searches_route_around_blocked_proxy():
+    async def run():
+        good, bad = StandInProxy(), StandInProxy(blocked=True)
+        await good.start()
+        await bad.start()
+
+        searcher = WeChatArticleSearcher(
+            proxies=[bad.url, good.url],
+            base_url="http://weixin.sogou.test"
+        )
+        # 让被封禁的身份先被选中
+        searcher.identity_pool.identities[1].health = 0.5
+        try:
+            try:
+                await searcher.init_browser()
+            except Exception as e:
+                pytest.skip(f"Chromium 不可用: {e}")
+
+            with pytest.raises(SearchBlockedError):
+                await searcher.search_articles("测试", max_results=3)
+            second = await searcher.search_articles("测试", max_results=3)
+        finally:
+            await searcher.close()
+            await good.stop()
+            await bad.stop()
+
+        assert bad.requests
+        assert searcher.identity_pool.identities[0].block_count == 1
+        assert [a["title"] for a in second] == ["替身代理返回的文章"]
+        assert second[0]["source"] == "测试公众号"
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
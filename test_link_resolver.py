@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+跳转链接解析测试：缓存命中与未命中、持久化、解析失败、批量解析的限速令牌与拦截上报、内存缓存上限
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.identity_pool import EgressIdentity, IdentityPool
+from search.link_resolver import SogouLinkResolver
+
+
+def sogou(token):
+    return f"https://weixin.sogou.com/link?url={token}&type=2&k=1&h=a"
+
+
+def target(token):
+    return f"https://mp.weixin.qq.com/s?__biz=B&mid={token}&idx=1&sn=s"
+
+
+class FakeGovernor:
+    def __init__(self):
+        self.acquired = 0
+        self.blocked = 0
+
+    async def acquire(self):
+        self.acquired += 1
+
+    def expected_wait(self):
+        return 0.0
+
+    def on_success(self):
+        pass
+
+    def on_blocked(self):
+        self.blocked += 1
+
+
+class FakeResponse:
+    def __init__(self, location="", body=""):
+        self.headers = {"Location": location} if location else {}
+        self.body = body
+
+    async def text(self, errors="strict"):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """按链接 token 返回跳转结果；过期链接返回没有目标地址的页面"""
+
+    closed = False
+
+    def __init__(self, expired=(), blocked=()):
+        self.expired = set(expired)
+        self.blocked = set(blocked)
+        self.requests = []
+        self.active = 0
+        self.max_active = 0
+
+    async def close(self):
+        self.closed = True
+
+    def get(self, url, **kwargs):
+        token = url.split("url=", 1)[1].split("&", 1)[0]
+        self.requests.append(token)
+        session = self
+
+        class Tracked(FakeResponse):
+            async def __aenter__(self):
+                session.active += 1
+                session.max_active = max(session.max_active, session.active)
+                await asyncio.sleep(0.01)
+                return self
+
+            async def __aexit__(self, *exc):
+                session.active -= 1
+                return False
+
+        if token in self.blocked:
+            return Tracked(location="https://weixin.sogou.com/antispider/?from=link")
+        if token in self.expired:
+            return Tracked(body="<html>链接已过期</html>")
+        if token.startswith("js"):
+            # 跳转页通过脚本分段拼接目标地址
+            return Tracked(body="url += 'https://mp.';\nurl += 'weixin.qq.com/s?__biz=B&mid=js&idx=1&sn=s';")
+        return Tracked(location=target(token) + "&chksm=x")
+
+
+def make_resolver(session, cache_path=None, **kwargs):
+    governor = FakeGovernor()
+    pool = IdentityPool([EgressIdentity("direct", rate_governor=governor)])
+    resolver = SogouLinkResolver(pool, cache_path=cache_path, **kwargs)
+    resolver._session = session
+    resolver._semaphore = asyncio.Semaphore(resolver.concurrency)
+    return resolver, governor
+
+
+def test_batch_resolves_in_parallel_with_a_rate_token_per_request_and_caches_hits():
+    session = FakeSession()
+    resolver, governor = make_resolver(session)
+    urls = [sogou("A"), sogou("B"), sogou("A"), sogou("jsC"), target("D") + "&scene=1"]
+
+    async def run():
+        return await resolver.resolve_many(urls), await resolver.resolve(sogou("B"))
+
+    resolved, again = asyncio.run(run())
+    assert resolved == [target("A"), target("B"), target("A"), target("js"), target("D")]
+    assert again == target("B")
+    # 重复链接只请求一次，三个链接并行且各占一个令牌；再次解析命中缓存
+    assert sorted(session.requests) == ["A", "B", "jsC"]
+    assert session.max_active == 3
+    assert governor.acquired == 3
+    stats = resolver.stats()
+    assert stats["resolved"] == 3 and stats["cache_hits"] == 1
+
+
+def test_expired_links_keep_the_original_url_and_are_retried():
+    session = FakeSession(expired={"OLD"})
+    resolver, _ = make_resolver(session)
+
+    async def run():
+        return [await resolver.resolve(sogou("OLD")) for _ in range(2)]
+
+    assert asyncio.run(run()) == [sogou("OLD"), sogou("OLD")]
+    assert session.requests == ["OLD", "OLD"]
+    assert resolver.stats()["failed"] == 2 and resolver.stats()["cache_size"] == 0
+
+
+def test_blocked_batch_is_reported_once():
+    session = FakeSession(blocked={"X", "Y", "Z"})
+    resolver, governor = make_resolver(session)
+    urls = [sogou("X"), sogou("Y"), sogou("Z")]
+    assert asyncio.run(resolver.resolve_many(urls)) == urls
+    # 并发请求都被拦截，只降速和隔离一次
+    assert governor.blocked == 1
+    assert resolver.identity_pool.identities[0].consecutive_blocks == 1
+    assert resolver.stats()["failed"] == 3
+
+
+def test_resolved_links_persist_across_restarts():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "links.sqlite3")
+        first, _ = make_resolver(FakeSession(), cache_path=path)
+        asyncio.run(first.resolve_many([sogou("A"), sogou("B")]))
+        asyncio.run(first.close())
+
+        session = FakeSession()
+        second, _ = make_resolver(session, cache_path=path)
+
+        async def run():
+            result = await second.resolve_many([sogou("A"), sogou("B"), sogou("C")])
+            await second.close()
+            return result
+
+        resolved = asyncio.run(run())
+
+    assert resolved == [target("A"), target("B"), target("C")]
+    assert session.requests == ["C"]
+    assert second.stats()["cache_hits"] == 2
+
+
+def test_memory_cache_is_bounded_lru():
+    resolver, _ = make_resolver(FakeSession(), max_memory=2)
+
+    async def run():
+        await resolver.resolve_many([sogou("A"), sogou("B")])
+        await resolver.resolve(sogou("A"))
+        await resolver.resolve(sogou("C"))
+
+    asyncio.run(run())
+    assert list(resolver._memory) == ["A", "C"]
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+负载测试工具冒烟测试（离线，使用替身搜索器）
+"""
+
+import asyncio
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import loadtest
+
+
+def test_zipf_mix_favors_top_ranked_queries():
+    mix = loadtest.ZipfQueryMix([f"q{i}" for i in range(50)], exponent=1.2, seed=3)
+    samples = [mix.sample() for _ in range(2000)]
+    assert samples.count("q0") > samples.count("q9") > samples.count("q49")
+
+
+@pytest.mark.parametrize("mode", ["http", "stdio"])
+def test_short_run_reports_latency_and_no_errors(mode):
+    if mode == "http":
+        pytest.importorskip("uvicorn")
+    args = loadtest.build_parser().parse_args([
+        "run", "--mode", mode, "--rate", "20", "--duration", "1.5",
+        "--latency", "0.005", "--report-interval", "0.5", "--quiet",
+    ])
+    summary = asyncio.run(loadtest.run_load(args))
+
+    assert summary["requests"] > 0
+    assert summary["error_rate"] == 0.0
+    assert summary["latency"]["p50"] is not None
+    assert summary["cache"]["hits"] + summary["cache"]["misses"] == summary["requests"]
+    assert summary["timeline"][0]["cache_hit_rate"] is not None
+
+
+def test_mcp_handshake_does_not_wait_for_browser():
+    args = loadtest.build_parser().parse_args(["handshake", "--runs", "1", "--timeout", "30"])
+    result = asyncio.run(loadtest.measure_handshake(args))
+    # 浏览器在后台启动，握手只包含解释器启动和轻量模块导入
+    assert result["tools_list_ms"]["max"] < 5000
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+MCP 协议处理、stdio 并发处理和 Streamable HTTP 传输测试：会话管理、多会话共用搜索服务、SSE 推送
+"""
+
+import asyncio
+import json
+import socket
+import sys
+import os
+import tempfile
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.errors import SearchOverloadedError
+from search.mcp_protocol import MCPProtocol, MCPSessionManager, origin_allowed
+from search.service import SearchService
+from test_service import StubSearcher
+from test_helpers import FakeClock
+
+
+def call_tool(request_id, query):
+    return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+            "params": {"name": "search_wechat_articles", "arguments": {"query": query, "max_results": 2}}}
+
+
+def test_protocol_returns_responses_and_ignores_notifications():
+    async def run():
+        searcher = StubSearcher(delay=0)
+        protocol = MCPProtocol(SearchService(searcher_factory=lambda: searcher))
+        init = await protocol.handle_message({"jsonrpc": "2.0", "id": 1, "method": "initialize",
+                                              "params": {"protocolVersion": "2025-03-26"}})
+        note = await protocol.handle_message({"jsonrpc": "2.0", "method": "notifications/initialized"})
+        result = await protocol.handle_message(call_tool(2, " 大模型 "))
+        missing = await protocol.handle_message(call_tool(3, ""))
+        unknown = await protocol.handle_message({"jsonrpc": "2.0", "id": 4, "method": "nope"})
+        return init, note, result, missing, unknown
+
+    init, note, result, missing, unknown = asyncio.run(run())
+    assert init["result"]["protocolVersion"] == "2025-03-26"
+    assert note is None
+    assert "大模型0" in result["result"]["content"][0]["text"]
+    assert missing["error"]["code"] == -32602
+    assert unknown["error"]["code"] == -32601
+
+
+def test_stats_resource_reports_cache_statistics():
+    async def run():
+        searcher = StubSearcher(delay=0)
+        protocol = MCPProtocol(SearchService(searcher_factory=lambda: searcher))
+        await protocol.handle_message(call_tool(1, "统计"))
+        await protocol.handle_message(call_tool(2, "统计"))
+        return await protocol.handle_message({"jsonrpc": "2.0", "id": 3, "method": "resources/read",
+                                              "params": {"uri": "weixin-search://stats"}})
+
+    response = asyncio.run(run())
+    stats = json.loads(response["result"]["contents"][0]["text"])
+    assert stats["cache"]["hits"] == 1 and stats["cache"]["misses"] == 1
+
+
+def test_protocol_maps_overload_to_retryable_error():
+    class OverloadedService:
+        async def search(self, **kwargs):
+            raise SearchOverloadedError("busy", priority="agent", retry_after=5)
+
+    response = asyncio.run(MCPProtocol(OverloadedService()).handle_message(call_tool(1, "q")))
+    assert response["error"]["code"] == -32001
+    assert response["error"]["data"]["retry_after"] == 5
+
+
+def test_protocol_rejects_bad_argument_types_with_invalid_params():
+    def call(request_id, name, arguments):
+        return {"jsonrpc": "2.0", "id": request_id, "method": "tools/call",
+                "params": {"name": name, "arguments": arguments}}
+
+    bad = [
+        call(1, "search_wechat_articles", {"query": 123}),
+        call(2, "search_wechat_articles", {"query": "q", "max_results": "abc"}),
+        call(3, "search_wechat_articles", {"query": "q", "max_results": True}),
+        call(4, "search_wechat_articles", {"query": "q", "max_results": 500}),
+        call(5, "search_wechat_articles", {"query": "q", "time_filter": "decade"}),
+        call(6, "search_wechat_articles", ["q"]),
+        call(7, "fetch_article", {"urls": 5}),
+        {"jsonrpc": "2.0", "id": 8, "method": "tools/call", "params": "oops"},
+    ]
+
+    async def run():
+        searcher = StubSearcher(delay=0)
+        protocol = MCPProtocol(SearchService(searcher_factory=lambda: searcher))
+        responses = [await protocol.handle_message(message) for message in bad]
+        ok = await protocol.handle_message(call(9, "search_wechat_articles", {"query": "q", "max_results": 2.0}))
+        return searcher, responses, ok
+
+    searcher, responses, ok = asyncio.run(run())
+    assert [r["id"] for r in responses] == list(range(1, 9))
+    assert all(r["error"]["code"] == -32602 for r in responses)
+    assert searcher.calls == 1 and "result" in ok
+
+
+def test_protocol_wraps_unexpected_errors_with_request_id():
+    class BrokenService:
+        async def search(self, **kwargs):
+            return None
+
+    protocol = MCPProtocol(BrokenService())
+    response = asyncio.run(protocol.handle_message(call_tool(7, "q")))
+    invalid = asyncio.run(protocol.handle_message({"jsonrpc": "2.0", "id": 8, "method": 42}))
+    assert response["id"] == 7 and response["error"]["code"] == -32603
+    assert invalid["id"] == 8 and invalid["error"]["code"] == -32600
+
+
+def test_stdio_server_answers_pipelined_requests_while_a_search_runs(monkeypatch, capsys):
+    import io
+    import mcp_server
+
+    lines = [call_tool(1, "慢查询"), {"jsonrpc": "2.0", "id": 2, "method": "ping"},
+             {"jsonrpc": "2.0", "id": 3, "method": "tools/list"}]
+    monkeypatch.setattr(sys, "stdin", io.StringIO("".join(json.dumps(line) + "\n" for line in lines)))
+    searcher = StubSearcher(delay=0.3)
+    asyncio.run(mcp_server.main(SearchService(searcher_factory=lambda: searcher)))
+
+    responses = [json.loads(line) for line in capsys.readouterr().out.splitlines() if line.strip()]
+    # 排在慢搜索之后的请求先得到回答；输入结束时仍等搜索完成再退出
+    assert [r["id"] for r in responses] == [2, 3, 1]
+    assert "result" in responses[-1]
+
+
+def test_session_manager_expires_idle_sessions_and_evicts_oldest():
+    clock = FakeClock()
+    sessions = MCPSessionManager(idle_timeout=60, max_sessions=2, clock=clock)
+    first = sessions.create("2025-06-18")
+    second = sessions.create("2025-06-18")
+    clock.now = 30
+    assert sessions.get(first.id) is first
+    third = sessions.create("2025-06-18")
+    # second 最久未活跃，被淘汰
+    assert sessions.get(second.id) is None
+    assert sessions.evicted == 1
+
+    clock.now = 200
+    assert sessions.get(first.id) is None
+    assert sessions.get(third.id) is None
+    assert sessions.stats()["active"] == 0
+
+
+def test_session_notify_and_shutdown_streams():
+    async def run():
+        session = MCPSessionManager().create("2025-06-18")
+        queue = session.open_stream()
+        delivered = session.notify({"jsonrpc": "2.0", "method": "notifications/message"})
+        session.shutdown()
+        return delivered, await queue.get(), await queue.get()
+
+    delivered, message, end = asyncio.run(run())
+    assert delivered == 1
+    assert message["method"] == "notifications/message"
+    assert end is None
+
+
+def test_session_is_owned_by_its_tenant_or_local_callers():
+    session = MCPSessionManager().create("2025-06-18", tenant="alpha")
+    assert session.owned_by("alpha") and session.owned_by(None)
+    assert not session.owned_by("beta")
+
+
+def test_origin_allowed_only_for_local_or_configured_origins():
+    assert origin_allowed(None)
+    assert origin_allowed("http://localhost:3000")
+    assert origin_allowed("http://127.0.0.1")
+    assert not origin_allowed("https://evil.example")
+    assert origin_allowed("https://agent.example", ("https://agent.example",))
+
+
+def test_http_transport_serves_concurrent_sessions_with_shared_service():
+    uvicorn = pytest.importorskip("uvicorn")
+    aiohttp = pytest.importorskip("aiohttp")
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+
+    original_service = main.mcp_protocol.service
+
+    async def run(socket_path):
+        searcher = StubSearcher(delay=0.05)
+        main.mcp_protocol.service = SearchService(searcher_factory=lambda: searcher)
+        server = uvicorn.Server(uvicorn.Config(main.app, uds=socket_path, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        session = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=socket_path))
+        url = "http://localhost/mcp"
+        accept = {"Accept": "application/json, text/event-stream"}
+
+        async def open_session(client_name):
+            init = {"jsonrpc": "2.0", "id": 0, "method": "initialize",
+                    "params": {"protocolVersion": "2025-06-18", "clientInfo": {"name": client_name}}}
+            async with session.post(url, json=init, headers=accept) as resp:
+                assert resp.status == 200
+                session_id = resp.headers["Mcp-Session-Id"]
+            headers = {**accept, "Mcp-Session-Id": session_id}
+            async with session.post(url, json={"jsonrpc": "2.0", "method": "notifications/initialized"},
+                                    headers=headers) as resp:
+                assert resp.status == 202
+            return headers
+
+        async def search(headers, request_id):
+            async with session.post(url, json=call_tool(request_id, "共享"), headers=headers) as resp:
+                return await resp.json()
+
+        try:
+            all_headers = await asyncio.gather(*(open_session(f"agent-{i}") for i in range(4)))
+            results = await asyncio.gather(*(search(h, i) for i, h in enumerate(all_headers)))
+
+            # 参数类型错误返回 JSON-RPC 错误而不是 HTTP 500
+            invalid = []
+            for arguments in ({"query": 123}, {"query": "共享", "max_results": "abc"}):
+                message = {"jsonrpc": "2.0", "id": 7, "method": "tools/call",
+                           "params": {"name": "search_wechat_articles", "arguments": arguments}}
+                async with session.post(url, json=message, headers=all_headers[0]) as resp:
+                    invalid.append((resp.status, (await resp.json())["error"]["code"]))
+
+            # SSE 推送流：服务器主动消息经会话的 GET 流送达，结束会话后流关闭
+            headers = all_headers[0]
+            pushed = []
+            async with session.get(url, headers={**headers, "Accept": "text/event-stream"}) as resp:
+                assert resp.status == 200
+                while not main.mcp_sessions.get(headers["Mcp-Session-Id"]).streams:
+                    await asyncio.sleep(0.01)
+                main.mcp_sessions.get(headers["Mcp-Session-Id"]).notify(
+                    {"jsonrpc": "2.0", "method": "notifications/message", "params": {"data": "hi"}})
+                async with session.delete(url, headers=headers) as deleted:
+                    assert deleted.status == 204
+                async for line in resp.content:
+                    if line.startswith(b"data: "):
+                        pushed.append(line)
+
+            async with session.post(url, json=call_tool(9, "共享"), headers=headers) as resp:
+                gone = resp.status
+            async with session.post(url, json=call_tool(9, "共享"),
+                                    headers={**accept, "Origin": "https://evil.example"}) as resp:
+                forbidden = resp.status
+        finally:
+            await session.close()
+            server.should_exit = True
+            await serving
+        return searcher, results, invalid, pushed, gone, forbidden
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            searcher, results, invalid, pushed, gone, forbidden = asyncio.run(run(os.path.join(tmp, "mcp.sock")))
+    finally:
+        main.mcp_protocol.service = original_service
+
+    # 四个会话的相同查询合并为一次上游搜索
+    assert searcher.calls == 1
+    assert all("共享0" in r["result"]["content"][0]["text"] for r in results)
+    assert invalid == [(200, -32602), (200, -32602)]
+    assert len(pushed) == 1 and b"notifications/message" in pushed[0]
+    assert gone == 404
+    assert forbidden == 403
+
+
+def test_http_transport_rejects_a_session_used_by_another_tenant():
+    uvicorn = pytest.importorskip("uvicorn")
+    aiohttp = pytest.importorskip("aiohttp")
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+
+    originals = (main.mcp_protocol.service, main.API_KEYS)
+
+    async def run():
+        searcher = StubSearcher(delay=0)
+        main.mcp_protocol.service = SearchService(searcher_factory=lambda: searcher)
+        main.API_KEYS = {"ka": "alpha", "kb": "beta"}
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(main.app, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        url = f"http://127.0.0.1:{port}/mcp"
+        session = aiohttp.ClientSession()
+
+        def headers(key, session_id=None):
+            result = {"Accept": "application/json, text/event-stream", "X-API-Key": key}
+            if session_id:
+                result["Mcp-Session-Id"] = session_id
+            return result
+
+        try:
+            init = {"jsonrpc": "2.0", "id": 0, "method": "initialize", "params": {"protocolVersion": "2025-06-18"}}
+            async with session.post(url, json=init, headers=headers("ka")) as resp:
+                session_id = resp.headers["Mcp-Session-Id"]
+            statuses = []
+            async with session.post(url, json=call_tool(1, "越权"), headers=headers("kb", session_id)) as resp:
+                statuses.append(resp.status)
+            async with session.get(url, headers={**headers("kb", session_id), "Accept": "text/event-stream"}) as resp:
+                statuses.append(resp.status)
+            async with session.delete(url, headers=headers("kb", session_id)) as resp:
+                statuses.append(resp.status)
+            async with session.post(url, json=call_tool(2, "本人"), headers=headers("ka", session_id)) as resp:
+                own = resp.status
+        finally:
+            await session.close()
+            server.should_exit = True
+            await serving
+        return searcher, statuses, own
+
+    try:
+        searcher, statuses, own = asyncio.run(run())
+    finally:
+        main.mcp_protocol.service, main.API_KEYS = originals
+
+    # 其他租户拿到会话 ID 也无法调用、订阅或结束该会话
+    assert statuses == [404, 404, 404]
+    assert own == 200 and searcher.calls == 1
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索预取测试
+"""
+
+import asyncio
+import sys
+import os
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.prefetcher import SearchPrefetcher
+from search.result_cache import SearchResultCache
+from test_helpers import FakeClock
+
+
+def make_articles(count, prefix):
+    return [{"title": f"{prefix}{i}", "url": f"https://mp.weixin.qq.com/s/{prefix}{i}",
+             "source": "公众号", "date": "", "publish_ts": None, "snippet": ""} for i in range(count)]
+
+
+def test_followups_learned_within_window_only():
+    clock = FakeClock()
+    prefetcher = SearchPrefetcher(runner=None, is_idle=lambda: False, clock=clock)
+    prefetcher.record("a", "大模型")
+    clock.now += 10
+    prefetcher.record("a", "大模型 应用")
+    prefetcher.record("b", "大模型")
+    clock.now += 1000
+    prefetcher.record("b", "无关查询")
+
+    jobs = prefetcher.candidates("大模型", 5, None, None)
+    # 第一页已整页缓存，下一页补齐到 20 篇
+    assert [(j.query, j.max_results, j.reason) for j in jobs] == [
+        ("大模型", 20, "next_page"),
+        ("大模型 应用", 5, "followup"),
+    ]
+    assert [j.reason for j in prefetcher.candidates("大模型", 20, None, None)] == ["followup"]
+    assert [j.reason for j in prefetcher.candidates("无关查询", 5, None, None)] == ["next_page"]
+
+
+def test_prefetch_fills_cache_and_reports_hit_ratio():
+    async def run():
+        cache = SearchResultCache()
+        idle = {"value": True}
+
+        async def runner(job):
+            if cache.peek(job.query, job.time_filter, job.max_results) is not None:
+                return False
+            cache.put(job.query, job.time_filter, job.max_results, make_articles(job.max_results, job.query),
+                      query=job.query, search_time=0.1, timestamp="", prefetched=True)
+            return True
+
+        prefetcher = SearchPrefetcher(runner, lambda: idle["value"])
+        prefetcher.record("earlier", "q")
+        prefetcher.record("earlier", "q 后续")
+        cache.put("q", None, 5, make_articles(5, "q"), query="q", search_time=0.1, timestamp="")
+        prefetcher.after_search("client", "q", 5, None)
+        await asyncio.sleep(0)
+
+        # 客户端随后请求更多结果或发出常见的后续查询，由预取结果满足
+        assert len(cache.lookup("q", None, 20).records) == 20
+        assert len(cache.lookup("q 后续", None, 5).records) == 5
+
+        # 忙碌时不预取
+        idle["value"] = False
+        prefetcher.after_search("other", "q", 5, None)
+        await asyncio.sleep(0)
+        return prefetcher.stats(cache.prefetch_hits)
+
+    stats = asyncio.run(run())
+    assert stats["completed"] == 2
+    assert stats["hits"] == 2
+    assert stats["hit_ratio"] == 1.0
+    assert stats["skipped_busy"] == 2
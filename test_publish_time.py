@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+发布时间规范化测试
+"""
+
+import sys
+import os
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.publish_time import format_date, parse_publish_time, sort_by_time, time_filter_cutoff
+from search.text_normalize import normalize_article
+
+# 2024-03-10 12:00:00 北京时间
+NOW = 1710043200
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1700000000", 1700000000),
+    ("2024-01-02", 1704124800),
+    ("2024年1月2日", 1704124800),
+    ("2024-01-02 08:30", 1704155400),
+    ("3天前", NOW - 3 * 86400),
+    ("5小时前", NOW - 5 * 3600),
+    ("10分钟前", NOW - 600),
+    ("刚刚", NOW),
+    ("昨天", 1709913600),
+    ("2024-02-30", None),
+    ("很久以前", None),
+    ("", None),
+])
+def test_parse_publish_time(text, expected):
+    assert parse_publish_time(text, NOW) == expected
+
+
+def test_format_date_uses_china_time():
+    # 北京时间 2024-01-02 00:30 对应 UTC 2024-01-01 16:30
+    assert format_date(1704126600) == "2024-01-02"
+    assert format_date(None) == ""
+
+
+def test_embedded_timestamp_takes_precedence_over_meta_text():
+    article = normalize_article("标题", "https://mp.weixin.qq.com/s/a",
+                                meta_text="公众号 3天前", timestamp="1704124800", now=NOW)
+    assert article["publish_ts"] == 1704124800
+    assert article["date"] == "2024-01-02"
+    assert article["source"] == "公众号"
+
+
+def test_relative_time_is_frozen_at_fetch_time():
+    article = normalize_article("标题", "u", meta_text="公众号 3天前", now=NOW)
+    assert article["publish_ts"] == NOW - 3 * 86400
+    assert article["date"] == "2024-03-07"
+
+
+def test_sort_and_time_filter_cutoff():
+    articles = [
+        {"url": "a", "publish_ts": NOW - 2 * 86400},
+        {"url": "b", "publish_ts": NOW - 20 * 86400},
+        {"url": "c", "publish_ts": None},
+        {"url": "d", "publish_ts": NOW - 3600},
+    ]
+    assert [a["url"] for a in sort_by_time(articles)] == ["d", "a", "b", "c"]
+    assert [a["url"] for a in sort_by_time(articles, newest_first=False)] == ["b", "a", "d", "c"]
+    assert time_filter_cutoff("week", NOW) == NOW - 7 * 86400
+    assert time_filter_cutoff(None, NOW) is None and time_filter_cutoff("unknown", NOW) is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+租户配额测试：按开销计费、租户隔离、执行方式预判、接口 429 与 /stats 用量
+"""
+
+import asyncio
+import sys
+import os
+import socket
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.errors import QuotaExceededError
+from search.quota import (
+    CACHE_HIT_COST, CONTENT_FETCH_COST, UPSTREAM_PAGE_COST, TenantQuota, parse_api_keys, search_cost
+)
+from search.service import SearchService
+from test_service import StubSearcher
+
+
+def test_search_cost_charges_upstream_page_and_extras_only():
+    assert search_cost("cached", 20, include_content=True) == CACHE_HIT_COST
+    assert search_cost("coalesced", 20) == CACHE_HIT_COST
+    assert search_cost("upstream", 10) == UPSTREAM_PAGE_COST
+    # 超过一页的结果需要读取下一页
+    assert search_cost("upstream", 20) == 2 * UPSTREAM_PAGE_COST
+    assert search_cost("upstream", 5, include_content=True, content_top_k=3) == \
+        UPSTREAM_PAGE_COST + 3 * CONTENT_FETCH_COST
+
+
+def test_parse_api_keys():
+    assert parse_api_keys(" alpha:k1 , beta:k2,broken,:k3") == {"k1": "alpha", "k2": "beta"}
+
+
+def test_quota_rejects_when_exhausted_and_isolates_tenants():
+    async def run():
+        quota = TenantQuota(limit="250/minute")
+        await quota.charge("alpha", 100, "upstream")
+        for _ in range(30):
+            await quota.charge("alpha", 1, "cached")
+        await quota.charge("alpha", 100, "upstream")
+        with pytest.raises(QuotaExceededError) as excinfo:
+            await quota.charge("alpha", 100, "upstream")
+        # 配额不足时缓存命中仍可用
+        await quota.charge("alpha", 1, "cached")
+        await quota.charge("beta", 100, "upstream")
+        return quota, excinfo.value, await quota.stats()
+
+    quota, error, stats = asyncio.run(run())
+    assert error.tenant == "alpha" and error.retry_after >= 1
+    alpha = stats["tenants"]["alpha"]
+    assert alpha["upstream"] == 2 and alpha["cache_hits"] == 31
+    assert alpha["units"] == 231 and alpha["rejected"] == 1
+    assert stats["tenants"]["beta"]["remaining"] == 150
+    assert stats["backend"] == "memory"
+
+
+def test_service_plan_predicts_cache_and_inflight():
+    async def run():
+        searcher = StubSearcher(delay=0.05)
+        service = SearchService(searcher_factory=lambda: searcher)
+        plans = [service.plan("预判", 3)]
+        task = asyncio.create_task(service.search("预判", max_results=3))
+        await asyncio.sleep(0.01)
+        plans.append(service.plan("预判", 3))
+        await task
+        plans.append(service.plan("预判", 2))
+        plans.append(service.plan("预判", 2, use_cache=False))
+        return plans, service.cache.stats()
+
+    plans, cache_stats = asyncio.run(run())
+    assert plans == ["upstream", "coalesced", "cached", "upstream"]
+    # 预判不计入缓存命中统计
+    assert cache_stats["hits"] == 0
+
+
+def test_search_endpoint_meters_by_api_key():
+    uvicorn = pytest.importorskip("uvicorn")
+    aiohttp = pytest.importorskip("aiohttp")
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+
+    originals = (main.search_service, main.quota, main.API_KEYS)
+
+    async def run():
+        searcher = StubSearcher(delay=0)
+        main.search_service = SearchService(searcher_factory=lambda: searcher)
+        main.quota = TenantQuota(limit="250/minute")
+        main.API_KEYS = {"ka": "alpha", "kb": "beta"}
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(main.app, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve(sockets=[sock]))
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        base = f"http://127.0.0.1:{port}"
+        session = aiohttp.ClientSession()
+
+        async def search(key, query):
+            headers = {"X-API-Key": key} if key else {}
+            async with session.post(f"{base}/search_articles", json={"query": query, "max_results": 3},
+                                    headers=headers) as resp:
+                return resp.status, resp.headers.get("Retry-After")
+
+        try:
+            statuses = [await search("ka", "缓存") for _ in range(30)]
+            statuses.append(await search("ka", "新查询"))
+            statuses.append(await search("ka", "第三个"))
+            other = await search("kb", "第三个")
+            anonymous = await search(None, "缓存")
+            async with session.get(f"{base}/stats") as resp:
+                stats = await resp.json()
+        finally:
+            await session.close()
+            server.should_exit = True
+            await serving
+        return searcher, statuses, other, anonymous, stats
+
+    try:
+        searcher, statuses, other, anonymous, stats = asyncio.run(run())
+    finally:
+        main.search_service, main.quota, main.API_KEYS = originals
+
+    # 按 IP 的 10/minute 下第 11 次即被拒绝；现在缓存命中几乎不占配额
+    assert [s for s, _ in statuses[:31]] == [200] * 31
+    status, retry_after = statuses[31]
+    assert status == 429 and int(retry_after) >= 1
+    assert other[0] == 200
+    assert anonymous[0] == 401
+    assert searcher.calls == 3
+    assert stats["quota"]["tenants"]["alpha"]["upstream"] == 2
+    assert stats["quota"]["tenants"]["alpha"]["cache_hits"] == 29
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+出站速率调节器测试：令牌补充、乘性减、加性增、速率上下限，以及只在限速生效时提速
+"""
+
+import asyncio
+import sys
+import os
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.rate_governor import AdaptiveRateGovernor
+from test_helpers import FakeClock
+
+
+def test_tokens_refill_at_the_current_rate_up_to_burst():
+    clock = FakeClock()
+    governor = AdaptiveRateGovernor(initial_rate=1.0, burst=3, clock=clock)
+
+    async def drain():
+        for _ in range(3):
+            await governor.acquire()
+
+    asyncio.run(drain())
+    assert governor.tokens == 0
+    assert governor.expected_wait() == pytest.approx(1.0)
+
+    clock.now += 1.5
+    assert governor.expected_wait() == 0.0
+    assert governor.stats()["tokens"] == 1.5
+    clock.now += 100
+    assert governor.stats()["tokens"] == 3
+
+
+def test_block_halves_rate_down_to_the_floor_and_pauses():
+    clock = FakeClock()
+    governor = AdaptiveRateGovernor(initial_rate=1.0, min_rate=0.2, decrease_factor=0.5, cooldown=60, clock=clock)
+    governor.on_blocked()
+    assert governor.rate == 0.5 and governor.last_block_rate == 1.0
+    assert governor.tokens == 0
+    assert governor.expected_wait() == pytest.approx(60 + 1 / 0.5)
+
+    for _ in range(5):
+        governor.on_blocked()
+    assert governor.rate == 0.2
+    clock.now += 61
+    assert governor.stats()["cooldown_remaining"] == 0.0
+
+
+def test_rate_recovers_additively_only_while_callers_wait_for_tokens():
+    governor = AdaptiveRateGovernor(initial_rate=1.0, max_rate=1.1, increase_step=0.05, clock=FakeClock())
+    # 没有请求受限于速率时不提速
+    governor.on_success()
+    assert governor.rate == 1.0 and governor.success_count == 1
+
+    governor.throttled = True
+    governor.on_success()
+    assert governor.rate == pytest.approx(1.05)
+    # 一次等待只换来一次提速
+    governor.on_success()
+    assert governor.rate == pytest.approx(1.05)
+
+    governor.waiting = 1
+    governor.on_success()
+    governor.on_success()
+    assert governor.rate == 1.1
+
+
+def test_recovery_slows_near_the_last_blocked_rate():
+    governor = AdaptiveRateGovernor(initial_rate=1.0, increase_step=0.04, clock=FakeClock())
+    governor.on_blocked()
+    governor.rate = 0.95
+    governor.waiting = 1
+    governor.on_success()
+    assert governor.rate == pytest.approx(0.96)
+
+
+def test_acquire_marks_the_governor_throttled_when_it_has_to_wait():
+    clock = FakeClock()
+    governor = AdaptiveRateGovernor(initial_rate=100.0, max_rate=200.0, burst=1, clock=clock)
+
+    async def run():
+        await governor.acquire()
+        assert not governor.throttled
+        waiting = asyncio.create_task(governor.acquire())
+        await asyncio.sleep(0)
+        assert governor.waiting == 1
+        clock.now += 1
+        await waiting
+
+    asyncio.run(run())
+    assert governor.throttled and governor.waiting == 0
+    governor.on_success()
+    assert governor.rate > 100.0
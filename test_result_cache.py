@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索结果缓存测试：跨查询去重与时间筛选推导
+"""
+
+import sys
+import os
+import time
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.result_cache import SearchResultCache
+from search.results import SearchResults, is_exhaustive, truncate_results
+
+DAY = 86400
+
+
+def make_articles(ages_in_days, prefix="a"):
+    now = time.time()
+    return [
+        {"title": f"{prefix}{i}", "url": f"https://mp.weixin.qq.com/s/{prefix}{i}",
+         "source": "公众号", "date": "", "publish_ts": int(now - age * DAY), "snippet": ""}
+        for i, age in enumerate(ages_in_days)
+    ]
+
+
+def put(cache, time_filter, requested, articles, base_key="q", exhaustive=False):
+    return cache.put(base_key, time_filter, requested, articles, query="q", search_time=0.1, timestamp="t",
+                     exhaustive=exhaustive)
+
+
+def test_exact_hit_serves_smaller_requests_only():
+    cache = SearchResultCache()
+    put(cache, "week", 5, make_articles([0, 1, 2, 3, 4]))
+    assert [a["title"] for a in cache.lookup("q", "week", 3).articles()] == ["a0", "a1", "a2"]
+    assert cache.lookup("q", "week", 8) is None
+
+
+def test_exhaustive_entry_serves_larger_requests():
+    cache = SearchResultCache()
+    put(cache, "week", 10, make_articles([0, 1]), exhaustive=True)
+    assert len(cache.lookup("q", "week", 20).records) == 2
+
+
+def test_short_results_are_not_exhaustive_unless_the_searcher_says_so():
+    cache = SearchResultCache()
+    # 搜索器只读一页：请求 20 条得到 10 条，不代表已取得全部结果
+    put(cache, "year", 20, make_articles([30] * 10))
+    assert cache.lookup("q", "year", 30) is None
+    assert cache.lookup("q", "day", 3) is None
+    # 空结果同理
+    put(cache, "week", 5, [], base_key="empty")
+    assert cache.lookup("empty", "week", 20) is None
+
+
+def test_truncated_exhaustive_page_does_not_serve_larger_requests():
+    cache = SearchResultCache()
+    page = truncate_results(SearchResults(make_articles([0] * 7), exhaustive=True), 5)
+    assert len(page) == 5 and not is_exhaustive(page)
+    put(cache, None, 5, page, exhaustive=is_exhaustive(page))
+    assert cache.lookup("q", None, 5) is not None
+    assert cache.lookup("q", None, 7) is None
+
+    # 没有截掉文章时保留完整性
+    whole = truncate_results(SearchResults(make_articles([0] * 7), exhaustive=True), 10)
+    assert len(whole) == 7 and is_exhaustive(whole)
+
+
+def test_narrower_filter_derived_from_wider_entry():
+    cache = SearchResultCache()
+    put(cache, "year", 10, make_articles([0.5, 2, 5, 20, 40, 100, 200, 300, 320, 360]))
+
+    hit = cache.lookup("q", "week", 3)
+    assert hit.derived_from == "year"
+    assert [a["title"] for a in hit.articles()] == ["a0", "a1", "a2"]
+
+    hit = cache.lookup("q", "day", 1)
+    assert [a["title"] for a in hit.articles()] == ["a0"]
+
+    # 过滤后数量不足且宽结果并非全部结果时不能推导
+    assert cache.lookup("q", "day", 2) is None
+    assert cache.stats()["derived_hits"] == 2
+
+
+def test_narrower_filter_never_served_from_unfiltered_entry():
+    cache = SearchResultCache()
+    put(cache, None, 10, make_articles([0] * 10))
+    assert cache.lookup("q", "week", 3) is None
+
+
+def test_shared_articles_are_stored_once_and_released():
+    cache = SearchResultCache(max_entries=2)
+    shared = make_articles([0, 1], prefix="s")
+    put(cache, None, 5, shared, base_key="q1")
+    put(cache, None, 5, shared, base_key="q2")
+    assert cache.store.stats()["articles"] == 2
+    assert cache.store.stats()["references"] == 4
+
+    put(cache, None, 5, make_articles([0], prefix="x"), base_key="q3")
+    assert len(cache) == 2
+    assert cache.store.stats()["references"] == 3
+
+
+def test_unresolved_articles_are_shared_across_queries_despite_new_tokens():
+    cache = SearchResultCache()
+    article = make_articles([0], prefix="s")[0]
+    # 每次搜索搜狗给出不同的跳转参数
+    first = dict(article, url="https://weixin.sogou.com/link?url=token-1&type=2")
+    second = dict(article, url="https://weixin.sogou.com/link?url=token-2&type=2")
+    put(cache, None, 5, [first], base_key="q1")
+    put(cache, None, 5, [second], base_key="q2")
+    assert cache.store.stats() == {"articles": 1, "references": 2, "sources": 1}
+    # 记录保留最新的链接，两个查询同时生效
+    assert cache.lookup("q1", None, 1).articles()[0]["url"] == second["url"]
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, "-v"]))
+
+
+def test_normalization_hits_count_new_raw_variants_once():
+    cache = SearchResultCache()
+    cache.put("q", None, 5, make_articles([1, 2]), query="q", search_time=0.1,
+              timestamp="", raw_query="ChatGPT")
+    assert cache.lookup("q", None, 5, raw_query="ChatGPT") is not None
+    assert cache.lookup("q", None, 5, raw_query="ＣｈａｔＧＰＴ") is not None
+    assert cache.lookup("q", None, 5, raw_query="ＣｈａｔＧＰＴ") is not None
+    assert cache.stats()["hits"] == 3
+    assert cache.stats()["normalization_hits"] == 1
+
+
+def test_encoded_response_reused_until_records_refresh():
+    cache = SearchResultCache()
+    articles = make_articles([1, 2, 3])
+    put(cache, None, 3, articles)
+    calls = []
+
+    def encode(hit):
+        calls.append(1)
+        return ",".join(a["title"] for a in hit.articles()).encode()
+
+    first = cache.lookup("q", None, 3).encoded("full", encode)
+    assert cache.lookup("q", None, 3).encoded("full", encode) is first
+    assert cache.lookup("q", None, 2).encoded("full", encode) == b"a0,a1"
+    assert len(calls) == 2
+
+    # 另一个查询刷新了共享文章，预编码结果随之失效
+    time.sleep(0.001)
+    put(cache, None, 1, [dict(articles[0], title="new")], base_key="other")
+    assert cache.lookup("q", None, 3).encoded("full", encode) == b"new,a1,a2"
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索样本归档测试：采样策略、压缩写入与大小上限淘汰、搜索器录制和离线回放
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+import time
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.identity_pool import EgressIdentity
+from search.playwright_search import WeChatArticleSearcher
+from search.sample_archive import SampleArchive, load_sample
+
+
+RESULT_HTML = """<html><body><ul class="news-list">
+<li><div class="txt-box"><h3><a href="/link?url=A&type=2">第一篇文章</a></h3>
+<p class="txt-info">摘要一</p><div class="s-p"><span class="all-time-y2">公众号甲</span></div></div></li>
+<li><div class="txt-box"><h3><a href="/link?url=B&type=2">第二篇文章</a></h3>
+<p class="txt-info">摘要二</p><div class="s-p"><span class="all-time-y2">公众号乙</span></div></div></li>
+</ul></body></html>"""
+
+
+class FakePage:
+    url = "https://weixin.sogou.com/weixin?type=2&query=test"
+
+    async def content(self):
+        return RESULT_HTML
+
+
+def test_should_record_samples_empty_blocked_and_slow_searches():
+    archive = SampleArchive("unused", sample_rate=0.1, slow_threshold=5.0, rng=lambda: 0.5)
+    assert archive.should_record(1.0, 0)
+    assert archive.should_record(1.0, 3, blocked=True)
+    assert archive.should_record(6.0, 3)
+    assert not archive.should_record(1.0, 3)
+    archive.rng = lambda: 0.05
+    assert archive.should_record(1.0, 3)
+
+
+def test_from_env_is_off_by_default(monkeypatch):
+    monkeypatch.delenv("WEIXIN_SEARCH_SAMPLE_RATE", raising=False)
+    assert SampleArchive.from_env("data") is None
+    monkeypatch.setenv("WEIXIN_SEARCH_SAMPLE_RATE", "0.05")
+    monkeypatch.setenv("WEIXIN_SEARCH_SAMPLE_MAX_MB", "1")
+    archive = SampleArchive.from_env("data")
+    assert archive.path == os.path.join("data", "samples")
+    assert archive.sample_rate == 0.05 and archive.max_bytes == 1024 * 1024
+
+
+def test_archive_compresses_and_evicts_oldest_samples():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SampleArchive(tmp, max_bytes=1)
+        first = archive.write({"query": "一", "html": "<p>" * 1000})
+        time.sleep(0.002)
+        second = archive.write({"query": "二", "html": "<p>" * 1000})
+        assert os.path.getsize(second) < 1000
+        assert not os.path.exists(first)
+        assert [s["query"] for s in archive] == ["二"]
+        assert load_sample(second)["version"] == 1
+        assert archive.stats()["evicted"] == 1
+
+        # 重新打开时从目录加载已有样本
+        archive = SampleArchive(tmp, max_bytes=10 ** 6)
+        archive.write({"query": "三"})
+        assert [s["query"] for s in archive] == ["二", "三"]
+        assert archive.stats()["samples"] == 2
+
+
+def test_searcher_records_raw_page_timings_and_parsed_results():
+    with tempfile.TemporaryDirectory() as tmp:
+        archive = SampleArchive(tmp, sample_rate=1.0)
+        searcher = WeChatArticleSearcher(sample_archive=archive)
+        articles = [{"title": "第一篇文章", "url": "https://weixin.sogou.com/link?url=A&type=2"}]
+        timings = {"rate_wait": 0.0, "navigate": 0.2, "wait_results": 0.1, "parse": 0.05}
+
+        asyncio.run(searcher._record_sample(FakePage(), EgressIdentity("direct"), "test", 10, None,
+                                            FakePage.url, timings, time.monotonic(), articles))
+        samples = list(archive)
+
+    assert len(samples) == 1
+    sample = samples[0]
+    assert sample["html"] == RESULT_HTML
+    assert sample["identity"] == "direct" and sample["blocked"] is False
+    assert sample["articles"] == articles
+    assert set(sample["timings"]) == {"rate_wait", "navigate", "wait_results", "parse", "total"}
+
+
+def test_replay_feeds_archived_pages_through_the_parser():
+    pytest.importorskip("playwright.async_api")
+    from search.replay import ReplaySearcher, replay_archive
+
+    async def run(tmp):
+        searcher = ReplaySearcher(headless=True)
+        try:
+            await searcher.init_browser()
+        except Exception as e:
+            await searcher.close()
+            pytest.skip(f"无法启动 Chromium: {e}")
+        try:
+            archive = SampleArchive(tmp)
+            archive.write({"query": "test", "max_results": 10, "url": FakePage.url, "final_url": FakePage.url,
+                           "html": RESULT_HTML, "articles": [], "timings": {"parse": 0.1, "total": 1.0}})
+            return await replay_archive(archive, searcher=searcher)
+        finally:
+            await searcher.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        report = asyncio.run(run(tmp))
+    assert report["samples"] == 1
+    # 录制结果为空而回放解析出文章，应报告为变化
+    assert report["matched"] == 0
+    assert report["changed"][0]["replayed_count"] > 0
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索优先级调度测试
+"""
+
+import asyncio
+import sys
+import os
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.errors import SearchOverloadedError
+from search.scheduler import PriorityClass, PriorityScheduler, Ticket
+
+
+def test_higher_priority_jumps_the_queue():
+    async def run():
+        scheduler = PriorityScheduler(concurrency=1)
+        gate = asyncio.Event()
+        order = []
+
+        async def job(name, wait=None):
+            if wait:
+                await wait.wait()
+            order.append(name)
+
+        first = asyncio.create_task(scheduler.run("batch", job, "batch-0", gate))
+        await asyncio.sleep(0)
+        tasks = [asyncio.create_task(scheduler.run("batch", job, f"batch-{i}")) for i in (1, 2)]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(scheduler.run("interactive", job, "interactive")))
+        await asyncio.sleep(0)
+        assert scheduler.stats()["queued"] == 3
+
+        gate.set()
+        await asyncio.gather(first, *tasks)
+        return order, scheduler.stats()
+
+    order, stats = asyncio.run(run())
+    assert order == ["batch-0", "interactive", "batch-1", "batch-2"]
+    assert stats["running"] == 0
+    assert stats["classes"]["batch"]["completed"] == 3
+
+
+def test_sheds_when_queue_full_or_over_budget():
+    async def run():
+        classes = (
+            PriorityClass("interactive", max_queue=5, max_queue_time=10, wait_budget=2.0),
+            PriorityClass("batch", max_queue=1, max_queue_time=10, wait_budget=100.0),
+        )
+        scheduler = PriorityScheduler(concurrency=1, classes=classes, initial_service_time=1.0)
+        await scheduler.acquire("batch")
+        queued = asyncio.create_task(scheduler.acquire("batch"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(SearchOverloadedError) as full:
+            await scheduler.acquire("batch")
+        assert full.value.retry_after >= 1.0
+
+        # 交互式请求不受批量队列影响：预计等待 1s 在预算内
+        waiting = asyncio.create_task(scheduler.acquire("interactive"))
+        await asyncio.sleep(0)
+        # 第二个交互式请求预计等待 2s，第三个超出预算
+        second = asyncio.create_task(scheduler.acquire("interactive"))
+        await asyncio.sleep(0)
+        with pytest.raises(SearchOverloadedError):
+            await scheduler.acquire("interactive")
+
+        for task in (queued, waiting, second):
+            task.cancel()
+        await asyncio.gather(queued, waiting, second, return_exceptions=True)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["classes"]["batch"]["shed"] == 1
+    assert stats["classes"]["interactive"]["shed"] == 1
+    assert stats["queued"] == 0
+
+
+def test_queue_deadline_expires_waiting_requests():
+    async def run():
+        classes = (PriorityClass("batch", max_queue=5, max_queue_time=0.05, wait_budget=100.0),)
+        scheduler = PriorityScheduler(concurrency=1, classes=classes)
+        await scheduler.acquire("batch")
+        with pytest.raises(SearchOverloadedError):
+            await scheduler.acquire("batch")
+        scheduler.release("batch")
+        # 过期请求已移出队列，槽位可被新请求直接获得
+        await asyncio.wait_for(scheduler.acquire("batch"), timeout=1)
+        return scheduler.stats()
+
+    stats = asyncio.run(run())
+    assert stats["classes"]["batch"]["expired"] == 1
+    assert stats["running"] == 1
+
+
+def test_promote_moves_a_queued_request_to_the_higher_queue():
+    async def run():
+        scheduler = PriorityScheduler(concurrency=1)
+        await scheduler.acquire("batch")
+        earlier = asyncio.create_task(scheduler.acquire("agent"))
+        ticket = Ticket("batch")
+        promoted = asyncio.create_task(scheduler.acquire(ticket))
+        await asyncio.sleep(0)
+
+        assert scheduler.promote(ticket, "interactive")
+        # 不降级
+        assert not scheduler.promote(ticket, "batch")
+        assert scheduler.queue_depth("interactive") == 1 and scheduler.queue_depth("batch") == 0
+        scheduler.release("batch")
+        await promoted
+        assert not earlier.done()
+        # 已获得槽位的请求不再提升
+        assert not scheduler.promote(ticket, "interactive")
+
+        scheduler.release(promoted.result())
+        await earlier
+        return promoted.result(), scheduler.stats()
+
+    priority, stats = asyncio.run(run())
+    assert priority == "interactive"
+    assert stats["classes"]["interactive"]["admitted"] == 1
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+搜索服务层测试：请求合并、过期缓存降级、正文抓取排队、经 Unix 套接字转发
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.errors import SearchBlockedError
+from search.playwright_search import WeChatArticleSearcher
+from search.results import SearchResults, is_exhaustive
+from search.service import RemoteSearchService, SearchService
+
+
+class StubPool:
+    def has_spare_capacity(self):
+        return False
+
+    def stats(self):
+        return {}
+
+
+class StubSearcher:
+    """记录调用次数的替身搜索器"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+        self.blocked = False
+        self.failed = False
+        self.browser = None
+        self.identity_pool = self.link_resolver = self.article_fetcher = StubPool()
+
+    async def init_browser(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def search_articles(self, query, max_results=5, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.blocked:
+            raise SearchBlockedError("blocked", retry_after=30)
+        if self.failed:
+            return SearchResults(failed=True)
+        return [{"title": f"{query}{i}", "url": f"https://mp.weixin.qq.com/s/{query}{i}",
+                 "source": "公众号", "date": "", "publish_ts": None, "snippet": ""} for i in range(max_results)]
+
+
+def test_concurrent_identical_searches_are_coalesced():
+    async def run():
+        searcher = StubSearcher()
+        service = SearchService(searcher_factory=lambda: searcher)
+        outcomes = await asyncio.gather(*(service.search("大模型", max_results=3) for _ in range(5)))
+        again = await service.search("大模型", max_results=2)
+        return searcher, service, outcomes, again
+
+    searcher, service, outcomes, again = asyncio.run(run())
+    assert searcher.calls == 1
+    assert service.coalesced == 4
+    assert all(len(o.articles()) == 3 for o in outcomes)
+    assert again.cached and len(again.articles()) == 2
+
+
+def test_higher_priority_waiter_promotes_the_queued_flight():
+    class RecordingSearcher(StubSearcher):
+        def __init__(self):
+            super().__init__(delay=0)
+            self.queries = []
+
+        async def search_articles(self, query, max_results=5, **kwargs):
+            self.queries.append(query)
+            return await super().search_articles(query, max_results, **kwargs)
+
+    async def run():
+        searcher = RecordingSearcher()
+        service = SearchService(searcher_factory=lambda: searcher)
+        await service.get_searcher()
+        # 占住唯一的槽位，两个批量搜索排队
+        await service.scheduler.acquire("batch")
+        other = asyncio.create_task(service.search("其他", priority="batch"))
+        while service.scheduler.queue_depth() < 1:
+            await asyncio.sleep(0)
+        batch = asyncio.create_task(service.search("热点", priority="batch"))
+        while service.scheduler.queue_depth() < 2:
+            await asyncio.sleep(0)
+        interactive = asyncio.create_task(service.search("热点", priority="interactive"))
+        await asyncio.sleep(0)
+        service.scheduler.release("batch")
+        await asyncio.gather(other, batch, interactive)
+        return searcher, service
+
+    searcher, service = asyncio.run(run())
+    # 交互式请求合并到排队中的批量搜索，并把它提到其他批量搜索之前
+    assert searcher.queries == ["热点", "其他"]
+    assert service.coalesced == 1
+
+
+def test_full_result_page_is_cached_for_larger_requests():
+    async def run():
+        searcher = StubSearcher(delay=0)
+        service = SearchService(searcher_factory=lambda: searcher)
+        first = await service.search("整页", max_results=3)
+        larger = await service.search("整页", max_results=10)
+        return searcher, first, larger
+
+    searcher, first, larger = asyncio.run(run())
+    assert len(first.articles()) == 3
+    assert larger.cached and len(larger.articles()) == 10
+    assert searcher.calls == 1
+
+
+def test_larger_request_reads_only_the_next_page():
+    class PagedSearcher(StubSearcher):
+        def __init__(self):
+            super().__init__(delay=0)
+            self.pages = []
+
+        async def search_articles(self, query, max_results=5, start_page=1, **kwargs):
+            self.pages.append((start_page, max_results))
+            offset = (start_page - 1) * 10
+            return SearchResults([{"title": f"{query}{offset + i}", "url": f"https://mp.weixin.qq.com/s/{offset + i}",
+                                   "source": "", "date": "", "publish_ts": None, "snippet": ""}
+                                  for i in range(max_results)])
+
+    async def run():
+        searcher = PagedSearcher()
+        service = SearchService(searcher_factory=lambda: searcher)
+        await service.search("分页", max_results=5)
+        second = await service.search("分页", max_results=15)
+        again = await service.search("分页", max_results=20)
+        return searcher, second, again
+
+    searcher, second, again = asyncio.run(run())
+    assert searcher.pages == [(1, 10), (2, 10)]
+    assert [a["title"] for a in second.articles()] == [f"分页{i}" for i in range(15)]
+    assert again.cached and len(again.articles()) == 20
+
+
+def test_searcher_reads_following_pages_and_returns_at_most_max_results():
+    class PageSearcher(WeChatArticleSearcher):
+        """第一页 10 篇，第二页 7 篇（最后一页）"""
+
+        def __init__(self):
+            super().__init__()
+            self.urls = []
+
+        async def init_browser(self):
+            pass
+
+        async def _get_identity_page(self, identity):
+            return None
+
+        async def _search_page(self, identity, page, query, page_no, time_filter, full_url):
+            self.urls.append(full_url)
+            count = 10 if page_no == 1 else 7
+            return SearchResults([{"title": f"{query}{page_no}-{i}", "url": f"https://mp.weixin.qq.com/s/{page_no}-{i}"}
+                                  for i in range(count)], exhaustive=count < 10)
+
+    searcher = PageSearcher()
+    trimmed = asyncio.run(searcher.search_articles("整页", max_results=5))
+    assert len(trimmed) == 5 and not is_exhaustive(trimmed)
+    assert len(searcher.urls) == 1 and "page=" not in searcher.urls[0]
+
+    searcher.urls.clear()
+    whole = asyncio.run(searcher.search_articles("整页", max_results=20))
+    assert len(whole) == 17 and is_exhaustive(whole)
+    assert "page=2" in searcher.urls[1]
+
+    searcher.urls.clear()
+    rest = asyncio.run(searcher.search_articles("整页", max_results=10, start_page=2))
+    assert [a["title"] for a in rest][:1] == ["整页2-0"] and len(searcher.urls) == 1
+
+
+def test_blocked_search_falls_back_to_stale_cache():
+    async def run():
+        searcher = StubSearcher(delay=0)
+        service = SearchService(searcher_factory=lambda: searcher, cache_ttl=0)
+        await service.search("q", max_results=3)
+        searcher.blocked = True
+        stale = await service.search("q", max_results=3)
+        with pytest.raises(SearchBlockedError):
+            await service.search("other", max_results=3)
+        return stale
+
+    stale = asyncio.run(run())
+    assert stale.stale
+    assert [a["title"] for a in stale.articles()] == ["q0", "q1", "q2"]
+
+
+def test_failed_search_is_not_cached():
+    async def run():
+        searcher = StubSearcher(delay=0)
+        service = SearchService(searcher_factory=lambda: searcher)
+        searcher.failed = True
+        failed = await service.search("q", max_results=20)
+        searcher.failed = False
+        retried = await service.search("q", max_results=20)
+        return searcher, service, failed, retried
+
+    searcher, service, failed, retried = asyncio.run(run())
+    assert failed.articles() == [] and not failed.cached
+    assert searcher.calls == 2 and len(retried.articles()) == 20
+    assert len(service.cache) == 1
+
+
+def test_article_fetch_queues_link_resolution_and_browser_fallback():
+    class StubResolver(StubPool):
+        async def resolve_many(self, urls):
+            return [url.replace("weixin.sogou.com/link", "mp.weixin.qq.com/s") for url in urls]
+
+    class StubFetcher(StubPool):
+        async def fetch_many(self, urls, use_cache=True, browser=None):
+            # HTTP 均失败，全部走浏览器回退
+            return [{"url": url, "content": await browser(url)} for url in urls]
+
+    class BrowserSearcher(StubSearcher):
+        def __init__(self):
+            super().__init__(delay=0)
+            self.link_resolver = StubResolver()
+            self.article_fetcher = StubFetcher()
+
+        async def fetch_page_html(self, url):
+            return "正文"
+
+    async def run():
+        searcher = BrowserSearcher()
+        service = SearchService(searcher_factory=lambda: searcher)
+        articles = await service.fetch_articles(
+            ["https://weixin.sogou.com/link?url=a", "https://mp.weixin.qq.com/s?b"], priority="batch")
+        return service, articles
+
+    service, articles = asyncio.run(run())
+    assert [a["url"] for a in articles] == ["https://mp.weixin.qq.com/s?url=a", "https://mp.weixin.qq.com/s?b"]
+    # 一次批量链接解析加两次浏览器抓取，均按请求的优先级排队
+    assert service.scheduler.stats()["classes"]["batch"]["admitted"] == 3
+    assert service.scheduler.stats()["classes"]["agent"]["admitted"] == 0
+
+
+def test_remote_service_forwards_over_unix_socket():
+    uvicorn = pytest.importorskip("uvicorn")
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+
+    original_service = main.search_service
+
+    async def run(socket_path):
+        searcher = StubSearcher(delay=0)
+        main.search_service = SearchService(searcher_factory=lambda: searcher)
+        server = uvicorn.Server(uvicorn.Config(main.app, uds=socket_path, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        remote = RemoteSearchService(f"unix:{socket_path}")
+        try:
+            # 经本机套接字的请求不受按 IP 的 10/minute 限制
+            outcomes = [await remote.search("转发", max_results=2, priority="agent") for _ in range(12)]
+        finally:
+            await remote.close()
+            server.should_exit = True
+            await serving
+        return searcher, outcomes
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            searcher, outcomes = asyncio.run(run(os.path.join(tmp, "search.sock")))
+    finally:
+        main.search_service = original_service
+    assert searcher.calls == 1
+    assert [a["title"] for a in outcomes[-1].articles()] == ["转发0", "转发1"]
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文本规范化等价性测试与微基准
+将 search.text_normalize 与原 WeChatArticleSearcher 中的实现逐条对比
+
+运行基准: python test_text_normalize.py --bench
+"""
+
+import random
+import re
+import sys
+import os
+import timeit
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search import text_normalize
+
+
+# ---- 原实现（参照基准） ----
+
+def legacy_clean_text(text):
+    if not text:
+        return ""
+    text = re.sub(r'<[^>]+>', '', text)
+    text = re.sub(r'\s+', ' ', text)
+    return text.strip()
+
+
+def legacy_parse_meta_info(meta_text):
+    if not meta_text:
+        return "", ""
+    patterns = [
+        r'(.+?)\s+(\d{4}-\d{2}-\d{2})',
+        r'(.+?)\s+(\d+天前|\d+小时前|\d+分钟前)',
+        r'(.+?)\s+(.+)',
+    ]
+    for pattern in patterns:
+        match = re.match(pattern, meta_text.strip())
+        if match:
+            return match.group(1).strip(), match.group(2).strip()
+    return meta_text.strip(), ""
+
+
+def legacy_snippet(description):
+    return legacy_clean_text(description)[:200] + "..." if len(description) > 200 else legacy_clean_text(description)
+
+
+# ---- 测试语料 ----
+
+TEXT_CORPUS = [
+    "",
+    " ",
+    "人工智能",
+    "  人工智能  \n 大模型\t",
+    "<em>人工</em>智能",
+    "<em>人工</em> <b>智能</b>",
+    "a<b>c",
+    "a <b> c",
+    "a<b> c",
+    "<a href='x y'>标题</a>",
+    "<<b>a>",
+    "a < b > c",
+    "a <> b",
+    "未闭合 <标签",
+    "　全角空格　",
+    "\xa0不换行空格\xa0",
+    "行一\r\n行二\n\n行三",
+    "<p>\n  段落\n</p>\n<p>第二段</p>",
+    "x" * 250,
+    "<span>" + "长" * 210 + "</span>",
+]
+
+META_CORPUS = [
+    "",
+    "   ",
+    "公众号",
+    "公众号 2024-01-02",
+    "公众号名称 3天前",
+    "公众号名称 5小时前",
+    "公众号名称 10分钟前",
+    "公众号 名称 2024-01-02",
+    "公众号 3天前 备注 2024-01-02",
+    "公众号  2024-01-02 12:00",
+    "  公众号\t\t昨天  ",
+    "公众号 其他 信息",
+    "公众号\n2024-01-02",
+    "公众号 前缀\n第二行 2024-01-02",
+    "公众号\n第二行 内容",
+    "单行无空白",
+    "a 2024-1-2",
+    "a 3周前",
+    "号 ２０２４-０１-０２",
+]
+
+QUERY_CORPUS = [
+    "人工智能",
+    " <script>alert('x')</script> ",
+    '"引号" 查询',
+    "a" * 120,
+    " " * 5 + "b" * 98 + "'",
+    "",
+]
+
+
+def _random_corpus(seed=20240101, count=2000):
+    """生成带标签、空白、日期片段的随机文本"""
+    rng = random.Random(seed)
+    pieces = ["公众号", "AI", " ", "  ", "\n", "\t", "　", "<b>", "</b>", "<a href='1 2'>",
+              "<", ">", "\x1c", "\u2003", "2024-01-02", "3天前", "5小时前", "7分钟前", "昨天", "文章", "x", "'", '"']
+    return ["".join(rng.choice(pieces) for _ in range(rng.randint(0, 12))) for _ in range(count)]
+
+
+RANDOM_CORPUS = _random_corpus()
+
+
+@pytest.mark.parametrize("text", TEXT_CORPUS + RANDOM_CORPUS[:500])
+def test_clean_text_matches_legacy(text):
+    assert text_normalize.clean_text(text) == legacy_clean_text(text)
+
+
+@pytest.mark.parametrize("text", TEXT_CORPUS + RANDOM_CORPUS[:500])
+def test_snippet_matches_legacy(text):
+    assert text_normalize.make_snippet(text) == legacy_snippet(text)
+
+
+@pytest.mark.parametrize("meta", META_CORPUS + RANDOM_CORPUS)
+def test_parse_meta_info_matches_legacy(meta):
+    assert text_normalize.parse_meta_info(meta) == legacy_parse_meta_info(meta)
+
+
+def test_normalize_articles_drops_empty_and_applies_defaults():
+    articles = text_normalize.normalize_articles([
+        {"title": " <em>标题</em> ", "url": "https://mp.weixin.qq.com/s/a",
+         "description": "摘要内容" * 60, "meta": "公众号 2024-01-02"},
+        {"title": "<b></b>", "url": "https://mp.weixin.qq.com/s/b"},
+        {"title": "无元信息", "url": "https://mp.weixin.qq.com/s/c"},
+    ])
+    assert [a["title"] for a in articles] == ["标题", "无元信息"]
+    assert articles[0]["source"] == "公众号"
+    assert articles[0]["date"] == "2024-01-02"
+    assert articles[0]["snippet"].endswith("...")
+    assert articles[1]["source"] == "微信公众号"
+    assert articles[1]["date"] == ""
+
+
+@pytest.mark.parametrize("variant", [
+    "ChatGPT 教程",
+    "  chatgpt   教程 ",
+    "ＣｈａｔＧＰＴ\u3000教程",
+    "CHATGPT\t教程",
+    "<ChatGPT> 教程",
+])
+def test_canonicalize_query_merges_equivalent_variants(variant):
+    assert text_normalize.canonicalize_query(variant, to_simplified=False) == "chatgpt 教程"
+
+
+@pytest.mark.parametrize("query", QUERY_CORPUS + RANDOM_CORPUS[:500])
+def test_canonicalize_query_strips_unsafe_chars_and_is_idempotent(query):
+    canonical = text_normalize.canonicalize_query(query, to_simplified=False)
+    assert len(canonical) <= 100 and not set(canonical) & set("<>\"'")
+    assert text_normalize.canonicalize_query(canonical, to_simplified=False) == canonical
+
+
+def test_canonicalize_query_limits_length():
+    assert text_normalize.canonicalize_query("Ａ" * 150, to_simplified=False) == "a" * 100
+    assert text_normalize.canonicalize_query(" <> ", to_simplified=False) == ""
+
+
+def test_canonicalize_query_traditional_to_simplified():
+    pytest.importorskip("opencc")
+    assert text_normalize.canonicalize_query("人工智慧 機器學習", to_simplified=True) == \
+        text_normalize.canonicalize_query("人工智慧 机器学习", to_simplified=True)
+
+
+def run_benchmarks(number=20):
+    """对比原实现与新实现在整份语料上的耗时"""
+    cases = [
+        ("clean_text", legacy_clean_text, text_normalize.clean_text, TEXT_CORPUS + RANDOM_CORPUS),
+        ("snippet", legacy_snippet, text_normalize.make_snippet, TEXT_CORPUS + RANDOM_CORPUS),
+        ("parse_meta_info", legacy_parse_meta_info, text_normalize.parse_meta_info, META_CORPUS + RANDOM_CORPUS),
+    ]
+    print(f"{'函数':<18}{'原实现(ms)':>12}{'新实现(ms)':>12}{'加速比':>10}")
+    for name, legacy, current, corpus in cases:
+        legacy_time = timeit.timeit(lambda: [legacy(item) for item in corpus], number=number)
+        current_time = timeit.timeit(lambda: [current(item) for item in corpus], number=number)
+        print(f"{name:<18}{legacy_time * 1000 / number:>12.3f}{current_time * 1000 / number:>12.3f}"
+              f"{legacy_time / current_time:>9.2f}x")
+
+
+if __name__ == "__main__":
+    if "--bench" in sys.argv:
+        run_benchmarks()
+    else:
+        sys.exit(pytest.main([__file__, "-q"]))
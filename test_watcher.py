@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+关键词订阅测试：新文章识别、自适应轮询间隔、资源更新通知和 REST/SSE 推送
+"""
+
+import asyncio
+import sys
+import os
+import tempfile
+
+import pytest
+
+# 将app目录添加到路径中
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'app'))
+
+from search.errors import QuotaExceededError, SearchOverloadedError
+from search.mcp_protocol import MCPProtocol
+from search.service import SearchService
+from search.article_store import stable_article_key
+from search.watcher import KeywordWatcher, service_runner
+from test_service import StubSearcher
+from test_helpers import FakeClock
+
+
+def article(n):
+    return {"title": f"文章{n}", "url": f"https://mp.weixin.qq.com/s?__biz=B&mid={n}&idx=1&sn=s{n}&chksm=x",
+            "source": "公众号", "date": "", "snippet": ""}
+
+
+class ScriptedRunner:
+    """按顺序返回预设结果的订阅搜索"""
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def __call__(self, watch):
+        self.calls += 1
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class FakeSession:
+    def __init__(self, tenant=None):
+        self.messages = []
+        self.tenant = tenant
+
+    def notify(self, message):
+        self.messages.append(message)
+
+
+def test_first_poll_is_baseline_and_only_unseen_articles_are_pushed():
+    clock = FakeClock()
+    runner = ScriptedRunner([article(1), article(2)], [article(3), article(1), article(2)], [article(3)])
+    watcher = KeywordWatcher(runner, min_interval=100, max_interval=10000, initial_interval=800, clock=clock)
+    pushed = []
+    watcher.add_listener(lambda watch, items: pushed.append([i["article"]["title"] for i in items]))
+    watch = watcher.add("大模型")
+
+    async def run():
+        return [await watcher.poll(watch) for _ in range(3)]
+
+    baseline, first, second = asyncio.run(run())
+    assert baseline == [] and second == []
+    assert [i["seq"] for i in first] == [1]
+    assert pushed == [["文章3"]]
+    assert [i["article"]["title"] for i in watch.articles_since(0)] == ["文章3"]
+    assert watch.articles_since(1) == []
+    # 基线后发现新文章减半，随后无新文章放大 1.5 倍
+    assert watch.interval == 600
+
+
+def test_interval_adapts_within_bounds_and_backs_off_on_errors():
+    clock = FakeClock()
+    runner = ScriptedRunner([], [article(1)], [article(2)], [article(3)],
+                            SearchOverloadedError("busy", priority="batch", retry_after=5000))
+    watcher = KeywordWatcher(runner, min_interval=300, max_interval=3000, initial_interval=900, clock=clock)
+    watch = watcher.add("q")
+
+    async def run():
+        intervals = []
+        for _ in range(5):
+            await watcher.poll(watch)
+            intervals.append(watch.interval)
+        return intervals
+
+    intervals = asyncio.run(run())
+    assert intervals == [900, 450, 300, 300, 600]
+    assert watch.next_poll == 5000
+    assert watch.last_error == "busy"
+    assert watcher.failed_polls == 1
+
+
+def test_run_due_only_polls_due_watches():
+    clock = FakeClock()
+    runner = ScriptedRunner([], [], [])
+    watcher = KeywordWatcher(runner, initial_interval=600, clock=clock)
+    first = watcher.add("a")
+    assert watcher.add("a") is first
+
+    async def run():
+        polled = [await watcher.run_due()]
+        watcher.add("b")
+        clock.now = 10
+        polled.append(await watcher.run_due())
+        return polled
+
+    assert asyncio.run(run()) == [1, 1]
+    assert watcher.next_due_in() == 590
+
+
+def test_watch_key_ignores_tracking_params_and_per_search_sogou_tokens():
+    a = {"url": "https://mp.weixin.qq.com/s?__biz=B&mid=1&idx=1&sn=s&chksm=aa&scene=1"}
+    b = {"url": "https://mp.weixin.qq.com/s?__biz=B&mid=1&idx=1&sn=s&chksm=bb"}
+    assert stable_article_key(a) == stable_article_key(b)
+    # 未解析的搜狗跳转链接每次搜索的 url 参数都不同，按来源和标题识别
+    c = {"url": "https://weixin.sogou.com/link?url=TOKEN1&type=2&k=1&h=a", "source": "号", "title": "标题"}
+    d = {"url": "https://weixin.sogou.com/link?url=TOKEN2&type=2&k=7&h=z", "source": "号", "title": "标题"}
+    assert stable_article_key(c) == stable_article_key(d) == "号|标题"
+    assert stable_article_key({"title": "无链接", "source": "号"}) == "号|无链接"
+
+
+def test_unresolved_sogou_links_are_not_reported_again():
+    def sogou(token):
+        return {"title": "同一篇", "url": f"https://weixin.sogou.com/link?url={token}&type=2", "source": "号"}
+
+    runner = ScriptedRunner([sogou("A")], [sogou("B")])
+    watcher = KeywordWatcher(runner, clock=FakeClock())
+    watch = watcher.add("q")
+
+    async def run():
+        return [await watcher.poll(watch) for _ in range(2)]
+
+    assert asyncio.run(run()) == [[], []]
+
+
+def test_service_runner_reuses_cached_results():
+    async def run():
+        searcher = StubSearcher(delay=0)
+        service = SearchService(searcher_factory=lambda: searcher)
+        await service.search("热点", max_results=3)
+        watcher = KeywordWatcher(service_runner(service))
+        watch = watcher.add("热点", max_results=3)
+        await watcher.poll(watch)
+        return searcher, watch
+
+    searcher, watch = asyncio.run(run())
+    assert searcher.calls == 1
+    assert len(watch.seen) == 3
+
+
+def test_watches_belong_to_tenants_and_polls_are_charged_to_the_owner():
+    charged = []
+
+    async def charge(watch):
+        charged.append(watch.tenant)
+        if watch.tenant == "broke":
+            raise QuotaExceededError("配额不足", tenant=watch.tenant, retry_after=2000)
+
+    async def run():
+        searcher = StubSearcher(delay=0)
+        service = SearchService(searcher_factory=lambda: searcher)
+        watcher = KeywordWatcher(service_runner(service, charge), initial_interval=600, clock=clock)
+        alpha, broke = watcher.add("热点", tenant="alpha"), watcher.add("热点", tenant="broke")
+        await watcher.poll(alpha)
+        await watcher.poll(broke)
+        return searcher, watcher, alpha, broke
+
+    clock = FakeClock()
+    searcher, watcher, alpha, broke = asyncio.run(run())
+    assert alpha.id != broke.id
+    assert watcher.watches("alpha") == [alpha]
+    assert len(watcher.watches()) == 2
+    assert charged == ["alpha", "broke"]
+    assert searcher.calls == 1 and len(alpha.seen) == 10
+    assert broke.last_error == "配额不足" and broke.next_poll == 2000
+
+
+def test_mcp_sessions_only_see_their_tenants_watches():
+    watcher = KeywordWatcher(ScriptedRunner(), clock=FakeClock())
+    protocol = MCPProtocol(service=None, watcher=watcher)
+    owner, other = FakeSession("alpha"), FakeSession("beta")
+
+    async def run():
+        await protocol.handle_message({"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {
+            "name": "watch_wechat_articles", "arguments": {"query": "新能源"}}}, owner)
+        uri = watcher.watches()[0].uri
+        read = await protocol.handle_message({"jsonrpc": "2.0", "id": 2, "method": "resources/read",
+                                              "params": {"uri": uri}}, other)
+        listed = await protocol.handle_message({"jsonrpc": "2.0", "id": 3, "method": "resources/list"}, other)
+        return read, listed
+
+    read, listed = asyncio.run(run())
+    assert watcher.watches()[0].tenant == "alpha"
+    assert read["error"]["code"] == -32002
+    assert [r["uri"] for r in listed["result"]["resources"]] == ["weixin-search://stats"]
+
+
+def test_subscribed_sessions_get_resource_updates():
+    clock = FakeClock()
+    runner = ScriptedRunner([article(1)], [article(1), article(2)])
+    watcher = KeywordWatcher(runner, clock=clock)
+    protocol = MCPProtocol(service=None, watcher=watcher)
+    session, other = FakeSession(), FakeSession()
+
+    async def run():
+        init = await protocol.handle_message({"jsonrpc": "2.0", "id": 1, "method": "initialize"}, session)
+        call = await protocol.handle_message({"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {
+            "name": "watch_wechat_articles", "arguments": {"query": "新能源"}}}, session)
+        uri = watcher.watches()[0].uri
+        await protocol.handle_message({"jsonrpc": "2.0", "id": 3, "method": "resources/subscribe",
+                                       "params": {"uri": uri}}, other)
+        await protocol.handle_message({"jsonrpc": "2.0", "id": 4, "method": "resources/unsubscribe",
+                                       "params": {"uri": uri}}, other)
+        for watch in watcher.watches():
+            await watcher.poll(watch)
+            await watcher.poll(watch)
+        read = await protocol.handle_message({"jsonrpc": "2.0", "id": 5, "method": "resources/read",
+                                              "params": {"uri": f"{uri}?since=0"}}, session)
+        missing = await protocol.handle_message({"jsonrpc": "2.0", "id": 6, "method": "resources/read",
+                                                 "params": {"uri": "weixin-watch://nope"}}, session)
+        listed = await protocol.handle_message({"jsonrpc": "2.0", "id": 7, "method": "resources/list"}, session)
+        return init, call, uri, read, missing, listed
+
+    init, call, uri, read, missing, listed = asyncio.run(run())
+    assert init["result"]["capabilities"]["resources"]["subscribe"] is True
+    assert uri in call["result"]["content"][0]["text"]
+    assert session.messages == [{"jsonrpc": "2.0", "method": "notifications/resources/updated",
+                                 "params": {"uri": uri}}]
+    assert other.messages == []
+    assert "文章2" in read["result"]["contents"][0]["text"]
+    assert missing["error"]["code"] == -32002
+    assert [r["uri"] for r in listed["result"]["resources"]] == ["weixin-search://stats", uri]
+
+
+def test_rest_feed_and_sse_stream():
+    uvicorn = pytest.importorskip("uvicorn")
+    aiohttp = pytest.importorskip("aiohttp")
+    cwd = os.getcwd()
+    os.chdir(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+
+    original_runner = main.watcher.runner
+
+    async def run(socket_path):
+        main.watcher.runner = ScriptedRunner([article(1)], [article(1), article(2)], [article(3)])
+        server = uvicorn.Server(uvicorn.Config(main.app, uds=socket_path, log_level="warning", lifespan="off"))
+        serving = asyncio.create_task(server.serve())
+        while not server.started:
+            await asyncio.sleep(0.01)
+
+        session = aiohttp.ClientSession(connector=aiohttp.UnixConnector(path=socket_path))
+        try:
+            async with session.post("http://localhost/watches", json={"query": " 光伏 "}) as resp:
+                created = await resp.json()
+            watch = main.watcher.get(created["id"])
+            await main.watcher.poll(watch)
+            await main.watcher.poll(watch)
+            async with session.get(f"http://localhost/watches/{watch.id}/articles?since=0") as resp:
+                feed = await resp.json()
+
+            events = []
+            async with session.get(f"http://localhost/watches/{watch.id}/stream",
+                                   headers={"Last-Event-ID": "0"}) as resp:
+                while not watch.streams:
+                    await asyncio.sleep(0.01)
+                await main.watcher.poll(watch)
+                async with session.delete(f"http://localhost/watches/{watch.id}") as deleted:
+                    assert deleted.status == 200
+                async for line in resp.content:
+                    if line.startswith(b"id: "):
+                        events.append(int(line[4:]))
+            async with session.get(f"http://localhost/watches/{watch.id}") as resp:
+                gone = resp.status
+        finally:
+            await session.close()
+            server.should_exit = True
+            await serving
+        return created, feed, events, gone
+
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            created, feed, events, gone = asyncio.run(run(os.path.join(tmp, "watch.sock")))
+    finally:
+        main.watcher.runner = original_runner
+    assert created["query"] == "光伏"
+    assert [i["article"]["title"] for i in feed["articles"]] == ["文章2"]
+    # 先补发序号 1，再实时推送序号 2
+    assert events == [1, 2]
+    assert gone == 404